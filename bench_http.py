@@ -0,0 +1,270 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Нагрузочный тест движка на локальном сервере с синтетическими страницами: извлечение ссылок,
+# загрузка страниц и (по желанию) скриншоты. Результаты в JSON можно сравнивать между версиями
+# Запуск: python bench_http.py --pages 500 --latency-ms 20 --error-rate 0.02 --json --output bench.json
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Тестовый сервер: каждый "хост" - отдельный порт на 127.0.0.1
+def make_handler(config, slow):
+    latency = (config["slow_latency_ms"] if slow else config["latency_ms"]) / 1000
+    filler = ("<p>" + "Синтетический текст страницы для нагрузочного теста. " * 20 + "</p>\n").encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_body(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            if self.path == "/index":
+                self.send_body(200, self.index_page())
+                return
+            # Ошибки повторяются при каждом запуске: выбор зависит только от пути
+            if random.Random(self.path).random() < config["error_rate"]:
+                self.send_body(500, b"<html><body>error</body></html>")
+                return
+            self.send_body(200, self.content_page())
+
+        def index_page(self):
+            hosts = config["hosts"]
+            rows = []
+            for num in range(config["pages"]):
+                host = hosts[num % len(hosts)]
+                rows.append(f'<a href="http://{host}/page/{num}/" title="Страница {num}">Страница {num}</a>')
+            return f"<html><body>{''.join(rows)}</body></html>".encode("utf-8")
+
+        def content_page(self):
+            links = "".join(f'<a href="/page/{num}/">{num}</a>' for num in range(config["links"]))
+            head = f"<html><head><title>{self.path}</title></head><body>{links}\n".encode("utf-8")
+            repeats = max(1, config["page_kb"] * 1024 // len(filler))
+            return head + filler * repeats + b"</body></html>"
+
+    return Handler
+
+# Клиенты закрывают keep-alive соединения в конце сценария; такие разрывы не ошибка
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+def serve(config, ports):
+    servers = []
+    for num in range(config["host_count"]):
+        slow = num < config["slow_hosts"]
+        servers.append(QuietServer(("127.0.0.1", 0), make_handler(config, slow)))
+    config["hosts"] = [f"127.0.0.1:{server.server_address[1]}" for server in servers]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    ports.put(config["hosts"])
+    while True:
+        time.sleep(3600)
+
+def peak_rss_mb():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux сообщает размер в КБ, macOS - в байтах
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+
+# Сценарий выполняется в отдельном процессе, чтобы пиковая память и время процессора
+# относились только к нему, а не к серверу и предыдущим сценариям
+def run_scenario(name, index_url, settings, workdir, config_file):
+    os.chdir(workdir)
+    sys.path.insert(0, settings["repo"])
+    from parser_engine import (ConfigManager, HttpClient, Info, PageDownloader, ScreenshotTaker, AsyncPageDownloader,
+                               percentile)
+
+    ConfigManager.CONFIG_FILE = config_file
+    logging.getLogger("WebDownloader").setLevel(logging.WARNING)
+    latencies = []
+    statuses = {}
+    messages = []
+
+    def record(response, *args, **kwargs):
+        latencies.append(response.elapsed.total_seconds())
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    def track_session():
+        session = HttpClient.session()
+        if record not in session.hooks["response"]:
+            session.hooks["response"].append(record)
+
+    links_file = os.path.join(workdir, "Sort_obj.txt")
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    if name == "extract":
+        items = 0
+        for _ in range(settings["repeat"]):
+            track_session()
+            items += len(Info(index_url, settings["parser"]).get_info())
+    elif name == "download":
+        worker = PageDownloader(links_file, index_url, "txt", workers=settings["workers"],
+                                log=messages.append)
+        track_session()
+        worker.run()
+        items = len(os.listdir("downloaded_pages"))
+    elif name == "async":
+        worker = AsyncPageDownloader(links_file, index_url, "txt", concurrency=settings["concurrency"],
+                                     log=messages.append)
+        worker.run()
+        items = len(os.listdir("downloaded_pages"))
+    else:
+        worker = ScreenshotTaker(links_file, index_url, browsers=settings["browsers"], log=messages.append)
+        worker.run()
+        items = len(os.listdir("screenshots")) if os.path.isdir("screenshots") else 0
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    requests_total = len(latencies)
+
+    # Процентиль движка, чтобы отчет совпадал со сводкой метрик; задержка в миллисекундах
+    def latency_ms(pct):
+        value = percentile(latencies, pct)
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        "scenario": name,
+        "items": items,
+        "seconds": round(elapsed, 3),
+        "items_per_second": round(items / elapsed, 1) if elapsed else None,
+        "requests": requests_total or None,
+        "errors": sum(count for status, count in statuses.items() if status >= 400) if statuses else None,
+        "latency_ms": {"p50": latency_ms(50), "p95": latency_ms(95), "p99": latency_ms(99)},
+        "cpu_seconds": round(cpu, 3),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def git_revision(repo):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_benchmark(args):
+    repo = os.path.dirname(os.path.abspath(__file__))
+    config = {
+        "pages": args.pages, "links": args.links, "page_kb": args.page_kb,
+        "latency_ms": args.latency_ms, "error_rate": args.error_rate,
+        "host_count": args.hosts, "slow_hosts": args.slow_hosts, "slow_latency_ms": args.slow_latency_ms,
+    }
+    settings = {"repo": repo, "repeat": args.repeat, "parser": args.parser,
+                "workers": args.workers, "concurrency": args.concurrency, "browsers": args.browsers}
+    scenarios = ["extract", "download"]
+    if args.use_async:
+        scenarios.append("async")
+    if args.screenshots:
+        scenarios.append("screenshots")
+
+    context = multiprocessing.get_context("spawn")
+    ports = context.Queue()
+    server = context.Process(target=serve, args=(config, ports), daemon=True)
+    server.start()
+    results = []
+    try:
+        hosts = ports.get(timeout=30)
+        index_url = f"http://{hosts[-1]}/index"
+        config_file = os.path.abspath("config.json")
+        with tempfile.TemporaryDirectory(prefix="bench_http_") as workdir:
+            # Файл ссылок для загрузки готовится один раз и не входит в замеры
+            with open(os.path.join(workdir, "Sort_obj.txt"), "w", encoding="utf-8") as f:
+                for num in range(args.pages):
+                    f.write(f"№{num + 1}, http://{hosts[num % len(hosts)]}/page/{num}/ - Страница {num}\n")
+            for name in scenarios:
+                scenario_dir = os.path.join(workdir, name)
+                os.makedirs(scenario_dir)
+                shutil.copyfile(os.path.join(workdir, "Sort_obj.txt"), os.path.join(scenario_dir, "Sort_obj.txt"))
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    results.append(executor.submit(run_scenario, name, index_url, settings,
+                                                   scenario_dir, config_file).result())
+    finally:
+        server.terminate()
+        server.join()
+
+    return {
+        "version": git_revision(repo),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server": {key: value for key, value in config.items() if key != "hosts"},
+        "settings": {key: value for key, value in settings.items() if key != "repo"},
+        "results": results,
+    }
+
+def print_table(report):
+    print(f"версия {report['version'] or '?'}, Python {report['python']}, {report['platform']}")
+    print(f"{'сценарий':<12}{'объектов':>10}{'время, с':>10}{'в секунду':>11}{'ошибок':>8}"
+          f"{'p50, мс':>9}{'p95, мс':>9}{'p99, мс':>9}{'CPU, с':>9}{'RSS, МБ':>9}")
+    for row in report["results"]:
+        latency = row["latency_ms"]
+        cells = [row["errors"], latency["p50"], latency["p95"], latency["p99"]]
+        errors, p50, p95, p99 = ("-" if value is None else value for value in cells)
+        print(f"{row['scenario']:<12}{row['items']:>10}{row['seconds']:>10}{row['items_per_second'] or 0:>11}"
+              f"{errors:>8}{p50:>9}{p95:>9}{p99:>9}{row['cpu_seconds']:>9}{row['peak_rss_mb'] or '-':>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест на локальном сервере")
+    parser.add_argument("--pages", type=int, default=300, help="страниц в индексе")
+    parser.add_argument("--links", type=int, default=50, help="ссылок на каждой странице")
+    parser.add_argument("--page-kb", type=int, default=50, help="размер страницы, КБ")
+    parser.add_argument("--latency-ms", type=int, default=10, help="задержка ответа сервера, мс")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--hosts", type=int, default=4, help="число хостов (портов) сервера")
+    parser.add_argument("--slow-hosts", type=int, default=0, help="из них медленных")
+    parser.add_argument("--slow-latency-ms", type=int, default=500, help="задержка медленных хостов, мс")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов извлечения ссылок")
+    parser.add_argument("--parser", default="auto", help="парсер ссылок")
+    parser.add_argument("--workers", type=int, default=8, help="потоков загрузки")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="также асинхронный движок")
+    parser.add_argument("--concurrency", type=int, default=200, help="одновременных запросов асинхронного движка")
+    parser.add_argument("--screenshots", action="store_true", help="также скриншоты (нужен config.json)")
+    parser.add_argument("--browsers", type=int, default=2, help="экземпляров браузера")
+    parser.add_argument("--json", action="store_true", help="вывод в формате JSON")
+    parser.add_argument("--output", help="сохранить результаты в JSON-файл")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_table(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import json
+import random
+import string
+import time
+
+from parser_engine import LinkExtractor
+
+# Сравнение скорости парсеров ссылок на больших синтетических страницах
+# Запуск: python bench_parsers.py --links 1000 10000 50000 --repeat 3
+
+def make_page(links, seed=0):
+    rnd = random.Random(seed)
+    rows = []
+    for num in range(links):
+        slug = "".join(rnd.choices(string.ascii_lowercase, k=12))
+        rows.append(
+            f'<div class="item"><span class="n">{num}</span>'
+            f'<a href="/catalog/{slug}/" title="Товар {num}">Товар {slug}</a>'
+            f'<p>Описание &amp; <b>характеристики</b> {slug}</p></div>'
+        )
+    return f"<html><head><title>Каталог</title></head><body>{''.join(rows)}</body></html>"
+
+def run_benchmark(sizes, repeat, backends, filter_keyword=None):
+    results = []
+    for size in sizes:
+        html = make_page(size)
+        for backend in backends:
+            extractor = LinkExtractor(backend)
+            if extractor.backend != backend:
+                continue
+            timings = []
+            found = 0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                found = len(extractor.extract(html, filter_keyword))
+                timings.append(time.perf_counter() - started)
+            best = min(timings)
+            results.append({
+                "backend": backend,
+                "links": size,
+                "page_bytes": len(html.encode("utf-8")),
+                "found": found,
+                "best_seconds": round(best, 4),
+                "links_per_second": int(found / best) if best else None,
+            })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение парсеров ссылок")
+    parser.add_argument("--links", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", nargs="+", default=None)
+    parser.add_argument("--filter", default=None)
+    parser.add_argument("--json", action="store_true", help="вывод в формате JSON")
+    args = parser.parse_args()
+
+    backends = args.backend or LinkExtractor.available_backends()
+    results = run_benchmark(args.links, args.repeat, backends, args.filter)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'парсер':<12}{'ссылок':>10}{'размер, КБ':>12}{'время, с':>12}{'ссылок/с':>12}")
+    for row in results:
+        print(f"{row['backend']:<12}{row['links']:>10}{row['page_bytes'] // 1024:>12}"
+              f"{row['best_seconds']:>12}{row['links_per_second'] or 0:>12}")
+
+if __name__ == "__main__":
+    main()
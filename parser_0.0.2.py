@@ -1,351 +1,275 @@
 import sys
-import threading
-import logging
-import requests
-from bs4 import BeautifulSoup
-import re
-from urllib.parse import urljoin
 import os
-import json
-import time
-from selenium import webdriver
-from selenium.webdriver.firefox.service import Service
-from selenium.webdriver.firefox.options import Options
+import re
+import multiprocessing
+from array import array
+from collections import deque
+from itertools import chain
+from urllib.parse import urlparse
 
 from PyQt5 import QtCore, QtWidgets, QtGui
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QPushButton, QLineEdit,
-    QTextEdit, QFileDialog, QMessageBox, QVBoxLayout, QHBoxLayout, QTabWidget,
-    QProgressBar, QRadioButton, QButtonGroup, QGroupBox
+    QFileDialog, QMessageBox, QVBoxLayout, QHBoxLayout, QTabWidget,
+    QProgressBar, QRadioButton, QButtonGroup, QGroupBox, QSpinBox, QCheckBox,
+    QComboBox, QListView, QAbstractItemView, QPlainTextEdit
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler()]
+from parser_engine import (
+    module_available, ConfigManager, HttpCache, CrawlJournal, PolitenessScheduler, LinkExtractionJob, LinkIndex,
+    JobControl, LineIndex, LinkChecker, LinkStatusTable,
+    PageDownloader, ScreenshotTaker, FetchPipeline, AsyncPageDownloader, ShardedJob, PageArchive, RequestMetrics, run_profiled
 )
-logger = logging.getLogger("WebDownloader")
-
-# Класс для работы с конфигурацией
-class ConfigManager:
-    CONFIG_FILE = "config.json"
-
-    @staticmethod
-    def load_config():
-        if os.path.exists(ConfigManager.CONFIG_FILE):
-            with open(ConfigManager.CONFIG_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        else:
-            # Если конфигурационный файл не существует, создать его с пустыми значениями
-            default_config = {
-                "geckodriver_path": "",
-                "browser_path": ""
-            }
-            ConfigManager.save_config(default_config)
-            return default_config
-
-    @staticmethod
-    def get_geckodriver_path():
-        config = ConfigManager.load_config()
-        return config.get("geckodriver_path", "")
-
-    @staticmethod
-    def get_browser_path():
-        config = ConfigManager.load_config()
-        return config.get("browser_path", "")
-
-    @staticmethod
-    def set_geckodriver_path(path):
-        config = ConfigManager.load_config()
-        config["geckodriver_path"] = path
-        ConfigManager.save_config(config)
-
-    @staticmethod
-    def set_browser_path(path):
-        config = ConfigManager.load_config()
-        config["browser_path"] = path
-        ConfigManager.save_config(config)
-
-    @staticmethod
-    def save_config(config):
-        with open(ConfigManager.CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(config, f, indent=4)
-
-# Класс для обработки веб-страниц
-class Info:
-    def __init__(self, site_name):
-        self.site_name = site_name
-
-    def status_site(self):
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        logger.info(f"Отправка запроса на {self.site_name}")
-        try:
-            response = requests.get(self.site_name, headers=headers, timeout=50)
-            response.encoding = response.apparent_encoding  # Принудительное указание кодировки
-            logger.info(f"Статус-код ответа: {response.status_code}")
-            if response.status_code == 200:
-                return response.status_code, response
-            else:
-                return None, None
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при выполнении запроса: {e}")
-            return None, None
-
-    def get_info(self, filter_keyword=None):
-        check_status, res = self.status_site()
-        if check_status == 200:
-            try:
-                res.encoding = 'utf-8'
-                soup = BeautifulSoup(res.text, "html.parser")
-                logger.info("Операция прошла успешно")
-                if filter_keyword:
-                    links = soup.find_all("a", href=re.compile(filter_keyword, re.I))
-                else:
-                    links = soup.find_all("a")
-                return links
-            except Exception as e:
-                logger.error(f"Ошибка при обработке контента: {e}")
-                return []
-        else:
-            logger.error("Не удалось получить страницу, статус-код не 200.")
-            return []
-
-    def save_html(self, extension, filter_keyword=None):
-        links = self.get_info(filter_keyword)
-        if links:
-            file_path = f"Sort_obj.{extension}"
-            with open(file_path, "w", encoding="utf-8") as f:
-                for num, link in enumerate(links, start=1):
-                    href = link.get('href', 'Путь отсутствует')
-                    if href.startswith('/'):
-                        full_url = urljoin(self.site_name, href)
-                    else:
-                        full_url = href
-                    title = link.get('title', 'Нет названия!')
-                    link_info = f"№{num}, {full_url} - {title}\n"
-                    f.write(link_info)
-            logger.info(f"Ссылки успешно сохранены в {file_path}")
-            return file_path
-        return None
 
-# Класс для загрузки страниц
-class DownloaderThread(QThread):
+# Поток Qt, выполняющий задачу движка и передающий ее лог и прогресс в сигналы
+class WorkerThread(QThread):
     progress = pyqtSignal(int)
     log = pyqtSignal(str)
     finished_signal = pyqtSignal()
 
-    def __init__(self, file_with_links, base_url, extension, filter_keyword=None):
-        super().__init__()
-        self.file_with_links = file_with_links
-        self.output_dir = "downloaded_pages"
-        self.output_file = f"full_links.{extension}"
-        self.base_url = base_url
-        self.extension = extension
-        self.filter_keyword = filter_keyword
-
-    def sanitize_filename(self, url):
-        return re.sub(r'[<>:"/\\|?*]', '_', url)
-
-    def run(self):
-        if not os.path.exists(self.file_with_links):
-            self.log.emit(f"Файл {self.file_with_links} не найден.")
-            return
+    worker_class = None
 
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
-
-        skipped_links = []
-        try:
-            with open(self.file_with_links, "r", encoding="utf-8") as infile, open(self.output_file, "w", encoding="utf-8") as outfile:
-                links = infile.readlines()
-                if self.filter_keyword:
-                    links = [line for line in links if re.search(self.filter_keyword, line, re.I)]
-
-                total_links = len(links)
-                for idx, line in enumerate(links):
-                    match = re.search(r'(https?://[^\s]+|/[\w\-\/]+/)', line)
-                    if match:
-                        url = match.group(1)
-                        if url.startswith('/'):
-                            full_url = urljoin(self.base_url, url)
-                        else:
-                            full_url = url
-
-                        outfile.write(f"Полный URL: {full_url}\n")
-                        self.download_page(full_url)
-                    else:
-                        skipped_links.append(line)
-
-                    progress_percent = int((idx + 1) / total_links * 100)
-                    self.progress.emit(progress_percent)
-
-            self.log.emit(f"Обработка завершена, результаты сохранены в {self.output_file}")
-
-            if skipped_links:
-                self.log.emit("Пропущенные строки:")
-                for skipped in skipped_links:
-                    self.log.emit(skipped.strip())
-
-        except FileNotFoundError as e:
-            self.log.emit(f"Файл не найден: {e}")
-        finally:
-            self.finished_signal.emit()
-
-    def download_page(self, url):
-        try:
-            response = requests.get(url, timeout=110)
-            if response.status_code == 200:
-                sanitized_filename = self.sanitize_filename(url)
-                filename = f"{sanitized_filename.replace('https://', '').replace('/', '_')}.{self.extension}"
-                filepath = os.path.join(self.output_dir, filename)
-
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(response.text)
-                self.log.emit(f"Страница {url} успешно сохранена в файл {filepath}")
-            else:
-                self.log.emit(f"Не удалось скачать страницу {url}. Статус: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            self.log.emit(f"Ошибка при скачивании {url}: {e}")
-
-# Класс для создания скриншотов
-class ScreenshotThread(QThread):
-    progress = pyqtSignal(int)
-    log = pyqtSignal(str)
-    finished_signal = pyqtSignal()
-
-    def __init__(self, file_with_links, base_url, filter_keyword=None):
+    def __init__(self, *args, **kwargs):
         super().__init__()
-        self.file_with_links = file_with_links
-        self.base_url = base_url
-        self.filter_keyword = filter_keyword
-
-    def sanitize_filename(self, url):
-        return re.sub(r'[<>:"/\\|?*]', '_', url)
+        self.worker = self.worker_class(*args, log=self.log.emit, progress=self.progress.emit, **kwargs)
+        self.profile_output = None  # путь к файлу профиля, если задачу нужно профилировать
 
     def run(self):
-        if not os.path.exists(self.file_with_links):
-            self.log.emit(f"Файл {self.file_with_links} не найден.")
-            return
-
-        screenshot_dir = 'screenshots'
-        if not os.path.exists(screenshot_dir):
-            os.makedirs(screenshot_dir)
-
-        skipped_links = []
         try:
-            with open(self.file_with_links, "r", encoding="utf-8") as infile:
-                links = infile.readlines()
-                if self.filter_keyword:
-                    links = [line for line in links if re.search(self.filter_keyword, line, re.I)]
-
-                total_links = len(links)
-                for idx, line in enumerate(links):
-                    match = re.search(r'(https?://[^\s]+|/[\w\-\/]+/)', line)
-                    if match:
-                        url = match.group(1)
-                        if url.startswith('/'):
-                            full_url = urljoin(self.base_url, url)
-                        else:
-                            full_url = url
-
-                        file_name = os.path.join(screenshot_dir, f"screenshot_{idx + 1}.png")
-                        self.screenshot(full_url, file_name)
-                    else:
-                        skipped_links.append(line)
-
-                    progress_percent = int((idx + 1) / total_links * 100)
-                    self.progress.emit(progress_percent)
-
-            self.log.emit(f"Обработка завершена. Скриншоты сохранены в {screenshot_dir}")
-
-            if skipped_links:
-                self.log.emit("Пропущенные строки:")
-                for skipped in skipped_links:
-                    self.log.emit(skipped.strip())
-
-        except FileNotFoundError as e:
-            self.log.emit(f"Файл не найден: {e}")
+            if self.profile_output:
+                run_profiled(self.worker.run, self.profile_output, log=self.log.emit)
+            else:
+                self.worker.run()
         finally:
             self.finished_signal.emit()
 
-    def screenshot(self, url, file_name):
-        geckodriver_path = ConfigManager.get_geckodriver_path()
-
-        if not geckodriver_path or not os.path.exists(geckodriver_path):
-            self.log.emit(f"Некорректный путь к geckodriver: {geckodriver_path}")
-            return
+# Извлечение ссылок в фоне, чтобы окно не зависало на время запроса
+class ExtractionThread(WorkerThread):
+    worker_class = LinkExtractionJob
 
-        firefox_binary_path = ConfigManager.get_browser_path()
-        if not firefox_binary_path or not os.path.exists(firefox_binary_path):
-            self.log.emit(f"Некорректный путь к браузеру: {firefox_binary_path}")
-            return
+# Проверка ссылок перед загрузкой (HEAD)
+class CheckThread(WorkerThread):
+    worker_class = LinkChecker
 
-        options = Options()
-        options.binary_location = firefox_binary_path
-        options.headless = True
-
-        service = Service(executable_path=geckodriver_path)
-        driver = webdriver.Firefox(service=service, options=options)
+# Класс для загрузки страниц
+class DownloaderThread(WorkerThread):
+    worker_class = PageDownloader
 
-        try:
-            self.log.emit(f"Открытие страницы {url} для создания скриншота.")
-            driver.get(url)
+# Класс для создания скриншотов
+class ScreenshotThread(WorkerThread):
+    worker_class = ScreenshotTaker
 
-            # Дождаться полной загрузки страницы
-            time.sleep(2)
+# Страницы и скриншоты за один проход: каждая ссылка скачивается один раз
+class PipelineThread(WorkerThread):
+    worker_class = FetchPipeline
 
-            # Получить размер страницы
-            total_height = driver.execute_script("return document.body.scrollHeight")
-            driver.set_window_size(1920, total_height)
-            time.sleep(2)
+# Адаптер асинхронного движка к сигналам Qt
+class AsyncDownloaderThread(WorkerThread):
+    worker_class = AsyncPageDownloader
 
-            screenshot = driver.save_screenshot(file_name)
-            if screenshot:
-                self.log.emit(f"Скриншот сохранен как {file_name}")
-            else:
-                self.log.emit(f"Ошибка при создании скриншота для {url}")
-        except Exception as e:
-            self.log.emit(f"Ошибка при создании скриншота для {url}: {e}")
-        finally:
-            driver.quit()
+# Обработка файла ссылок по шардам в нескольких процессах
+class ShardedThread(WorkerThread):
+    worker_class = ShardedJob
 
-# Диалог для редактирования файла ссылок
+# Модель строк файла ссылок: QListView запрашивает только видимые строки, а они читаются
+# с диска блоками (LineIndex). Правки, добавленные и удаленные строки хранятся отдельно
+# от файла до сохранения. rows - номера строк, видимых при текущем фильтре
+class LinkFileModel(QtCore.QAbstractListModel):
+    def __init__(self, file_path):
+        super().__init__()
+        self.file_path = file_path
+        self.lines = LineIndex(file_path)
+        self.edits = {}
+        self.added = []
+        self.deleted = set()
+        self.rows = array("L", range(len(self.lines)))
+
+    def total(self):
+        return len(self.lines) + len(self.added)
+
+    def text(self, line):
+        if line in self.edits:
+            return self.edits[line]
+        if line >= len(self.lines):
+            return self.added[line - len(self.lines)]
+        return self.lines.line(line)
+
+    def all_lines(self):
+        # (номер, текст) всех неудаленных строк с учетом правок; файл читается потоком
+        for line, text in enumerate(chain(self.lines, self.added)):
+            if line not in self.deleted:
+                yield line, self.edits.get(line, text)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        return self.text(self.rows[index.row()])
+
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        self.edits[self.rows[index.row()]] = value
+        self.dataChanged.emit(index, index)
+        return True
+
+    def set_filter(self, pattern):
+        pattern = pattern.lower()
+        self.beginResetModel()
+        self.rows = array("L", (line for line, text in self.all_lines() if pattern in text.lower()))
+        self.endResetModel()
+
+    def find(self, pattern, start):
+        # Следующая видимая строка с подстрокой, по кругу от start; -1, если таких нет
+        pattern = pattern.lower()
+        count = len(self.rows)
+        for offset in range(count):
+            row = (start + offset) % count
+            if pattern in self.text(self.rows[row]).lower():
+                return row
+        return -1
+
+    def append_line(self, text=""):
+        row = len(self.rows)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.added.append(text)
+        self.rows.append(self.total() - 1)
+        self.endInsertRows()
+        return self.index(row)
+
+    def remove_rows(self, rows):
+        for row in sorted(rows, reverse=True):
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+            self.deleted.add(self.rows[row])
+            del self.rows[row]
+            self.endRemoveRows()
+
+    def save(self):
+        # Запись во временный файл и замена: прерванное сохранение не портит файл ссылок
+        tmp_path = f"{self.file_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for _, text in self.all_lines():
+                f.write(text + "\n")
+        self.lines.close()
+        os.replace(tmp_path, self.file_path)
+        self.beginResetModel()
+        self.lines = LineIndex(self.file_path)
+        self.edits = {}
+        self.added = []
+        self.deleted = set()
+        self.rows = array("L", range(len(self.lines)))
+        self.endResetModel()
+
+    def close(self):
+        self.lines.close()
+
+# Диалог для редактирования файла ссылок любого размера: строка правится двойным щелчком,
+# фильтр оставляет только строки с подстрокой
 class EditFileDialog(QtWidgets.QDialog):
     def __init__(self, file_path):
         super().__init__()
         self.setWindowTitle("Редактирование файла ссылок")
-        self.setGeometry(150, 150, 600, 400)
+        self.setGeometry(150, 150, 800, 500)
         self.file_path = file_path
+        self.model = LinkFileModel(file_path)
+        self.finished.connect(lambda result: self.model.close())
         self.init_ui()
 
     def init_ui(self):
         layout = QVBoxLayout()
 
-        self.text_editor = QTextEdit()
-        with open(self.file_path, "r", encoding="utf-8") as file:
-            content = file.read()
-        self.text_editor.setText(content)
-        layout.addWidget(self.text_editor)
-
+        # Фильтр применяется после паузы в наборе, чтобы не перечитывать файл на каждую букву
+        search_layout = QHBoxLayout()
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Фильтр: показывать строки с подстрокой")
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(300)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.filter_input.textChanged.connect(lambda text: self.filter_timer.start())
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Найти")
+        self.search_input.returnPressed.connect(self.find_next)
+        find_button = QPushButton("Найти далее")
+        find_button.clicked.connect(self.find_next)
+        search_layout.addWidget(self.filter_input)
+        search_layout.addWidget(self.search_input)
+        search_layout.addWidget(find_button)
+        layout.addLayout(search_layout)
+
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.list_view.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed)
+        self.list_view.setModel(self.model)
+        layout.addWidget(self.list_view)
+
+        self.count_label = QLabel()
+        layout.addWidget(self.count_label)
+        self.model.modelReset.connect(self.update_count)
+        self.model.rowsInserted.connect(self.update_count)
+        self.model.rowsRemoved.connect(self.update_count)
+        self.update_count()
+
+        buttons_layout = QHBoxLayout()
+        add_button = QPushButton("Добавить строку")
+        add_button.clicked.connect(self.add_line)
+        remove_button = QPushButton("Удалить выбранные")
+        remove_button.clicked.connect(self.remove_selected)
         save_button = QPushButton("Сохранить")
         save_button.clicked.connect(self.save_file)
-        layout.addWidget(save_button)
+        buttons_layout.addWidget(add_button)
+        buttons_layout.addWidget(remove_button)
+        buttons_layout.addWidget(save_button)
+        layout.addLayout(buttons_layout)
 
         self.setLayout(layout)
 
+    def update_count(self):
+        self.count_label.setText(f"Строк: {self.model.total() - len(self.model.deleted)}, "
+                                 f"показано: {self.model.rowCount()}")
+
+    def apply_filter(self):
+        self.model.set_filter(self.filter_input.text())
+
+    def find_next(self):
+        pattern = self.search_input.text()
+        if not pattern:
+            return
+        current = self.list_view.currentIndex()
+        row = self.model.find(pattern, current.row() + 1 if current.isValid() else 0)
+        if row < 0:
+            QMessageBox.information(self, "Поиск", "Совпадений не найдено.")
+            return
+        index = self.model.index(row)
+        self.list_view.setCurrentIndex(index)
+        self.list_view.scrollTo(index)
+
+    def add_line(self):
+        index = self.model.append_line()
+        self.list_view.scrollTo(index)
+        self.list_view.setCurrentIndex(index)
+        self.list_view.edit(index)
+
+    def remove_selected(self):
+        self.model.remove_rows([index.row() for index in self.list_view.selectedIndexes()])
+
     def save_file(self):
-        new_content = self.text_editor.toPlainText().strip()
-        with open(self.file_path, "w", encoding="utf-8") as file:
-            file.write(new_content)
+        self.model.save()
         QMessageBox.information(self, "Успех", "Файл успешно сохранен.")
         self.accept()
 
 # Основное приложение с интерфейсом PyQt5
 class MainWindow(QMainWindow):
+    LOG_LINES = 5000
+    LOG_FILE = "parser_gui.log"
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Web Downloader & Screenshot Tool")
@@ -374,14 +298,44 @@ class MainWindow(QMainWindow):
         url_layout = QHBoxLayout()
         url_label = QLabel("Введите URL сайта:")
         self.url_input = QLineEdit()
+        self.url_input.setPlaceholderText("несколько адресов - через пробел")
         url_layout.addWidget(url_label)
         url_layout.addWidget(self.url_input)
         layout.addLayout(url_layout)
 
-        # Кнопка обработки URL
+        # Кнопки обработки URL и ее отмены, ограничение времени извлечения
+        process_layout = QHBoxLayout()
         self.process_url_button = QPushButton("Обработать URL")
         self.process_url_button.clicked.connect(self.process_url)
-        layout.addWidget(self.process_url_button)
+        self.cancel_url_button = QPushButton("Отменить")
+        self.cancel_url_button.setEnabled(False)
+        self.cancel_url_button.clicked.connect(self.cancel_process_url)
+        extract_timeout_label = QLabel("Таймаут, с:")
+        self.extract_timeout_input = QSpinBox()
+        self.extract_timeout_input.setRange(5, 3600)
+        self.extract_timeout_input.setValue(int(ConfigManager.get("extract_timeout")))
+        process_layout.addWidget(self.process_url_button)
+        process_layout.addWidget(self.cancel_url_button)
+        process_layout.addWidget(extract_timeout_label)
+        process_layout.addWidget(self.extract_timeout_input)
+        layout.addLayout(process_layout)
+
+        # Рекурсивный обход сайта
+        crawl_layout = QHBoxLayout()
+        crawl_label = QLabel("Глубина обхода сайта:")
+        self.crawl_depth_input = QSpinBox()
+        self.crawl_depth_input.setRange(1, 10)
+        self.crawl_depth_input.setValue(1)
+        self.crawl_depth_input.setToolTip("1 - только ссылки с введенной страницы")
+        self.crawl_prefix_checkbox = QCheckBox("Только внутри пути введенного URL")
+        crawl_layout.addWidget(crawl_label)
+        crawl_layout.addWidget(self.crawl_depth_input)
+        crawl_layout.addWidget(self.crawl_prefix_checkbox)
+        layout.addLayout(crawl_layout)
+
+        # Повторное извлечение: обрабатывать только разницу с прошлым разом
+        self.diff_checkbox = QCheckBox("Только новые и измененные ссылки (сравнение с прошлым извлечением)")
+        layout.addWidget(self.diff_checkbox)
 
         # Выбор файла ссылок
         file_layout = QHBoxLayout()
@@ -397,6 +351,19 @@ class MainWindow(QMainWindow):
         self.edit_file_button.clicked.connect(self.edit_file)
         layout.addWidget(self.edit_file_button)
 
+        # Проверка ссылок перед загрузкой: недоступные, не-HTML и ведущие на одну страницу
+        # ссылки можно затем пропустить при загрузке и скриншотах
+        check_layout = QHBoxLayout()
+        self.check_button = QPushButton("Проверить ссылки")
+        self.check_button.clicked.connect(self.check_links)
+        self.check_checkbox = QCheckBox("Пропускать ссылки, отсеянные проверкой (недоступные, не HTML, дубликаты)")
+        self.clear_checks_button = QPushButton("Очистить результаты проверки")
+        self.clear_checks_button.clicked.connect(self.clear_checks)
+        check_layout.addWidget(self.check_button)
+        check_layout.addWidget(self.clear_checks_button)
+        check_layout.addWidget(self.check_checkbox)
+        layout.addLayout(check_layout)
+
         # Фильтр ссылок
         filter_layout = QHBoxLayout()
         filter_label = QLabel("Фильтр ссылок (по href или title):")
@@ -429,20 +396,211 @@ class MainWindow(QMainWindow):
         download_group.setLayout(download_layout)
         layout.addWidget(download_group)
 
-        # Кнопка начала обработки
+        # Число потоков загрузки
+        workers_layout = QHBoxLayout()
+        workers_label = QLabel("Потоков загрузки:")
+        self.workers_input = QSpinBox()
+        self.workers_input.setRange(1, 64)
+        self.workers_input.setValue(int(ConfigManager.get("workers")))
+        workers_layout.addWidget(workers_label)
+        workers_layout.addWidget(self.workers_input)
+        layout.addLayout(workers_layout)
+
+        # Одновременных запросов к одному хосту; 0 - столько же, сколько потоков загрузки
+        # (в асинхронном режиме - сколько запросов одновременно)
+        max_per_host_layout = QHBoxLayout()
+        max_per_host_label = QLabel("Запросов к одному хосту:")
+        self.max_per_host_input = QSpinBox()
+        self.max_per_host_input.setRange(0, 64)
+        self.max_per_host_input.setSpecialValueText("по числу потоков или запросов")
+        self.max_per_host_input.setValue(int(ConfigManager.get("max_per_host")))
+        max_per_host_layout.addWidget(max_per_host_label)
+        max_per_host_layout.addWidget(self.max_per_host_input)
+        layout.addLayout(max_per_host_layout)
+
+        # Число процессов: файл ссылок делится на шарды по хешу URL (в вежливом режиме - по хостам,
+        # чтобы паузы между запросами к хосту соблюдались в одном процессе)
+        processes_layout = QHBoxLayout()
+        processes_label = QLabel("Процессов (1 - без шардирования):")
+        self.processes_input = QSpinBox()
+        self.processes_input.setRange(1, max(1, os.cpu_count() or 1) * 2)
+        self.processes_input.setValue(1)
+        processes_layout.addWidget(processes_label)
+        processes_layout.addWidget(self.processes_input)
+        layout.addLayout(processes_layout)
+
+        # Число экземпляров браузера для скриншотов
+        browsers_layout = QHBoxLayout()
+        browsers_label = QLabel("Экземпляров браузера:")
+        self.browsers_input = QSpinBox()
+        self.browsers_input.setRange(1, 16)
+        self.browsers_input.setValue(int(ConfigManager.get("browsers")))
+        browsers_layout.addWidget(browsers_label)
+        browsers_layout.addWidget(self.browsers_input)
+        # Браузер перезапускается после этого числа страниц, чтобы не накапливал память
+        browser_max_pages_label = QLabel("Страниц до перезапуска браузера:")
+        self.browser_max_pages_input = QSpinBox()
+        self.browser_max_pages_input.setRange(1, 10000)
+        self.browser_max_pages_input.setValue(int(ConfigManager.get("browser_max_pages")))
+        browsers_layout.addWidget(browser_max_pages_label)
+        browsers_layout.addWidget(self.browser_max_pages_input)
+        layout.addLayout(browsers_layout)
+
+        # Ожидание готовности страницы перед скриншотом
+        wait_layout = QHBoxLayout()
+        wait_selector_label = QLabel("CSS-селектор ожидания:")
+        self.wait_selector_input = QLineEdit()
+        self.wait_selector_input.setPlaceholderText("необязательно")
+        wait_timeout_label = QLabel("Макс. ожидание, с:")
+        self.wait_timeout_input = QSpinBox()
+        self.wait_timeout_input.setRange(1, 120)
+        self.wait_timeout_input.setValue(int(ConfigManager.get("wait_timeout")))
+        wait_layout.addWidget(wait_selector_label)
+        wait_layout.addWidget(self.wait_selector_input)
+        wait_layout.addWidget(wait_timeout_label)
+        wait_layout.addWidget(self.wait_timeout_input)
+        layout.addLayout(wait_layout)
+
+        # Формат и обработка скриншотов (WebP/JPEG и миниатюры требуют Pillow)
+        image_layout = QHBoxLayout()
+        image_format_label = QLabel("Формат скриншотов:")
+        self.image_format_input = QComboBox()
+        self.image_format_input.addItems(["png", "webp", "jpeg"])
+        quality_label = QLabel("Качество:")
+        self.quality_input = QSpinBox()
+        self.quality_input.setRange(1, 100)
+        self.quality_input.setValue(80)
+        self.thumbnail_checkbox = QCheckBox("Миниатюры")
+        image_layout.addWidget(image_format_label)
+        image_layout.addWidget(self.image_format_input)
+        image_layout.addWidget(quality_label)
+        image_layout.addWidget(self.quality_input)
+        image_layout.addWidget(self.thumbnail_checkbox)
+        layout.addLayout(image_layout)
+
+        # Асинхронный режим извлечения ссылок и загрузки страниц; число одновременных запросов
+        # задается отдельно от числа потоков и может быть намного больше
+        async_layout = QHBoxLayout()
+        self.async_checkbox = QCheckBox("Асинхронное извлечение ссылок и загрузка страниц (aiohttp)")
+        self.async_checkbox.setEnabled(module_available("aiohttp"))
+        concurrency_label = QLabel("Запросов одновременно:")
+        self.concurrency_input = QSpinBox()
+        self.concurrency_input.setRange(1, 10000)
+        self.concurrency_input.setValue(int(ConfigManager.get("async_concurrency")))
+        self.concurrency_input.setEnabled(module_available("aiohttp"))
+        async_layout.addWidget(self.async_checkbox)
+        async_layout.addWidget(concurrency_label)
+        async_layout.addWidget(self.concurrency_input)
+        layout.addLayout(async_layout)
+
+        # В режиме "оба" браузер может открыть уже скачанную страницу вместо повторной загрузки
+        self.render_saved_checkbox = QCheckBox("Скриншоты по скачанному HTML (без повторной загрузки страницы)")
+        layout.addWidget(self.render_saved_checkbox)
+
+        # Дисковый HTTP-кэш
+        cache_layout = QHBoxLayout()
+        self.cache_checkbox = QCheckBox("Использовать HTTP-кэш")
+        self.offline_checkbox = QCheckBox("Только кэш (офлайн)")
+        cache_layout.addWidget(self.cache_checkbox)
+        cache_layout.addWidget(self.offline_checkbox)
+        layout.addLayout(cache_layout)
+
+        # Сжатый архив страниц вместо отдельного файла на каждую страницу
+        self.archive_checkbox = QCheckBox("Сохранять страницы в сжатый архив (pages_archive)")
+        layout.addWidget(self.archive_checkbox)
+
+        # Вежливый режим: паузы между запросами к одному хосту и robots.txt
+        polite_layout = QHBoxLayout()
+        self.polite_checkbox = QCheckBox("Вежливый режим (robots.txt, паузы, повтор при 429/5xx)")
+        polite_delay_label = QLabel("Пауза на хост, мс:")
+        self.polite_delay_input = QSpinBox()
+        self.polite_delay_input.setRange(0, 60000)
+        self.polite_delay_input.setSingleStep(100)
+        self.polite_delay_input.setValue(int(ConfigManager.get("delay") * 1000))
+        polite_layout.addWidget(self.polite_checkbox)
+        polite_layout.addWidget(polite_delay_label)
+        polite_layout.addWidget(self.polite_delay_input)
+        layout.addLayout(polite_layout)
+
+        # Продолжение прерванного задания по журналу
+        self.resume_checkbox = QCheckBox("Продолжить прерванное задание (пропустить готовые ссылки)")
+        self.resume_checkbox.setChecked(True)
+        layout.addWidget(self.resume_checkbox)
+
+        # Метрики запросов и профилирование
+        diagnostics_layout = QHBoxLayout()
+        self.metrics_checkbox = QCheckBox("Записывать метрики ссылок (metrics.jsonl)")
+        self.profile_checkbox = QCheckBox("Профилирование (cProfile)")
+        diagnostics_layout.addWidget(self.metrics_checkbox)
+        diagnostics_layout.addWidget(self.profile_checkbox)
+        layout.addLayout(diagnostics_layout)
+
+        # Кнопка начала обработки, отмена и пауза задания
+        job_layout = QHBoxLayout()
         self.download_button = QPushButton("Начать")
         self.download_button.clicked.connect(self.start_processing)
-        layout.addWidget(self.download_button)
+        self.pause_button = QPushButton("Пауза")
+        self.pause_button.setEnabled(False)
+        self.pause_button.clicked.connect(self.toggle_pause)
+        self.cancel_button = QPushButton("Остановить")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_processing)
+        job_layout.addWidget(self.download_button)
+        job_layout.addWidget(self.pause_button)
+        job_layout.addWidget(self.cancel_button)
+        layout.addLayout(job_layout)
+
+        # Выполняющиеся запросы (самые долгие первыми): медленную ссылку или хост можно пропустить
+        # или отложить в конец очереди. Можно ввести ссылку или хост вручную
+        slow_layout = QHBoxLayout()
+        slow_label = QLabel("Выполняются:")
+        self.in_flight_input = QComboBox()
+        self.in_flight_input.setEditable(True)
+        self.in_flight_input.lineEdit().setPlaceholderText("ссылка или хост")
+        self.skip_url_button = QPushButton("Пропустить ссылку")
+        self.skip_url_button.clicked.connect(self.skip_url)
+        self.skip_host_button = QPushButton("Пропустить хост")
+        self.skip_host_button.clicked.connect(self.skip_host)
+        self.defer_host_button = QPushButton("Хост в конец очереди")
+        self.defer_host_button.clicked.connect(self.defer_host)
+        slow_layout.addWidget(slow_label)
+        slow_layout.addWidget(self.in_flight_input, 1)
+        slow_layout.addWidget(self.skip_url_button)
+        slow_layout.addWidget(self.skip_host_button)
+        slow_layout.addWidget(self.defer_host_button)
+        layout.addLayout(slow_layout)
+        self.control = None
+        self.active_threads = []
+        self.phase_progress = {}
+        self.extraction_thread = None
+        self.set_job_controls(False)
 
         # Прогрессбар
         self.progress_bar = QProgressBar()
         self.progress_bar.setValue(0)
         layout.addWidget(self.progress_bar)
 
+        # Сводка метрик текущего задания, обновляется раз в секунду
+        self.metrics = None
+        self.metrics_label = QLabel("")
+        layout.addWidget(self.metrics_label)
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self.update_metrics)
+        self.metrics_timer.start(1000)
+
         # Лог вывода
-        self.log_output = QTextEdit()
+        # В окне остаются последние LOG_LINES строк, полный лог пишется в LOG_FILE. Сообщения
+        # копятся в очереди и выводятся пачкой по таймеру, а не перерисовкой на каждое сообщение
+        self.log_output = QPlainTextEdit()
         self.log_output.setReadOnly(True)
+        self.log_output.setMaximumBlockCount(self.LOG_LINES)
         layout.addWidget(self.log_output)
+        self.pending_log = deque(maxlen=self.LOG_LINES)
+        self.log_file = open(self.LOG_FILE, "a", encoding="utf-8")
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(200)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start()
 
         self.main_tab.setLayout(layout)
 
@@ -474,6 +632,28 @@ class MainWindow(QMainWindow):
         browser_layout.addWidget(self.browser_browse_btn)
         settings_layout.addLayout(browser_layout)
 
+        # Параметры производительности; задачи читают их из config.json при запуске
+        performance_group = QGroupBox("Производительность:")
+        performance_layout = QVBoxLayout()
+        self.performance_inputs = {}
+        for key, title, minimum, maximum in (
+            ("request_timeout", "Таймаут загрузки страницы, с:", 5, 600),
+            ("encoders", "Потоков обработки скриншотов:", 1, 16),
+            ("max_page_mb", "Максимальный размер страницы, МБ:", 1, 2048),
+            ("http_cache_mb", "Размер HTTP-кэша, МБ:", 16, 102400),
+            ("http_cache_ttl", "Использовать кэш без повторной проверки, с (0 - проверять всегда):", 0, 2592000),
+            ("probe_ttl", "Срок действия проверки ссылок, ч (0 - бессрочно):", 0, 8760),
+        ):
+            row_layout = QHBoxLayout()
+            spin_box = QSpinBox()
+            spin_box.setRange(minimum, maximum)
+            row_layout.addWidget(QLabel(title))
+            row_layout.addWidget(spin_box)
+            performance_layout.addLayout(row_layout)
+            self.performance_inputs[key] = spin_box
+        performance_group.setLayout(performance_layout)
+        settings_layout.addWidget(performance_group)
+
         # Кнопка сохранения настроек
         self.save_settings_btn = QPushButton("Сохранить настройки")
         self.save_settings_btn.clicked.connect(self.save_settings)
@@ -494,6 +674,9 @@ class MainWindow(QMainWindow):
         config = ConfigManager.load_config()
         self.geckodriver_input.setText(config.get("geckodriver_path", ""))
         self.browser_input.setText(config.get("browser_path", ""))
+        for key, spin_box in self.performance_inputs.items():
+            # В config.json значение может быть дробным (например, http_cache_ttl), а QSpinBox принимает только целые
+            spin_box.setValue(int(config[key]))
 
     def save_settings(self):
         geckodriver_path = self.geckodriver_input.text()
@@ -507,8 +690,8 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Предупреждение", "Путь к браузеру некорректен.")
             return
 
-        ConfigManager.set_geckodriver_path(geckodriver_path)
-        ConfigManager.set_browser_path(browser_path)
+        ConfigManager.update(geckodriver_path=geckodriver_path, browser_path=browser_path,
+                             **{key: spin_box.value() for key, spin_box in self.performance_inputs.items()})
 
         QMessageBox.information(self, "Успех", "Настройки сохранены успешно!")
 
@@ -522,25 +705,81 @@ class MainWindow(QMainWindow):
         if browser_path:
             self.browser_input.setText(browser_path)
 
+    # Адреса из поля URL (через пробел, запятую или точку с запятой); None, если среди них есть некорректные
+    def entered_urls(self):
+        urls = [url for url in re.split(r"[\s,;]+", self.url_input.text()) if url]
+        invalid = [url for url in urls if urlparse(url).scheme not in ("http", "https") or not urlparse(url).netloc]
+        if invalid:
+            QMessageBox.warning(self, "Предупреждение", f"Некорректный URL: {', '.join(invalid)}. "
+                                                        f"Адрес должен начинаться с http:// или https://")
+            return None
+        return urls
+
+    # Адрес, от которого разрешаются относительные ссылки файла, - первый из введенных, как в parser_cli.py
+    def base_url(self):
+        urls = self.entered_urls()
+        if urls is None:
+            return None
+        return urls[0] if urls else ""
+
     def process_url(self):
-        url = self.url_input.text()
+        urls = self.entered_urls()
+        if urls is None:
+            return
         extension = "txt" if self.txt_radio.isChecked() else "html"
         filter_keyword = self.filter_input.text().strip()
 
-        if not url:
+        if not urls:
             QMessageBox.warning(self, "Предупреждение", "Пожалуйста, введите URL.")
             return
-
-        self.info = Info(url)
-        file_with_links = self.info.save_html(extension, filter_keyword)
-
-        if not file_with_links:
+        self.remember_settings()
+
+        self.extraction_thread = ExtractionThread(
+            urls,
+            extension,
+            filter_keyword,
+            depth=self.crawl_depth_input.value(),
+            scope="prefix" if self.crawl_prefix_checkbox.isChecked() else "domain",
+            scheduler=self.make_scheduler(),
+            timeout=self.extract_timeout_input.value(),
+            diff=self.diff_checkbox.isChecked(),
+            workers=self.workers_input.value(),
+            max_per_host=self.max_per_host_input.value(),
+            use_async=self.async_checkbox.isChecked(),
+            concurrency=self.concurrency_input.value()
+        )
+        self.extraction_thread.progress.connect(self.update_progress)
+        self.extraction_thread.log.connect(self.log)
+        self.extraction_thread.finished_signal.connect(self.extraction_finished)
+        self.process_url_button.setEnabled(False)
+        self.cancel_url_button.setEnabled(True)
+        self.log(f"Извлечение ссылок: {', '.join(urls)}")
+        self.extraction_thread.start()
+
+    def cancel_process_url(self):
+        self.cancel_url_button.setEnabled(False)
+        self.extraction_thread.worker.cancel()
+
+    def extraction_finished(self):
+        self.process_url_button.setEnabled(True)
+        self.cancel_url_button.setEnabled(False)
+        job = self.extraction_thread.worker
+        if job.cancelled.is_set():
+            # Отмененное задание не меняет файл ссылок: прежний выбранный файл остается
+            QMessageBox.information(self, "Отменено", "Извлечение ссылок отменено.")
+            return
+        if not job.file_path:
             QMessageBox.critical(self, "Ошибка", "Не удалось получить ссылки с сайта.")
             return
 
-        self.file_path = file_with_links
-        QMessageBox.information(self, "Успех", f"Ссылки успешно извлечены и сохранены в формате {extension}.")
-        self.log(f"Ссылки с {url} были успешно извлечены в файл {file_with_links}")
+        self.file_path = job.file_path
+        self.file_label.setText(os.path.basename(job.file_path))
+        if job.full_path:
+            QMessageBox.information(self, "Успех", f"Ссылки извлечены. Новые и измененные ссылки - в файле "
+                                                 f"{job.file_path}, исчезнувшие - в {job.removed_path}.")
+        else:
+            QMessageBox.information(self, "Успех", f"Ссылки успешно извлечены и сохранены в формате {job.extension}.")
+        self.log(f"Ссылки были успешно извлечены в файл {job.file_path}")
 
     def choose_file(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Выбрать файл ссылок", "", "Text Files (*.txt);;HTML Files (*.html)")
@@ -555,8 +794,8 @@ class MainWindow(QMainWindow):
             return
 
         dialog = EditFileDialog(self.file_path)
-        dialog.exec_()
-        self.log(f"Файл ссылок {self.file_path} был отредактирован.")
+        if dialog.exec_() == QtWidgets.QDialog.Accepted:
+            self.log(f"Файл ссылок {self.file_path} был отредактирован.")
 
     def start_processing(self):
         if not hasattr(self, 'file_path') or not self.file_path:
@@ -571,77 +810,327 @@ class MainWindow(QMainWindow):
         elif self.both_radio.isChecked():
             choice = "both"
 
+        base_url = self.base_url()
+        if base_url is None:
+            return
         extension = "txt" if self.txt_radio.isChecked() else "html"
         filter_keyword = self.filter_input.text().strip()
+        self.remember_settings()
 
-        self.download_button.setEnabled(False)
+        self.begin_job()
 
-        if choice in ["pages", "both"]:
-            self.downloader_thread = DownloaderThread(
+        if self.metrics is not None:
+            self.metrics.close()
+        self.metrics = RequestMetrics("metrics.jsonl" if self.metrics_checkbox.isChecked() else None)
+
+        if self.processes_input.value() > 1:
+            self.sharded_thread = ShardedThread(
                 self.file_path,
-                self.url_input.text(),
+                base_url,
                 extension,
-                filter_keyword
+                filter_keyword,
+                mode=choice,
+                processes=self.processes_input.value(),
+                workers=self.workers_input.value(),
+                max_per_host=self.max_per_host_input.value(),
+                browsers=self.browsers_input.value(),
+                browser_max_pages=self.browser_max_pages_input.value(),
+                wait_selector=self.wait_selector_input.text().strip(),
+                wait_timeout=self.wait_timeout_input.value(),
+                resume=self.resume_checkbox.isChecked(),
+                polite=self.polite_checkbox.isChecked(),
+                delay=self.polite_delay_input.value() / 1000,
+                archive=self.archive_checkbox.isChecked(),
+                cache=self.cache_checkbox.isChecked(),
+                offline=self.offline_checkbox.isChecked(),
+                screenshot_options=self.screenshot_options(),
+                metrics=self.metrics_checkbox.isChecked(),
+                render_saved=self.render_saved_checkbox.isChecked(),
+                link_status=os.path.abspath(LinkStatusTable.STATUS_FILE) if self.check_checkbox.isChecked() else None,
+                control=self.control
             )
-            self.downloader_thread.progress.connect(self.update_progress)
-            self.downloader_thread.log.connect(self.log)
-            self.downloader_thread.finished_signal.connect(self.download_finished)
-            self.downloader_thread.start()
+            if self.metrics_checkbox.isChecked():
+                self.metrics_label.setText("Метрики шардов записываются в папку shards")
+            self.start_thread(self.sharded_thread)
+            return
+
+        if choice == "both" and not self.async_checkbox.isChecked():
+            self.pipeline_thread = PipelineThread(
+                self.file_path,
+                base_url,
+                extension,
+                filter_keyword,
+                render_saved=self.render_saved_checkbox.isChecked(),
+                state_journal=CrawlJournal(),
+                page_options=self.downloader_options(),
+                screenshot_options=self.screenshot_taker_options(),
+                control=self.control
+            )
+            if self.profile_checkbox.isChecked():
+                self.pipeline_thread.profile_output = "profile_pipeline.prof"
+            self.start_thread(self.pipeline_thread)
+            return
+
+        if choice in ["pages", "both"]:
+            if self.async_checkbox.isChecked():
+                self.downloader_thread = AsyncDownloaderThread(
+                    self.file_path,
+                    base_url,
+                    extension,
+                    filter_keyword,
+                    concurrency=self.concurrency_input.value(),
+                    max_per_host=self.max_per_host_input.value(),
+                    control=self.control
+                )
+            else:
+                self.downloader_thread = DownloaderThread(
+                    self.file_path,
+                    base_url,
+                    extension,
+                    filter_keyword,
+                    control=self.control,
+                    **self.downloader_options()
+                )
+            if self.profile_checkbox.isChecked():
+                self.downloader_thread.profile_output = "profile_pages.prof"
+            self.start_thread(self.downloader_thread)
 
         if choice in ["screenshots", "both"]:
             self.screenshot_thread = ScreenshotThread(
                 self.file_path,
-                self.url_input.text(),
-                filter_keyword
+                base_url,
+                filter_keyword,
+                control=self.control,
+                **self.screenshot_taker_options(link_status=True)
             )
-            self.screenshot_thread.progress.connect(self.update_progress)
-            self.screenshot_thread.log.connect(self.log)
-            self.screenshot_thread.finished_signal.connect(self.download_finished)
-            self.screenshot_thread.start()
+            if self.profile_checkbox.isChecked():
+                self.screenshot_thread.profile_output = "profile_screenshots.prof"
+            self.start_thread(self.screenshot_thread)
+
+    def begin_job(self):
+        self.control = JobControl()
+        self.active_threads = []
+        self.phase_progress = {}
+        self.progress_bar.setValue(0)
+        self.download_button.setEnabled(False)
+        self.check_button.setEnabled(False)
+        self.clear_checks_button.setEnabled(False)
+        self.pause_button.setText("Пауза")
+        self.set_job_controls(True)
+
+    def check_links(self):
+        if not hasattr(self, 'file_path') or not self.file_path:
+            QMessageBox.warning(self, "Предупреждение", "Пожалуйста, выберите или создайте файл ссылок.")
+            return
+        base_url = self.base_url()
+        if base_url is None:
+            return
+        self.begin_job()
+        self.check_thread = CheckThread(
+            self.file_path,
+            base_url,
+            self.filter_input.text().strip(),
+            max_per_host=self.max_per_host_input.value(),
+            scheduler=self.make_scheduler(),
+            control=self.control
+        )
+        self.start_thread(self.check_thread)
+
+    def clear_checks(self):
+        table = LinkStatusTable()
+        removed = table.clear()
+        table.close()
+        self.log(f"Удалено результатов проверки ссылок: {removed}")
+
+    def start_thread(self, thread):
+        # Задача завершена, когда закончили все ее потоки (в режиме "both" - страницы и скриншоты)
+        self.active_threads.append(thread)
+        self.phase_progress[thread] = 0
+        thread.progress.connect(self.update_phase_progress)
+        thread.log.connect(self.log)
+        thread.finished_signal.connect(self.thread_finished)
+        thread.start()
+
+    def thread_finished(self):
+        thread = self.sender()
+        if thread in self.active_threads:
+            self.active_threads.remove(thread)
+        if not self.active_threads:
+            self.download_finished()
+
+    def set_job_controls(self, running):
+        for widget in (self.pause_button, self.cancel_button, self.skip_url_button,
+                       self.skip_host_button, self.defer_host_button):
+            widget.setEnabled(running)
+        if not running:
+            self.in_flight_input.clear()
+
+    def toggle_pause(self):
+        if self.control.paused:
+            self.control.resume()
+            self.pause_button.setText("Пауза")
+            self.log("Задание продолжено.")
+        else:
+            self.control.pause()
+            self.pause_button.setText("Продолжить")
+            self.log("Задание приостановлено: начатые запросы завершаются, новые не начинаются.")
+
+    def cancel_processing(self):
+        self.control.cancel()
+        self.set_job_controls(False)
+        self.log("Остановка задания: ожидание завершения начатых запросов...")
+
+    def selected_target(self):
+        target = self.in_flight_input.currentText().strip()
+        if not target:
+            QMessageBox.warning(self, "Предупреждение", "Выберите или введите ссылку или хост.")
+        return target
+
+    def selected_host(self):
+        target = self.selected_target()
+        return urlparse(target).netloc.lower() if "://" in target else target.lower()
+
+    def skip_url(self):
+        target = self.selected_target()
+        if target:
+            self.control.skip(target)
+            self.log(f"Пропуск: {target}")
+
+    def skip_host(self):
+        host = self.selected_host()
+        if host:
+            self.control.skip(host)
+            self.log(f"Пропуск всех ссылок хоста {host}")
+
+    def defer_host(self):
+        host = self.selected_host()
+        if host:
+            self.control.deprioritize(host)
+            self.log(f"Ссылки хоста {host} будут обработаны в конце")
+
+    def update_in_flight(self):
+        # Список не обновляется, пока пользователь выбирает или вводит значение
+        combo = self.in_flight_input
+        if self.control is None or combo.view().isVisible() or combo.lineEdit().hasFocus():
+            return
+        current = combo.currentText()
+        combo.blockSignals(True)
+        combo.clear()
+        for url, seconds in self.control.slowest():
+            combo.addItem(url)
+            combo.setItemData(combo.count() - 1, f"выполняется {seconds:.0f} с", Qt.ToolTipRole)
+        combo.setEditText(current)
+        combo.blockSignals(False)
+
+    def downloader_options(self):
+        return {
+            "workers": self.workers_input.value(),
+            "max_per_host": self.max_per_host_input.value(),
+            "cache": self.make_cache(),
+            "journal": CrawlJournal(),
+            "resume": self.resume_checkbox.isChecked(),
+            "scheduler": self.make_scheduler(),
+            "archive": PageArchive() if self.archive_checkbox.isChecked() else None,
+            "metrics": self.metrics,
+            "link_index": LinkIndex() if self.diff_checkbox.isChecked() else None,
+            "link_status": LinkStatusTable() if self.check_checkbox.isChecked() else None
+        }
+
+    # link_status - только для отдельного задания скриншотов: в FetchPipeline ссылки отсеивает загрузка
+    def screenshot_taker_options(self, link_status=False):
+        return {
+            "browsers": self.browsers_input.value(),
+            "max_pages_per_browser": self.browser_max_pages_input.value(),
+            "wait_selector": self.wait_selector_input.text().strip(),
+            "wait_timeout": self.wait_timeout_input.value(),
+            "journal": CrawlJournal(),
+            "resume": self.resume_checkbox.isChecked(),
+            "metrics": self.metrics,
+            "link_status": LinkStatusTable() if link_status and self.check_checkbox.isChecked() else None,
+            **self.screenshot_options()
+        }
+
+    def screenshot_options(self):
+        return {
+            "image_format": self.image_format_input.currentText(),
+            "quality": self.quality_input.value(),
+            "thumbnail_width": 320 if self.thumbnail_checkbox.isChecked() else None
+        }
+
+    # Значения, выбранные на основной вкладке, становятся значениями по умолчанию при следующем запуске
+    def remember_settings(self):
+        ConfigManager.update(workers=self.workers_input.value(), max_per_host=self.max_per_host_input.value(),
+                             async_concurrency=self.concurrency_input.value(),
+                             browsers=self.browsers_input.value(),
+                             browser_max_pages=self.browser_max_pages_input.value(),
+                             wait_timeout=self.wait_timeout_input.value(),
+                             extract_timeout=self.extract_timeout_input.value(),
+                             delay=self.polite_delay_input.value() / 1000)
+
+    def make_scheduler(self):
+        if not self.polite_checkbox.isChecked():
+            return None
+        return PolitenessScheduler(min_delay=self.polite_delay_input.value() / 1000)
+
+    def make_cache(self):
+        if not (self.cache_checkbox.isChecked() or self.offline_checkbox.isChecked()):
+            return None
+        return HttpCache(offline=self.offline_checkbox.isChecked())
 
     def download_finished(self):
         self.download_button.setEnabled(True)
+        self.check_button.setEnabled(True)
+        self.clear_checks_button.setEnabled(True)
+        self.set_job_controls(False)
+        if self.control.cancelled.is_set():
+            self.log("Задача остановлена. Готовые ссылки сохранены в журнале, задание можно продолжить.")
+            return
         QMessageBox.information(self, "Успех", "Задача выполнена!")
         self.log("Задача выполнена.")
 
+    def update_metrics(self):
+        if self.metrics is not None and self.metrics.total:
+            self.metrics_label.setText(self.metrics.summary_message())
+        if self.active_threads:
+            self.update_in_flight()
+
     def update_progress(self, value):
         self.progress_bar.setValue(value)
 
-    def log(self, message):
-        self.log_output.append(message)
-
-# Диалог для редактирования файла ссылок
-class EditFileDialog(QtWidgets.QDialog):
-    def __init__(self, file_path):
-        super().__init__()
-        self.setWindowTitle("Редактирование файла ссылок")
-        self.setGeometry(150, 150, 600, 400)
-        self.file_path = file_path
-        self.init_ui()
-
-    def init_ui(self):
-        layout = QVBoxLayout()
-
-        self.text_editor = QTextEdit()
-        with open(self.file_path, "r", encoding="utf-8") as file:
-            content = file.read()
-        self.text_editor.setText(content)
-        layout.addWidget(self.text_editor)
+    def update_phase_progress(self, value):
+        # Общий прогресс задания - среднее по его потокам (страницы и скриншоты)
+        self.phase_progress[self.sender()] = value
+        self.progress_bar.setValue(sum(self.phase_progress.values()) // len(self.phase_progress))
+
+    def closeEvent(self, event):
+        # При закрытии окна начатые запросы завершаются, а журнал сохраняется; извлечение
+        # ссылок отменяется, и его незавершенные запросы не задерживают выход
+        if self.extraction_thread is not None and self.extraction_thread.isRunning():
+            self.extraction_thread.worker.cancel()
+            self.extraction_thread.wait()
+        if self.active_threads:
+            self.control.cancel()
+            self.log("Остановка задания перед выходом...")
+            for thread in list(self.active_threads):
+                thread.wait()
+        self.log_timer.stop()
+        self.flush_log()
+        self.log_file.close()
+        event.accept()
 
-        save_button = QPushButton("Сохранить")
-        save_button.clicked.connect(self.save_file)
-        layout.addWidget(save_button)
-
-        self.setLayout(layout)
+    def log(self, message):
+        self.log_file.write(message + "\n")
+        self.pending_log.append(message)
 
-    def save_file(self):
-        new_content = self.text_editor.toPlainText().strip()
-        with open(self.file_path, "w", encoding="utf-8") as file:
-            file.write(new_content)
-        QMessageBox.information(self, "Успех", "Файл успешно сохранен.")
-        self.accept()
+    def flush_log(self):
+        if not self.pending_log:
+            return
+        self.log_output.appendPlainText("\n".join(self.pending_log))
+        self.pending_log.clear()
+        self.log_file.flush()
 
 def main():
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
@@ -0,0 +1,309 @@
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+
+from parser_engine import (
+    logger, ConfigManager, HttpCache, CrawlJournal, PolitenessScheduler, LinkExtractionJob, LinkIndex, JobControl,
+    LinkChecker, LinkStatusTable,
+    PageDownloader, ScreenshotTaker, FetchPipeline, AsyncPageDownloader, ShardedJob, PageArchive, RequestMetrics, run_profiled
+)
+
+# Запуск без графического интерфейса: извлечение ссылок, загрузка страниц и скриншоты
+# Пример: python parser_cli.py --url https://example.com --mode both --workers 16
+
+# Вывод прогресса нескольких задач одной строкой в stderr
+class ConsoleProgress:
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def callback(self, name):
+        def update(value):
+            with self._lock:
+                if self.values.get(name) == value:
+                    return
+                self.values[name] = value
+                line = "  ".join(f"{job}: {percent}%" for job, percent in self.values.items())
+                self.stream.write(f"\r{line}")
+                self.stream.flush()
+        return update
+
+    def done(self):
+        if self.values:
+            self.stream.write("\n")
+            self.stream.flush()
+
+# Значения по умолчанию для параметров производительности берутся из config.json
+def build_parser():
+    parser = argparse.ArgumentParser(description="Web Downloader & Screenshot Tool без графического интерфейса")
+    parser.add_argument("--url", nargs="+", help="URL сайта для извлечения ссылок (можно несколько)")
+    parser.add_argument("--links-file", help="готовый файл ссылок (вместо извлечения по --url)")
+    parser.add_argument("--filter", default="", help="фильтр ссылок (регулярное выражение)")
+    parser.add_argument("--format", choices=["txt", "html"], default="txt", help="формат файлов ссылок и страниц")
+    parser.add_argument("--mode", choices=["links", "pages", "screenshots", "both"], default="both",
+                        help="links - только извлечь ссылки")
+    parser.add_argument("--depth", type=int, default=1, help="глубина обхода сайта (1 - только страница --url)")
+    parser.add_argument("--prefix-scope", action="store_true", help="обходить только пути под --url")
+    parser.add_argument("--extract-timeout", type=int, default=ConfigManager.get("extract_timeout"),
+                        help="максимальное время извлечения ссылок, с (0 - без ограничения)")
+    parser.add_argument("--diff", action="store_true",
+                        help="обрабатывать только ссылки, появившиеся или изменившиеся с прошлого извлечения "
+                             "(Sort_obj.delta.*), и отмечать страницы с изменившимся содержимым")
+    parser.add_argument("--check", action="store_true",
+                        help="перед обработкой проверить ссылки запросами HEAD и пропустить недоступные, не-HTML "
+                             "и ведущие на уже проверенную страницу (отчет link_status.tsv). "
+                             "С --mode links - только проверить")
+    parser.add_argument("--probe-workers", type=int, default=ConfigManager.get("probe_workers"),
+                        help="потоков проверки ссылок")
+    parser.add_argument("--check-ttl", type=float, default=ConfigManager.get("probe_ttl"),
+                        help="сколько часов действует результат проверки ссылки (0 - бессрочно)")
+    parser.add_argument("--clear-checks", action="store_true",
+                        help="удалить результаты прежних проверок ссылок (link_status.sqlite)")
+    parser.add_argument("--parser", default="auto", help="парсер ссылок: auto, selectolax, lxml, stream, bs4")
+    parser.add_argument("--workers", type=int, default=ConfigManager.get("workers"),
+                        help="потоков загрузки страниц")
+    parser.add_argument("--max-per-host", type=int, default=ConfigManager.get("max_per_host"),
+                        help="одновременных запросов к одному хосту (0 - по числу потоков или запросов)")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="асинхронное извлечение ссылок и загрузка страниц (aiohttp)")
+    parser.add_argument("--concurrency", type=int, default=ConfigManager.get("async_concurrency"),
+                        help="одновременных запросов в асинхронном режиме")
+    parser.add_argument("--browsers", type=int, default=ConfigManager.get("browsers"),
+                        help="экземпляров браузера для скриншотов")
+    parser.add_argument("--browser-max-pages", type=int, default=ConfigManager.get("browser_max_pages"),
+                        help="страниц на один экземпляр браузера, после чего он перезапускается")
+    parser.add_argument("--wait-selector", default="", help="CSS-селектор, которого ждать перед скриншотом")
+    parser.add_argument("--wait-timeout", type=int, default=ConfigManager.get("wait_timeout"),
+                        help="максимальное ожидание страницы, с")
+    parser.add_argument("--image-format", choices=["png", "webp", "jpeg"], default="png",
+                        help="формат скриншотов (webp и jpeg требуют Pillow)")
+    parser.add_argument("--quality", type=int, default=80, help="качество WebP/JPEG, 1-100")
+    parser.add_argument("--max-height", type=int, default=0, help="обрезать скриншот по высоте, px (0 - без ограничения)")
+    parser.add_argument("--tile-height", type=int, default=0, help="делить длинный скриншот на части этой высоты, px")
+    parser.add_argument("--thumbnail-width", type=int, default=0, help="ширина миниатюры, px (0 - без миниатюр)")
+    parser.add_argument("--encoders", type=int, default=ConfigManager.get("encoders"),
+                        help="потоков обработки скриншотов")
+    parser.add_argument("--render-saved", action="store_true",
+                        help="в режиме both открывать в браузере скачанный HTML вместо повторной загрузки страницы")
+    parser.add_argument("--cache", action="store_true", help="использовать HTTP-кэш")
+    parser.add_argument("--offline", action="store_true", help="только кэш, без сети")
+    parser.add_argument("--cache-ttl", type=float, default=ConfigManager.get("http_cache_ttl"),
+                        help="сколько секунд страница из кэша используется без повторной проверки "
+                             "(0 - проверять всегда)")
+    parser.add_argument("--polite", action="store_true", help="соблюдать robots.txt и паузы между запросами")
+    parser.add_argument("--delay", type=float, default=ConfigManager.get("delay"),
+                        help="пауза между запросами к хосту, с")
+    parser.add_argument("--max-page-mb", type=int, default=ConfigManager.get("max_page_mb"),
+                        help="максимальный размер страницы, МБ")
+    parser.add_argument("--archive", action="store_true",
+                        help="сохранять страницы в сжатый архив pages_archive вместо отдельных файлов")
+    parser.add_argument("--archive-get", metavar="URL", help="вывести страницу из архива и выйти")
+    parser.add_argument("--no-resume", action="store_true", help="начать задание заново, не пропуская готовые ссылки")
+    parser.add_argument("--metrics", metavar="FILE", help="записывать метрики каждой ссылки в файл JSON Lines")
+    parser.add_argument("--metrics-interval", type=float, default=10,
+                        help="как часто выводить сводку метрик, с (0 - только в конце)")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"],
+                        help="профилировать задачи (profile_<задача>.prof или .html)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="процессов для обработки шардов файла ссылок (1 - без шардирования)")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="число шардов (по умолчанию 4 на процесс). Чтобы подключить другие машины, "
+                             "запустите на них ту же команду с тем же файлом ссылок в общей папке")
+    return parser
+
+def extract_links(args, scheduler, metrics):
+    job = LinkExtractionJob(args.url, args.format, args.filter, depth=args.depth,
+                            scope="prefix" if args.prefix_scope else "domain", parser_backend=args.parser,
+                            scheduler=scheduler, metrics=metrics, timeout=args.extract_timeout, diff=args.diff,
+                            workers=args.workers, max_per_host=args.max_per_host,
+                            max_page_size=args.max_page_mb * 1024 * 1024, use_async=args.use_async,
+                            concurrency=args.concurrency, log=logger.info)
+    job.run()
+    return job.file_path
+
+def screenshot_options(args):
+    return dict(image_format=args.image_format, quality=args.quality, max_height=args.max_height,
+                tile_height=args.tile_height, thumbnail_width=args.thumbnail_width, encoders=args.encoders)
+
+def base_url(args):
+    # Относительные ссылки файла разрешаются от первого URL
+    return args.url[0] if args.url else ""
+
+def make_jobs(args, file_with_links, scheduler, progress, metrics, control=None):
+    jobs = []
+    resume = not args.no_resume
+    if args.processes > 1 or args.shards:
+        jobs.append(ShardedJob(file_with_links, base_url(args), args.format, args.filter, mode=args.mode,
+                               processes=args.processes, shards=args.shards, log=logger.info,
+                               progress=progress.callback(args.mode), workers=args.workers,
+                               max_per_host=args.max_per_host,
+                               browsers=args.browsers, browser_max_pages=args.browser_max_pages,
+                               wait_selector=args.wait_selector,
+                               wait_timeout=args.wait_timeout, resume=resume, polite=args.polite,
+                               delay=args.delay, archive=args.archive, cache=args.cache, offline=args.offline,
+                               cache_ttl=args.cache_ttl,
+                               max_page_size=args.max_page_mb * 1024 * 1024,
+                               screenshot_options=screenshot_options(args), metrics=bool(args.metrics),
+                               render_saved=args.render_saved, control=control,
+                               link_status=os.path.abspath(LinkStatusTable.STATUS_FILE) if args.check else None,
+                               check_ttl=args.check_ttl))
+        return jobs
+
+    def page_options():
+        return dict(workers=args.workers, max_per_host=args.max_per_host, journal=CrawlJournal(), resume=resume,
+                    scheduler=scheduler,
+                    cache=(HttpCache(ttl=args.cache_ttl, offline=args.offline)
+                           if args.cache or args.offline else None),
+                    archive=PageArchive() if args.archive else None,
+                    max_page_size=args.max_page_mb * 1024 * 1024, metrics=metrics,
+                    link_index=LinkIndex() if args.diff else None,
+                    link_status=LinkStatusTable(ttl=args.check_ttl) if args.check else None)
+
+    def shot_options(link_status=False):
+        return dict(browsers=args.browsers, max_pages_per_browser=args.browser_max_pages,
+                    wait_selector=args.wait_selector, wait_timeout=args.wait_timeout,
+                    journal=CrawlJournal(), resume=resume, metrics=metrics,
+                    link_status=LinkStatusTable(ttl=args.check_ttl) if link_status and args.check else None,
+                    **screenshot_options(args))
+
+    if args.mode == "both" and not args.use_async:
+        # Каждая ссылка скачивается один раз, скриншоты снимаются только там, где они нужны
+        jobs.append(FetchPipeline(file_with_links, base_url(args), args.format, args.filter,
+                                  render_saved=args.render_saved, state_journal=CrawlJournal(),
+                                  page_options=page_options(), screenshot_options=shot_options(),
+                                  log=logger.info, progress=progress.callback("страницы и скриншоты"),
+                                  control=control))
+        return jobs
+    if args.mode in ("pages", "both"):
+        if args.use_async:
+            jobs.append(AsyncPageDownloader(file_with_links, base_url(args), args.format, args.filter,
+                                            concurrency=args.concurrency, max_per_host=args.max_per_host,
+                                            max_page_size=args.max_page_mb * 1024 * 1024,
+                                            log=logger.info, progress=progress.callback("страницы"),
+                                            control=control))
+        else:
+            jobs.append(PageDownloader(file_with_links, base_url(args), args.format, args.filter,
+                                       log=logger.info, progress=progress.callback("страницы"),
+                                       control=control, **page_options()))
+    if args.mode in ("screenshots", "both"):
+        # В режиме both со --async ссылки для скриншотов отсеиваются здесь же
+        jobs.append(ScreenshotTaker(file_with_links, base_url(args), args.filter,
+                                    log=logger.info, progress=progress.callback("скриншоты"),
+                                    control=control, **shot_options(link_status=True)))
+    return jobs
+
+# Первое Ctrl+C останавливает задание штатно: начатые запросы завершаются, журнал сохраняется
+# и задание можно продолжить; повторное Ctrl+C прерывает программу сразу
+def handle_interrupt(control):
+    def interrupt(signum, frame):
+        if control.cancelled.is_set():
+            raise KeyboardInterrupt
+        control.cancel()
+        logger.info("Остановка: ожидание завершения начатых запросов (повторное Ctrl+C - немедленный выход)")
+    signal.signal(signal.SIGINT, interrupt)
+
+# Периодическая сводка метрик, пока идут задачи
+def report_metrics(metrics, interval, stop):
+    while not stop.wait(interval):
+        logger.info(f"Метрики: {metrics.summary_message()}")
+
+def job_target(args, job):
+    if not args.profile:
+        return job.run
+    extension = "html" if args.profile == "pyinstrument" else "prof"
+    output = f"profile_{type(job).__name__.lower()}.{extension}"
+    return lambda: run_profiled(job.run, output, args.profile, log=logger.info)
+
+# Страница ищется в общем архиве, а затем в архивах шардов задания, которое еще не объединено
+def archive_text(url):
+    for archive_dir in [PageArchive.ARCHIVE_DIR] + ShardedJob.archive_dirs():
+        if not os.path.isdir(archive_dir):
+            continue
+        archive = PageArchive(archive_dir)
+        try:
+            text = archive.load_text(url)
+        finally:
+            archive.close()
+        if text is not None:
+            return text
+    return None
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.archive_get:
+        text = archive_text(args.archive_get)
+        if text is None:
+            logger.error(f"Страницы {args.archive_get} нет в архиве")
+            return 1
+        sys.stdout.write(text)
+        return 0
+    if args.clear_checks:
+        table = LinkStatusTable()
+        logger.info(f"Удалено результатов проверки ссылок: {table.clear()}")
+        table.close()
+        if not args.url and not args.links_file:
+            return 0
+    if not args.url and not args.links_file:
+        logger.error("Укажите --url или --links-file")
+        return 2
+
+    scheduler = PolitenessScheduler(min_delay=args.delay) if args.polite else None
+    # В режиме шардов каждый процесс пишет свой файл метрик рядом с шардом
+    metrics = RequestMetrics(args.metrics) if args.metrics else None
+
+    file_with_links = args.links_file
+    if not file_with_links:
+        file_with_links = extract_links(args, scheduler, metrics)
+        if not file_with_links:
+            logger.error("Не удалось получить ссылки с сайта.")
+            return 1
+
+    progress = ConsoleProgress()
+    control = JobControl()
+    handle_interrupt(control)
+    if args.check:
+        checker = LinkChecker(file_with_links, base_url(args), args.filter, workers=args.probe_workers,
+                              max_per_host=args.max_per_host, ttl=args.check_ttl,
+                              scheduler=scheduler, log=logger.info, progress=progress.callback("проверка"),
+                              control=control)
+        checker.run()
+        progress.done()
+        progress.values.clear()
+        if control.cancelled.is_set():
+            logger.info("Проверка ссылок остановлена.")
+            return 130
+    if args.mode == "links":
+        if metrics is not None:
+            metrics.close()
+        return 0
+
+    # Как и в окне программы, страницы и скриншоты обрабатываются одновременно
+    jobs = make_jobs(args, file_with_links, scheduler, progress, metrics, control)
+    threads = [threading.Thread(target=job_target(args, job)) for job in jobs]
+    stop = threading.Event()
+    if metrics is not None and args.metrics_interval > 0:
+        threading.Thread(target=report_metrics, args=(metrics, args.metrics_interval, stop), daemon=True).start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        # Ожидание с таймаутом, чтобы обработчик Ctrl+C срабатывал сразу
+        while thread.is_alive():
+            thread.join(0.5)
+    stop.set()
+    progress.done()
+    if metrics is not None:
+        logger.info(f"Метрики: {metrics.summary_message()}")
+        metrics.close()
+    if control.cancelled.is_set():
+        logger.info("Задача остановлена. Без --no-resume следующий запуск продолжит ее с места остановки.")
+        return 130
+    logger.info("Задача выполнена.")
+    return 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
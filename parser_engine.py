@@ -0,0 +1,3856 @@
+import threading
+import codecs
+import io
+import sys
+import cProfile
+import pstats
+import multiprocessing
+import socket
+import zlib
+import queue
+import hashlib
+import sqlite3
+import logging
+import importlib
+import importlib.util
+import requests
+from requests.adapters import HTTPAdapter
+from requests.compat import chardet
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from html import escape
+from html.parser import HTMLParser
+import re
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit, parse_qsl, urlencode
+import math
+import random
+from urllib.robotparser import RobotFileParser
+from email.utils import parsedate_to_datetime
+import os
+import json
+import time
+import shutil
+import glob
+import pathlib
+import tempfile
+import asyncio
+from array import array
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Движок загрузки без зависимости от PyQt5. Тяжелые и необязательные библиотеки
+# (selenium, BeautifulSoup, lxml, selectolax, aiohttp) импортируются при первом использовании
+
+# Проверка наличия необязательной библиотеки без ее импорта
+def module_available(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+# Импорт необязательной библиотеки; None, если она не установлена
+def optional_module(name):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+# Настройка логирования
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("WebDownloader")
+
+# Класс для работы с конфигурацией
+class ConfigManager:
+    CONFIG_FILE = "config.json"
+    # Значения по умолчанию; ключи производительности читаются задачами при создании
+    DEFAULTS = {
+        "geckodriver_path": "",
+        "browser_path": "",
+        "workers": 8,              # потоков загрузки страниц
+        "max_per_host": 0,         # одновременных запросов к одному хосту (0 - по числу потоков или запросов)
+        "async_concurrency": 200,  # одновременных запросов асинхронного движка
+        "browsers": 2,             # экземпляров браузера для скриншотов
+        "browser_max_pages": 50,   # страниц на один экземпляр браузера, затем он перезапускается
+        "encoders": 2,             # потоков обработки скриншотов
+        "request_timeout": 110,    # таймаут загрузки страницы, с
+        "extract_timeout": 120,    # максимальное время извлечения ссылок, с
+        "wait_timeout": 15,        # ожидание готовности страницы перед скриншотом, с
+        "delay": 0.5,              # пауза между запросами к хосту в вежливом режиме, с
+        "max_page_mb": 50,         # максимальный размер страницы, МБ
+        "http_cache_mb": 1024,     # размер HTTP-кэша, МБ
+        "http_cache_ttl": 0,       # страница из кэша без повторной проверки, с (0 - проверять всегда)
+        "line_cache_blocks": 64,   # блоков по 256 строк в кэше редактора ссылок
+        "probe_workers": 32,       # потоков проверки ссылок
+        "probe_timeout": 15,       # таймаут проверки ссылки, с
+        "probe_ttl": 24,           # сколько действует результат проверки ссылки, ч (0 - бессрочно)
+    }
+    # Файл перечитывается, только если изменились его время изменения или размер,
+    # и проверяется не чаще раза в RELOAD_INTERVAL секунд
+    RELOAD_INTERVAL = 1.0
+    _lock = threading.RLock()
+    _config = None
+    _signature = None
+    _checked_at = 0.0
+    _checked_file = None
+
+    @staticmethod
+    def _stat_signature(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @classmethod
+    def _current(cls, force=False):
+        with cls._lock:
+            now = time.monotonic()
+            if (not force and cls._config is not None and cls._checked_file == cls.CONFIG_FILE
+                    and now - cls._checked_at < cls.RELOAD_INTERVAL):
+                return cls._config
+            cls._checked_at = now
+            signature = cls._stat_signature(cls.CONFIG_FILE)
+            if cls._config is not None and cls._checked_file == cls.CONFIG_FILE and signature == cls._signature:
+                return cls._config
+            config = dict(cls.DEFAULTS)
+            if signature is not None:
+                try:
+                    with open(cls.CONFIG_FILE, "r", encoding="utf-8") as f:
+                        config.update(json.load(f))
+                except (OSError, ValueError) as e:
+                    # Поврежденный файл не должен останавливать задачи: остаются прежние значения
+                    # до следующего изменения файла
+                    logger.warning(f"Не удалось прочитать {cls.CONFIG_FILE}: {e}")
+                    if cls._config is not None and cls._checked_file == cls.CONFIG_FILE:
+                        config = cls._config
+            cls._config = config
+            cls._signature = signature
+            cls._checked_file = cls.CONFIG_FILE
+            return config
+
+    @classmethod
+    def load_config(cls):
+        if not os.path.exists(cls.CONFIG_FILE):
+            # Если конфигурационный файл не существует, создать его со значениями по умолчанию
+            cls.save_config(dict(cls.DEFAULTS))
+        return dict(cls._current(force=True))
+
+    @classmethod
+    def get(cls, key):
+        return cls._current().get(key, cls.DEFAULTS.get(key))
+
+    @classmethod
+    def setting(cls, key, value=None):
+        # Явно переданное значение, иначе значение из конфигурации
+        return cls.get(key) if value is None else value
+
+    @classmethod
+    def update(cls, **values):
+        # Чтение и запись под общей блокировкой, чтобы параллельные изменения не терялись
+        with cls._lock:
+            config = dict(cls._current(force=True))
+            config.update(values)
+            cls.save_config(config)
+
+    @staticmethod
+    def get_geckodriver_path():
+        return ConfigManager.get("geckodriver_path")
+
+    @staticmethod
+    def get_browser_path():
+        return ConfigManager.get("browser_path")
+
+    @staticmethod
+    def set_geckodriver_path(path):
+        ConfigManager.update(geckodriver_path=path)
+
+    @staticmethod
+    def set_browser_path(path):
+        ConfigManager.update(browser_path=path)
+
+    @classmethod
+    def save_config(cls, config):
+        # Запись во временный файл рядом и замена: читатель видит либо старый, либо новый файл целиком
+        with cls._lock:
+            directory = os.path.dirname(os.path.abspath(cls.CONFIG_FILE))
+            fd, tmp_path = tempfile.mkstemp(prefix=".config.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(config, f, indent=4, ensure_ascii=False)
+                os.replace(tmp_path, cls.CONFIG_FILE)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            cls._config = dict(cls.DEFAULTS, **config)
+            cls._signature = cls._stat_signature(cls.CONFIG_FILE)
+            cls._checked_file = cls.CONFIG_FILE
+            cls._checked_at = time.monotonic()
+
+# Соединения и пулы, считающие реальные TCP/TLS-подключения. urllib3 переподключает
+# закрытое сервером соединение тем же объектом, поэтому считается каждый connect().
+# Время подключения (DNS и TCP) и рукопожатия TLS записывается для метрик запроса
+class CountingConnectionMixin:
+    def _new_conn(self):
+        started = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            HttpClient.add_timing("connect", time.perf_counter() - started)
+
+    def connect(self):
+        HttpClient.count("connections")
+        started = time.perf_counter()
+        connect_before = HttpClient.timing("connect")
+        try:
+            return super().connect()
+        finally:
+            if isinstance(self, HTTPSConnection):
+                elapsed = time.perf_counter() - started
+                HttpClient.add_timing("tls", max(0.0, elapsed - (HttpClient.timing("connect") - connect_before)))
+
+class CountingHTTPConnection(CountingConnectionMixin, HTTPConnection):
+    pass
+
+class CountingHTTPSConnection(CountingConnectionMixin, HTTPSConnection):
+    pass
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CountingHTTPConnection
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CountingHTTPSConnection
+
+class PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        HttpClient.count("requests")
+        return super().send(request, **kwargs)
+
+# Общая HTTP-сессия с keep-alive для всех запросов программы
+class HttpClient:
+    DEFAULT_HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'ru,en;q=0.8',
+        'Connection': 'keep-alive',
+    }
+    pool_connections = 32  # число хостов, для которых хранятся пулы
+    pool_maxsize = 8  # соединений на один хост
+    headers = dict(DEFAULT_HEADERS)
+
+    _session = None
+    _lock = threading.Lock()
+    _stats = {"requests": 0, "connections": 0}
+    _timings = threading.local()  # фазы текущего запроса; соединение открывается в потоке запроса
+
+    @classmethod
+    def configure(cls, pool_maxsize=None, pool_connections=None, headers=None):
+        with cls._lock:
+            current = (cls.pool_maxsize, cls.pool_connections, cls.headers)
+            if pool_maxsize:
+                cls.pool_maxsize = pool_maxsize
+            if pool_connections:
+                cls.pool_connections = pool_connections
+            if headers is not None:
+                cls.headers = {**cls.DEFAULT_HEADERS, **headers}
+            # Сессия пересоздается только при изменении параметров, иначе keep-alive сохраняется
+            if cls._session is not None and current != (cls.pool_maxsize, cls.pool_connections, cls.headers):
+                cls._session.close()
+                cls._session = None
+
+    @classmethod
+    def session(cls):
+        with cls._lock:
+            if cls._session is None:
+                session = requests.Session()
+                session.headers.update(cls.headers)
+                adapter = PooledAdapter(pool_connections=cls.pool_connections, pool_maxsize=cls.pool_maxsize)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                cls._session = session
+            return cls._session
+
+    @classmethod
+    def get(cls, url, **kwargs):
+        return cls.session().get(url, **kwargs)
+
+    @classmethod
+    def count(cls, key):
+        with cls._lock:
+            cls._stats[key] += 1
+
+    @classmethod
+    def add_timing(cls, phase, seconds):
+        timings = cls._timings.__dict__
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+    @classmethod
+    def timing(cls, phase):
+        return cls._timings.__dict__.get(phase, 0.0)
+
+    @classmethod
+    def take_timings(cls):
+        # Возвращает фазы, накопленные в этом потоке с прошлого вызова, и сбрасывает их
+        timings = dict(cls._timings.__dict__)
+        cls._timings.__dict__.clear()
+        return timings
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            stats = dict(cls._stats)
+        stats["reused"] = max(0, stats["requests"] - stats["connections"])
+        return stats
+
+    @classmethod
+    def stats_message(cls):
+        stats = cls.stats()
+        return (f"HTTP: запросов {stats['requests']}, новых соединений {stats['connections']}, "
+                f"повторно использовано {stats['reused']}")
+
+# Процентиль по методу ближайшего ранга
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+# Метрики обработки ссылок: по записи на каждую попытку в формате JSON Lines (фазы, статус,
+# байты, повторы) и сводка по последним запросам для живой панели
+class RequestMetrics:
+    def __init__(self, path=None, window=2000):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8") if path else None
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)  # (время завершения, длительность, успех)
+        self.started = time.monotonic()
+        self.total = 0
+        self.errors = 0
+        self.bytes = 0
+
+    def record(self, kind, url, status=None, ok=False, total=0.0, phases=None, size=0, retries=0, error=None):
+        entry = {
+            "ts": round(time.time(), 3), "kind": kind, "url": url, "status": status, "ok": ok,
+            "total": round(total, 4), "phases": {name: round(value, 4) for name, value in (phases or {}).items()},
+            "bytes": size, "retries": retries,
+        }
+        if error:
+            entry["error"] = str(error)
+        with self._lock:
+            self.total += 1
+            self.errors += 0 if ok else 1
+            self.bytes += size
+            self._recent.append((time.monotonic(), total, ok))
+            if self._file is not None:
+                self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def summary(self, period=10.0):
+        # Скорость считается за последние period секунд, задержки - по последним записям
+        now = time.monotonic()
+        with self._lock:
+            recent = list(self._recent)
+            total, errors, size = self.total, self.errors, self.bytes
+        latest = [item for item in recent if now - item[0] <= period]
+        window = min(period, now - self.started) or period
+        durations = [duration for _, duration, _ in recent]
+        return {
+            "total": total,
+            "errors": errors,
+            "bytes": size,
+            "per_second": len(latest) / window,
+            "error_rate": errors / total if total else 0.0,
+            "p50": percentile(durations, 50),
+            "p95": percentile(durations, 95),
+            "p99": percentile(durations, 99),
+        }
+
+    def summary_message(self):
+        stats = self.summary()
+        latency = "" if stats["p50"] is None else (
+            f", p50 {stats['p50'] * 1000:.0f} мс, p95 {stats['p95'] * 1000:.0f} мс, p99 {stats['p99'] * 1000:.0f} мс")
+        return (f"Обработано {stats['total']}, {stats['per_second']:.1f}/с, ошибок {stats['error_rate']:.1%}, "
+                f"{stats['bytes'] / (1024 * 1024):.1f} МБ{latency}")
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+# Запуск задачи под профилировщиком: cProfile (результат - .prof для pstats/snakeviz)
+# или pyinstrument (HTML), если он установлен
+def run_profiled(run, output, profiler="cprofile", log=None):
+    log = log or logger.info
+    if profiler == "pyinstrument":
+        pyinstrument = optional_module("pyinstrument")
+        if pyinstrument is None:
+            log("pyinstrument не установлен, используется cProfile")
+        else:
+            session = pyinstrument.Profiler()
+            session.start()
+            try:
+                return run()
+            finally:
+                session.stop()
+                with open(output, "w", encoding="utf-8") as f:
+                    f.write(session.output_html())
+                log(f"Профиль сохранен в {output}")
+
+    main_profile = cProfile.Profile()
+    thread_profiles = []
+    # До Python 3.12 cProfile видит только свой поток, поэтому потоки пулов,
+    # запущенные во время задачи, получают собственные профили
+    per_thread = sys.version_info < (3, 12)
+
+    def start_thread_profile(frame, event, arg):
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        thread_profiles.append(profile)
+        profile.enable()
+
+    if per_thread:
+        threading.setprofile(start_thread_profile)
+    main_profile.enable()
+    try:
+        return run()
+    finally:
+        main_profile.disable()
+        if per_thread:
+            threading.setprofile(None)
+        stats = pstats.Stats(main_profile)
+        for profile in thread_profiles:
+            profile.disable()
+            stats.add(profile)
+        stats.dump_stats(output)
+        log(f"Профиль сохранен в {output}")
+
+# Вежливый планировщик запросов: интервал между запросами к хосту, robots.txt
+# и экспоненциальный отступ с джиттером при ответах 429/5xx
+class PolitenessScheduler:
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, min_delay=None, respect_robots=True, max_retries=3, base_backoff=1.0, max_backoff=300.0):
+        self.min_delay = ConfigManager.setting("delay", min_delay)
+        self.respect_robots = respect_robots
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._next_time = {}
+        self._backoff = {}
+        self._attempts = {}
+        self._robots = {}
+        self._robots_locks = {}
+
+    @staticmethod
+    def host_of(url):
+        return urlparse(url).netloc.lower()
+
+    @staticmethod
+    def user_agent():
+        return HttpClient.headers.get('User-Agent', '*')
+
+    def robots(self, url):
+        # robots.txt загружается один раз на хост. Как в RobotFileParser.read: 401 и 403 запрещают
+        # все, остальные ошибки и недоступный файл разрешают все
+        host = self.host_of(url)
+        with self._lock:
+            host_lock = self._robots_locks.setdefault(host, threading.Lock())
+        with host_lock:
+            if host in self._robots:
+                return self._robots[host]
+            parser = RobotFileParser()
+            robots_url = f"{urlparse(url).scheme}://{host}/robots.txt"
+            try:
+                response = HttpClient.get(robots_url, timeout=10)
+                if response.status_code == 200:
+                    parser.parse(response.text.splitlines())
+                elif response.status_code in (401, 403):
+                    parser.disallow_all = True
+                else:
+                    parser.allow_all = True
+            except requests.exceptions.RequestException:
+                parser.allow_all = True
+            self._robots[host] = parser
+            crawl_delay = parser.crawl_delay(self.user_agent())
+            if crawl_delay:
+                logger.info(f"robots.txt {host}: Crawl-delay {crawl_delay} с")
+            return parser
+
+    def allowed(self, url):
+        if not self.respect_robots:
+            return True
+        return self.robots(url).can_fetch(self.user_agent(), url)
+
+    def delay(self, host):
+        parser = self._robots.get(host)
+        crawl_delay = parser.crawl_delay(self.user_agent()) if parser is not None else None
+        return max(self.min_delay, float(crawl_delay or 0))
+
+    def ready_at(self, host):
+        with self._lock:
+            return self._next_time.get(host, 0.0)
+
+    def reserve(self, url):
+        # Занимает ближайший слот хоста и возвращает момент, когда можно отправлять запрос
+        host = self.host_of(url)
+        delay = self.delay(host)
+        with self._lock:
+            start = max(time.monotonic(), self._next_time.get(host, 0.0))
+            self._next_time[host] = start + delay
+        return start
+
+    def wait_turn(self, url):
+        start = self.reserve(url)
+        pause = start - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+
+    @staticmethod
+    def retry_after(response):
+        value = response.headers.get("Retry-After") if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def record(self, url, response):
+        # Возвращает паузу перед повтором запроса или None, если повторять не нужно
+        host = self.host_of(url)
+        if response is None or response.status_code not in self.RETRY_STATUSES:
+            with self._lock:
+                self._backoff.pop(host, None)
+                self._attempts.pop(url, None)
+            return None
+
+        with self._lock:
+            attempts = self._attempts.get(url, 0) + 1
+            self._attempts[url] = attempts
+            level = self._backoff.get(host, 0) + 1
+            self._backoff[host] = level
+
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            pause = min(self.max_backoff, retry_after) + random.uniform(0, self.base_backoff)
+        else:
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (level - 1))
+            pause = random.uniform(backoff / 2, backoff)
+        # Пауза касается всего хоста, остальные хосты продолжают обрабатываться
+        with self._lock:
+            self._next_time[host] = max(self._next_time.get(host, 0.0), time.monotonic() + pause)
+
+        if attempts > self.max_retries:
+            with self._lock:
+                self._attempts.pop(url, None)
+            return None
+        return pause
+
+# Ответ, восстановленный из дискового кэша
+# Тело читается из файла кэша по частям, а не хранится в памяти
+class CachedResponse:
+    def __init__(self, url, status_code, content=b"", encoding=None, headers=None, path=None):
+        self.url = url
+        self.status_code = status_code
+        self.path = path
+        self._content = content
+        self.encoding = encoding
+        self.headers = headers or {}
+        self.from_cache = True
+        self.not_modified = False
+        self.transfer = 0.0  # время чтения тела из сети, если ответ только что сохранен в кэш
+
+    @property
+    def content(self):
+        if self.path is None:
+            return self._content
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def iter_content(self, chunk_size=1):
+        if self.path is None:
+            for start in range(0, len(self._content), chunk_size):
+                yield self._content[start:start + chunk_size]
+            return
+        with open(self.path, "rb") as f:
+            yield from iter(lambda: f.read(chunk_size), b"")
+
+    def close(self):
+        pass
+
+# Дисковый HTTP-кэш: тела страниц хранятся по хешу содержимого, метаданные - в SQLite
+class HttpCache:
+    def __init__(self, cache_dir="http_cache", ttl=None, max_size=None, offline=False):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        # Секунд без повторной проверки; 0 - проверять всегда
+        self.ttl = float(ConfigManager.setting("http_cache_ttl", ttl))
+        self.max_size = max_size or ConfigManager.get("http_cache_mb") * 1024 * 1024
+        self.offline = offline
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "url TEXT PRIMARY KEY, digest TEXT, size INTEGER, etag TEXT, last_modified TEXT, "
+            "encoding TEXT, content_type TEXT, stored_at REAL, accessed_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self._db.commit()
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def lookup(self, url):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest, etag, last_modified, encoding, content_type, stored_at FROM entries WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        digest, etag, last_modified, encoding, content_type, stored_at = row
+        return {"digest": digest, "etag": etag, "last_modified": last_modified,
+                "encoding": encoding, "content_type": content_type, "stored_at": stored_at}
+
+    def load(self, url, entry):
+        path = self.object_path(entry["digest"])
+        if not os.path.exists(path):
+            return None
+        with self._lock:
+            self._db.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+        headers = {"Content-Type": entry["content_type"] or ""}
+        return CachedResponse(url, 200, encoding=entry["encoding"], headers=headers, path=path)
+
+    def store(self, url, response, max_size=None, stop=None):
+        # Тело пишется во временный файл по частям с проверкой лимита размера; страница больше
+        # лимита не сохраняется (PageTooLarge). Возвращает ответ, читающий тело из кэша
+        stats = {}
+        digest = hashlib.sha256()
+        head = b""
+        tmp_path = os.path.join(self.objects_dir, f"{threading.get_ident()}.{time.monotonic_ns()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in iter_body(response, max_size, stats=stats, stop=stop):
+                    if len(head) < 64 * 1024:
+                        head += chunk[:64 * 1024 - len(head)]
+                    digest.update(chunk)
+                    f.write(chunk)
+            digest = digest.hexdigest()
+            path = self.object_path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        encoding = (declared_encoding(response.headers.get("Content-Type"), head[:4096])
+                    or guess_encoding(head))
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, stats["bytes"], response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                 encoding, response.headers.get("Content-Type"), now, now)
+            )
+            self._db.commit()
+        self.evict()
+        stored = CachedResponse(response.url, response.status_code, encoding=encoding,
+                                headers=dict(response.headers), path=path)
+        stored.from_cache = False
+        stored.elapsed = response.elapsed
+        stored.transfer = stats["transfer"]
+        return stored
+
+    def touch(self, url, response):
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET stored_at = ?, accessed_at = ?, "
+                "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                (time.time(), time.time(), response.headers.get("ETag"), response.headers.get("Last-Modified"), url)
+            )
+            self._db.commit()
+
+    def evict(self):
+        # Удаление давно не использованных записей, пока кэш больше лимита
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_size:
+                return
+            rows = self._db.execute("SELECT url, digest, size FROM entries ORDER BY accessed_at").fetchall()
+            for url, digest, size in rows:
+                if total <= self.max_size:
+                    break
+                self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+                total -= size
+                shared = self._db.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+                if not shared:
+                    try:
+                        os.remove(self.object_path(digest))
+                    except OSError:
+                        pass
+            self._db.commit()
+
+    def get(self, url, max_size=None, stop=None, **kwargs):
+        # Ответ 200 сохраняется в кэш по мере чтения из сети и возвращается уже из кэша
+        kwargs["stream"] = True
+        entry = self.lookup(url)
+        if entry and (self.offline or (self.ttl and time.time() - entry["stored_at"] < self.ttl)):
+            cached = self.load(url, entry)
+            if cached is not None:
+                return cached
+        if self.offline:
+            # Как при Cache-Control: only-if-cached - страницы нет в кэше
+            return CachedResponse(url, 504, b"")
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        response = HttpClient.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and entry:
+            response.close()
+            cached = self.load(url, entry)
+            if cached is not None:
+                self.touch(url, response)
+                cached.not_modified = True
+                return cached
+            # Тело пропало с диска - запрос без условий
+            response = HttpClient.get(url, **kwargs)
+        response.from_cache = False
+        response.not_modified = False
+        if response.status_code != 200:
+            return response
+        try:
+            return self.store(url, response, max_size, stop)
+        finally:
+            response.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Журнал заданий: состояние каждой ссылки для продолжения прерванной работы
+class CrawlJournal:
+    JOURNAL_FILE = "crawl_journal.sqlite"
+
+    def __init__(self, path=None):
+        self.path = path or CrawlJournal.JOURNAL_FILE
+        self._lock = threading.Lock()
+        # Журнал пишут одновременно потоки страниц и скриншотов, поэтому каждая запись -
+        # отдельная короткая транзакция в режиме WAL
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            "job TEXT, url TEXT, state TEXT, status INTEGER, output TEXT, updated_at REAL, "
+            "PRIMARY KEY (job, url))"
+        )
+        # Состояние страницы между запусками, независимо от задания: хеш тела при последнем
+        # скриншоте и файл этого скриншота
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, digest TEXT, screenshot TEXT, updated_at REAL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def job_id(kind, file_with_links, **settings):
+        # Задание определяется типом, файлом ссылок и настройками обработки. Размер и время
+        # изменения файла входят в ключ: измененный файл ссылок - новое задание
+        try:
+            stat = os.stat(file_with_links)
+            signature = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            signature = None
+        key = json.dumps([kind, os.path.abspath(file_with_links), signature, settings], sort_keys=True,
+                         ensure_ascii=False)
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def completed(self, job):
+        with self._lock:
+            rows = self._db.execute("SELECT url FROM items WHERE job = ? AND state = 'done'", (job,)).fetchall()
+        return {url for url, in rows}
+
+    def reset(self, job):
+        with self._lock:
+            self._db.execute("DELETE FROM items WHERE job = ?", (job,))
+            self._db.commit()
+
+    def mark(self, job, url, state, status=None, output=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?)",
+                (job, url, state, status, output, time.time())
+            )
+            self._db.commit()
+
+    def page_state(self, url):
+        # (хеш, файл скриншота) или (None, None)
+        with self._lock:
+            row = self._db.execute("SELECT digest, screenshot FROM pages WHERE url = ?", (url,)).fetchone()
+        return row or (None, None)
+
+    def save_page_state(self, url, digest, screenshot):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)", (url, digest, screenshot, time.time()))
+            self._db.commit()
+
+    def summary(self, job):
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM items WHERE job = ? GROUP BY state", (job,)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Потоковый токенизатор, собирающий только атрибуты тегов <a>
+class AnchorCollector(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.anchors = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            self.anchors.append({name: value or "" for name, value in attrs})
+
+# Извлечение ссылок из HTML с выбором парсера; BeautifulSoup остается запасным вариантом
+class LinkExtractor:
+    BACKENDS = ("selectolax", "lxml", "stream", "bs4")
+
+    def __init__(self, backend="auto"):
+        self.backend = self.resolve_backend(backend)
+
+    @staticmethod
+    def available_backends():
+        available = []
+        if module_available("selectolax"):
+            available.append("selectolax")
+        if module_available("lxml"):
+            available.append("lxml")
+        available += ["stream", "bs4"]
+        return available
+
+    @staticmethod
+    def resolve_backend(backend):
+        available = LinkExtractor.available_backends()
+        if backend in available:
+            return backend
+        if backend not in ("auto", None, ""):
+            logger.warning(f"Парсер {backend} недоступен, используется автоматический выбор")
+        return available[0]
+
+    def extract(self, html, filter_keyword=None):
+        # Возвращает атрибуты тегов <a> (объекты с методом get); при фильтре - только
+        # ссылки, href которых совпадает с регулярным выражением
+        try:
+            anchors = getattr(self, f"extract_{self.backend}")(html)
+        except Exception as e:
+            if self.backend == "bs4":
+                raise
+            logger.warning(f"Ошибка парсера {self.backend}, используется BeautifulSoup: {e}")
+            anchors = self.extract_bs4(html)
+        if filter_keyword:
+            pattern = re.compile(filter_keyword, re.I)
+            anchors = [anchor for anchor in anchors if pattern.search(anchor.get("href") or "")]
+        return anchors
+
+    @staticmethod
+    def extract_selectolax(html):
+        # Движок lexbor есть в selectolax начиная с 0.3; старый modest оставлен для совместимости
+        try:
+            from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+        except ImportError:
+            from selectolax.parser import HTMLParser as SelectolaxParser
+        tree = SelectolaxParser(html)
+        return [{name: value or "" for name, value in node.attributes.items()} for node in tree.css("a")]
+
+    @staticmethod
+    def extract_lxml(html):
+        import lxml.html
+        if not html.strip():
+            return []
+        document = lxml.html.fromstring(html)
+        return [dict(element.attrib) for element in document.iter("a")]
+
+    @staticmethod
+    def extract_stream(html):
+        collector = AnchorCollector()
+        collector.feed(html)
+        collector.close()
+        return collector.anchors
+
+    @staticmethod
+    def extract_bs4(html):
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, "html.parser")
+        return soup.find_all("a")
+
+# Класс для обработки веб-страниц. Страница читается по частям с лимитом размера max_page_size,
+# ответы не в HTML не разбираются
+class Info:
+    def __init__(self, site_name, parser_backend="auto", scheduler=None, metrics=None, timeout=50,
+                 max_page_size=None):
+        self.site_name = site_name
+        self.timeout = timeout
+        self.max_page_size = max_page_size or ConfigManager.get("max_page_mb") * 1024 * 1024
+        self.extractor = LinkExtractor(parser_backend)
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.phases = {}
+        self.body = {}
+
+    def fetch(self, reserved=False):
+        # reserved - очередь хоста уже заняла задача (DownloadPool): повтор после 429/5xx
+        # не ждется здесь, а возвращается в пул исключением RetryLater
+        if self.scheduler is None:
+            return self.get()
+        while True:
+            if not reserved:
+                self.scheduler.wait_turn(self.site_name)
+            response = self.get()
+            pause = self.scheduler.record(self.site_name, response)
+            if pause is None:
+                return response
+            PageDownloader.release(response)
+            logger.warning(f"Статус {response.status_code}, повтор запроса через {pause:.1f} с")
+            if reserved:
+                raise RetryLater(self.site_name)
+
+    def get(self):
+        HttpClient.take_timings()
+        response = HttpClient.get(self.site_name, timeout=self.timeout, stream=True)
+        self.phases = HttpClient.take_timings()
+        headers_time = response.elapsed.total_seconds()
+        self.phases["ttfb"] = max(0.0, headers_time - self.phases.get("connect", 0.0) - self.phases.get("tls", 0.0))
+        return response
+
+    def status_site(self, reserved=False):
+        # Возвращает (статус, текст страницы) или (None, None)
+        logger.info(f"Отправка запроса на {self.site_name}")
+        if self.scheduler is not None and not self.scheduler.allowed(self.site_name):
+            logger.error(f"Запрос к {self.site_name} запрещен правилами robots.txt")
+            return None, None
+        response = None
+        try:
+            response = self.fetch(reserved)
+            logger.info(f"Статус-код ответа: {response.status_code}")
+            if response.status_code != 200:
+                return None, None
+            content_type = response.headers.get("Content-Type")
+            media_type = (content_type or "").split(";")[0].strip().lower()
+            if media_type and "html" not in media_type:
+                logger.error(f"Страница {self.site_name} пропущена: тип содержимого {media_type}")
+                return None, None
+            content = read_body(response, self.max_page_size, self.body)
+            self.phases["transfer"] = self.body["transfer"]
+            # Кодировка из заголовка или <meta charset>; определение по содержимому - только без них
+            encoding = declared_encoding(content_type, content[:4096]) or guess_encoding(content[:64 * 1024])
+            return response.status_code, content.decode(encoding, errors="replace")
+        except PageTooLarge as e:
+            logger.error(f"Страница {self.site_name} пропущена: {e}")
+            return None, None
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Ошибка при выполнении запроса: {e}")
+            return None, None
+        finally:
+            if response is not None:
+                PageDownloader.release(response)
+
+    def get_info(self, filter_keyword=None, reserved=False):
+        started = time.perf_counter()
+        check_status, html = self.status_site(reserved)
+        links = []
+        error = None
+        if check_status == 200:
+            try:
+                parse_started = time.perf_counter()
+                links = self.extractor.extract(html, filter_keyword)
+                self.phases["parse"] = time.perf_counter() - parse_started
+                logger.info(f"Операция прошла успешно (парсер {self.extractor.backend})")
+            except Exception as e:
+                error = e
+                logger.error(f"Ошибка при обработке контента: {e}")
+        else:
+            logger.error("Не удалось получить страницу, статус-код не 200.")
+        if self.metrics is not None:
+            self.metrics.record("links", self.site_name, check_status, ok=check_status == 200 and error is None,
+                                total=time.perf_counter() - started, phases=self.phases,
+                                size=self.body.get("bytes", 0), error=error)
+        return links
+
+    def save_html(self, extension, filter_keyword=None, file_path=None):
+        return self.write_links(self.get_info(filter_keyword), file_path or f"Sort_obj.{extension}")
+
+    def write_links(self, links, file_path):
+        if links:
+            with open(file_path, "w", encoding="utf-8") as f:
+                for num, link in enumerate(links, start=1):
+                    href = link.get('href', 'Путь отсутствует')
+                    if href.startswith('/'):
+                        full_url = urljoin(self.site_name, href)
+                    else:
+                        full_url = href
+                    title = link.get('title', 'Нет названия!')
+                    link_info = f"№{num}, {full_url} - {title}\n"
+                    f.write(link_info)
+            logger.info(f"Ссылки успешно сохранены в {file_path}")
+            logger.info(HttpClient.stats_message())
+            return file_path
+        return None
+
+# Приведение URL к каноническому виду: без фрагмента, с отсортированным запросом,
+# без порта по умолчанию и без завершающего слэша (кроме корня)
+def normalize_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme, parts.port) in (("http", 80), ("https", 443)):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = parts.path or "/"
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+# Компактный фильтр Блума для множества уже встреченных URL
+class BloomFilter:
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        # Двойное хеширование: k позиций из двух 64-битных половин одного дайджеста
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(item))
+
+    def add(self, item):
+        # Возвращает True, если элемент встретился впервые
+        added = False
+        for pos in self.positions(item):
+            mask = 1 << (pos & 7)
+            if not self.bits[pos >> 3] & mask:
+                self.bits[pos >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+# Обход сайта в ширину с ограничением глубины, областью обхода и дедупликацией ссылок.
+# Страницы одного уровня загружаются параллельно пулом DownloadPool
+class SiteCrawler:
+    def __init__(self, start_url, max_depth=2, scope="domain", max_pages=10000, filter_keyword=None,
+                 parser_backend="auto", seen_capacity=1000000, scheduler=None, metrics=None,
+                 should_stop=None, request_timeout=50, workers=None, max_per_host=None, max_page_size=None):
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.pool = DownloadPool(workers, None, max_per_host, scheduler=scheduler)
+        HttpClient.configure(pool_maxsize=max(HttpClient.pool_maxsize, self.pool.max_per_host))
+        self.max_page_size = max_page_size
+        self.should_stop = should_stop or (lambda: False)  # отмена или истекший таймаут задания
+        self.request_timeout = request_timeout
+        self.start_url = normalize_url(start_url)
+        self.max_depth = max(0, int(max_depth))
+        self.scope = scope  # "domain" - весь хост, "prefix" - только пути под стартовым URL
+        self.max_pages = max_pages
+        self.filter_pattern = re.compile(filter_keyword, re.I) if filter_keyword else None
+        self.parser_backend = parser_backend
+        self.seen = BloomFilter(seen_capacity)
+        self.host = urlsplit(self.start_url).netloc
+        self.prefix = self.scope_prefix(start_url)
+        self.pages_fetched = 0
+
+    @staticmethod
+    def scope_prefix(start_url):
+        # Префикс берется из исходного пути: normalize_url отрезает завершающий слэш, и "/docs/"
+        # превратился бы в "/docs" с префиксом "/". Путь со слэшем на конце или с последним
+        # сегментом без расширения ("/docs") считается папкой, иначе ("/docs/index.html") - страницей в папке
+        path = urlsplit(start_url.strip()).path or "/"
+        if path.endswith("/"):
+            return path
+        head, _, last = path.rpartition("/")
+        return path + "/" if "." not in last else head + "/"
+
+    def in_scope(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or parts.netloc != self.host:
+            return False
+        if self.scope == "prefix":
+            return (parts.path + "/").startswith(self.prefix)
+        return True
+
+    def fetch_links(self, page_url):
+        info = Info(page_url, self.parser_backend, self.scheduler, self.metrics, self.request_timeout,
+                    self.max_page_size)
+        return info.get_info(reserved=True)
+
+    def level_pages(self, level, depth):
+        # Страницы уровня выдаются пулу, пока не достигнут предел числа страниц и обход не остановлен
+        for page_url in level:
+            if self.pages_fetched >= self.max_pages or self.should_stop():
+                return
+            self.pages_fetched += 1
+            logger.info(f"Обход: глубина {depth}, {page_url}")
+            yield page_url
+
+    def crawl(self):
+        # Возвращает (url, title, глубина) для каждой найденной ссылки; уровни обходятся по порядку,
+        # страницы внутри уровня - в порядке завершения загрузки
+        level = [self.start_url]
+        self.seen.add(self.start_url)
+        depth = 0
+        while level and not self.should_stop():
+            next_level = []
+            for page_url, links, error in self.pool.map(self.fetch_links, self.level_pages(level, depth)):
+                if error:
+                    logger.error(f"Ошибка при обходе {page_url}: {error}")
+                    continue
+                yield from self.page_links(page_url, links, depth, next_level)
+            level = self.next_level(next_level, depth)
+            depth += 1
+
+    def page_links(self, page_url, links, depth, next_level):
+        # Новые ссылки страницы как (url, title, глубина); страницы в области обхода
+        # добавляются в next_level
+        for link in links:
+            href = (link.get('href') or "").strip()
+            if not href or href.startswith(("#", "mailto:", "javascript:", "tel:")):
+                continue
+            full_url = normalize_url(urljoin(page_url, href))
+            if not self.seen.add(full_url):
+                continue
+            if self.filter_pattern is None or self.filter_pattern.search(full_url):
+                yield full_url, link.get('title', 'Нет названия!'), depth + 1
+            # Страницы последнего уровня не загружаются: их ссылки только записываются
+            if depth + 1 < self.max_depth and self.in_scope(full_url):
+                next_level.append(full_url)
+
+    @staticmethod
+    def next_level(next_level, depth):
+        if next_level:
+            logger.info(f"Обход: уровень {depth} пройден, на уровне {depth + 1} страниц {len(next_level)}")
+        return next_level
+
+    def save_html(self, extension, file_path=None, found_links=None):
+        # found_links - уже найденные ссылки (асинхронный обход); без них сайт обходится здесь
+        file_path = file_path or f"Sort_obj.{extension}"
+        # Ссылки пишутся во временный файл, чтобы прерванный обход не затер прежний файл ссылок
+        tmp_path = f"{file_path}.part"
+        found = 0
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            links = self.crawl() if found_links is None else found_links
+            for num, (full_url, title, _) in enumerate(links, start=1):
+                f.write(f"№{num}, {full_url} - {title}\n")
+                found = num
+        if self.should_stop() or not found:
+            os.remove(tmp_path)
+            logger.info(f"Обход остановлен: страниц {self.pages_fetched}, ссылок {found}")
+            return None
+        os.replace(tmp_path, file_path)
+        logger.info(f"Обход завершен: страниц {self.pages_fetched}, ссылок {found}")
+        logger.info(HttpClient.stats_message())
+        return file_path
+
+# Строка файла ссылок: "№<номер>, <ссылка> - <название>"
+LINK_LINE_PATTERN = re.compile(r"^№\d+, (\S+) - (.*)$")
+
+# Индекс ссылок между извлечениями: для каждой страницы, с которой извлекались ссылки, хранятся
+# ее ссылки с названием, временем первого и последнего появления и хешем содержимого при
+# последней загрузке. Новое извлечение сравнивается с индексом, и дальше обрабатывается только
+# разница: новые ссылки и ссылки с изменившимся названием; исчезнувшие выводятся отдельно
+class LinkIndex:
+    INDEX_FILE = "link_index.sqlite"
+
+    def __init__(self, path=None):
+        self.path = path or LinkIndex.INDEX_FILE
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS links ("
+            "site TEXT, url TEXT, title TEXT, first_seen REAL, last_seen REAL, present INTEGER, digest TEXT, "
+            "PRIMARY KEY (site, url))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS links_url ON links (url)")
+        self._db.commit()
+
+    @staticmethod
+    def read_links(file_path):
+        # (ссылка, название) из файла ссылок в порядке строк
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                match = LINK_LINE_PATTERN.match(line.rstrip("\n"))
+                if match:
+                    yield match.group(1), match.group(2)
+
+    def update(self, site, links):
+        # Возвращает {"added": [(ссылка, название)], "changed": [...], "removed": [...]}
+        site = normalize_url(site)
+        now = time.time()
+        with self._lock:
+            known = {url: (title, present) for url, title, present in self._db.execute(
+                "SELECT url, title, present FROM links WHERE site = ?", (site,))}
+            delta = {"added": [], "changed": [], "removed": []}
+            seen = set()
+            for url, title in links:
+                if url in seen:
+                    continue
+                seen.add(url)
+                previous = known.get(url)
+                if previous is None:
+                    delta["added"].append((url, title))
+                    self._db.execute("INSERT INTO links VALUES (?, ?, ?, ?, ?, 1, NULL)", (site, url, title, now, now))
+                    continue
+                if not previous[1]:
+                    delta["added"].append((url, title))
+                elif previous[0] != title:
+                    delta["changed"].append((url, title))
+                self._db.execute("UPDATE links SET title = ?, last_seen = ?, present = 1 WHERE site = ? AND url = ?",
+                                 (title, now, site, url))
+            for url, (title, present) in known.items():
+                if present and url not in seen:
+                    delta["removed"].append((url, title))
+                    self._db.execute("UPDATE links SET present = 0 WHERE site = ? AND url = ?", (site, url))
+            self._db.commit()
+        return delta
+
+    @staticmethod
+    def write_links(links, file_path):
+        with open(file_path, "w", encoding="utf-8") as f:
+            for num, (url, title) in enumerate(links, start=1):
+                f.write(f"№{num}, {url} - {title}\n")
+        return file_path
+
+    def record_digest(self, url, digest):
+        # True, если содержимое страницы отличается от прошлой загрузки
+        with self._lock:
+            rows = self._db.execute("SELECT digest FROM links WHERE url = ?", (url,)).fetchall()
+            if not rows:
+                return False
+            self._db.execute("UPDATE links SET digest = ? WHERE url = ?", (digest, url))
+            self._db.commit()
+        return any(previous is not None and previous != digest for previous, in rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Извлечение ссылок с одной или нескольких страниц в фоне, с отменой и общим таймаутом.
+# Для одного URL результат - Sort_obj.<ext>, как раньше; для нескольких каждый URL
+# пишется в свой файл, а затем все ссылки объединяются в Sort_obj.<ext>. С diff результат
+# задания - только разница с прошлым извлечением (Sort_obj.delta.<ext>, см. LinkIndex).
+# С use_async все URL и страницы обхода загружаются корутинами AsyncCrawler в одном цикле
+# событий, не больше concurrency запросов одновременно
+class LinkExtractionJob:
+    def __init__(self, urls, extension, filter_keyword=None, depth=1, scope="domain", parser_backend="auto",
+                 scheduler=None, metrics=None, timeout=None, request_timeout=50, max_parallel=4,
+                 diff=False, index_path=None, workers=None, max_per_host=None, max_page_size=None,
+                 use_async=False, concurrency=None, log=None, progress=None):
+        self.log = log or logger.info
+        self.progress = progress or (lambda value: None)
+        self.urls = [url.strip() for url in urls if url.strip()]
+        self.extension = extension
+        self.filter_keyword = filter_keyword
+        self.depth = depth
+        self.scope = scope
+        self.parser_backend = parser_backend
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.timeout = ConfigManager.setting("extract_timeout", timeout)  # секунд на все задание; 0 - без ограничения
+        self.request_timeout = request_timeout
+        self.max_parallel = max(1, int(max_parallel))
+        # Потоков и запросов к одному хосту при обходе сайта (depth > 1)
+        self.workers = workers
+        self.max_per_host = max_per_host
+        self.max_page_size = max_page_size
+        self.use_async = use_async
+        self.concurrency = concurrency
+        self.cancelled = threading.Event()  # отмена пользователем
+        self.stopped = threading.Event()  # отмена, таймаут или завершение задания
+        self.diff = diff
+        self.index_path = index_path
+        self.results = {}
+        self.file_path = None
+        self.full_path = None  # полный список ссылок, если file_path - только разница
+        self.removed_path = None
+
+    def cancel(self):
+        self.cancelled.set()
+        self.stopped.set()
+
+    def output_path(self, num):
+        if len(self.urls) == 1:
+            return f"Sort_obj.{self.extension}"
+        return f"Sort_obj_{num + 1}.{self.extension}"
+
+    def extract(self, num, url, deadline):
+        def should_stop():
+            return self.stopped.is_set() or time.monotonic() > deadline
+
+        path = self.output_path(num)
+        # Запрос не должен пережить задание надолго: его таймаут не больше оставшегося времени
+        request_timeout = max(1.0, min(self.request_timeout, deadline - time.monotonic()))
+        if self.depth > 1:
+            crawler = SiteCrawler(url, max_depth=self.depth, scope=self.scope, filter_keyword=self.filter_keyword,
+                                  parser_backend=self.parser_backend, scheduler=self.scheduler, metrics=self.metrics,
+                                  should_stop=should_stop, request_timeout=request_timeout,
+                                  workers=self.workers, max_per_host=self.max_per_host,
+                                  max_page_size=self.max_page_size)
+            return crawler.save_html(self.extension, path)
+        info = Info(url, self.parser_backend, self.scheduler, self.metrics, request_timeout, self.max_page_size)
+        links = info.get_info(self.filter_keyword)
+        # Страница могла загрузиться уже после отмены: файл ссылок в этом случае не трогается
+        if should_stop():
+            return None
+        return info.write_links(links, path)
+
+    async def extract_async(self, crawler, session, num, url, deadline):
+        def should_stop():
+            return self.stopped.is_set() or time.monotonic() > deadline
+
+        path = self.output_path(num)
+        if self.depth > 1:
+            site = SiteCrawler(url, max_depth=self.depth, scope=self.scope, filter_keyword=self.filter_keyword,
+                               parser_backend=self.parser_backend, should_stop=should_stop)
+            found = [link async for link in crawler.crawl(session, site)]
+            return await asyncio.to_thread(site.save_html, self.extension, path, found)
+        info = Info(url, self.parser_backend)
+        links = await crawler.page_links(session, url, info.extractor, self.filter_keyword)
+        if should_stop():
+            return None
+        return await asyncio.to_thread(info.write_links, links, path)
+
+    def merge(self, files):
+        # Объединение файлов ссылок со сквозной нумерацией
+        file_path = f"Sort_obj.{self.extension}"
+        num = 0
+        with open(file_path, "w", encoding="utf-8") as outfile:
+            for path in files:
+                with open(path, "r", encoding="utf-8") as infile:
+                    for line in infile:
+                        num += 1
+                        outfile.write(re.sub(r"^№\d+, ", f"№{num}, ", line))
+        self.log(f"Ссылки со всех страниц объединены в {file_path} ({num} ссылок)")
+        return file_path
+
+    def run(self):
+        if not self.urls:
+            self.log("Не указан ни один URL.")
+            return
+        deadline = time.monotonic() + self.timeout if self.timeout else math.inf
+        self.progress(0)
+        if self.async_engine():
+            asyncio.run(self.run_async(deadline))
+        else:
+            self.run_threads(deadline)
+
+        if self.cancelled.is_set():
+            # Отмененное задание не объединяет частичные результаты и не меняет индекс ссылок:
+            # file_path остается пустым, и прежний файл ссылок не подменяется
+            return
+        files = [self.results[url] for url in self.urls if self.results.get(url)]
+        if len(self.urls) > 1 and files:
+            self.file_path = self.merge(files)
+        elif files:
+            self.file_path = files[0]
+        if self.diff and files:
+            self.full_path = self.file_path
+            self.file_path = self.write_delta()
+
+    def async_engine(self):
+        if not self.use_async:
+            return False
+        if not module_available("aiohttp"):
+            self.log("Асинхронный режим недоступен: библиотека aiohttp не установлена, ссылки извлекаются потоками.")
+            return False
+        if self.scheduler is not None:
+            # Очередь хоста и повторы после 429/5xx PolitenessScheduler есть только у потокового движка
+            self.log("Вежливый режим: ссылки извлекаются потоками, асинхронный режим не используется.")
+            return False
+        return True
+
+    def time_left(self, deadline):
+        # Оставшееся время задания; None - задание отменено или его время истекло
+        if self.cancelled.is_set():
+            self.log("Извлечение ссылок отменено.")
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self.log(f"Извлечение ссылок прервано: прошло больше {self.timeout} с.")
+            return None
+        return remaining
+
+    def url_done(self, url, result):
+        # result - функция, возвращающая путь к файлу ссылок (результат future или задачи)
+        try:
+            path = result()
+        except Exception as e:
+            self.log(f"Ошибка при извлечении ссылок с {url}: {e}")
+            path = None
+        self.results[url] = path
+        if path:
+            self.log(f"Ссылки с {url} были успешно извлечены в файл {path}")
+        else:
+            self.log(f"Не удалось получить ссылки с {url}")
+        self.progress(int(len(self.results) / len(self.urls) * 100))
+
+    def run_threads(self, deadline):
+        executor = ThreadPoolExecutor(max_workers=min(self.max_parallel, len(self.urls)))
+        futures = {executor.submit(self.extract, num, url, deadline): url for num, url in enumerate(self.urls)}
+        pending = set(futures)
+        try:
+            while pending:
+                remaining = self.time_left(deadline)
+                if remaining is None:
+                    break
+                done, pending = wait(pending, timeout=min(0.2, remaining), return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.url_done(futures[future], future.result)
+        finally:
+            # Незавершенные запросы не ждем: они закончатся сами, а их результат будет отброшен
+            self.stopped.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run_async(self, deadline):
+        # Все URL обрабатываются сразу (max_parallel не используется): число запросов
+        # ограничивает concurrency сессии. Незавершенные задачи при отмене и таймауте отменяются
+        crawler = AsyncCrawler("", self.extension, concurrency=self.concurrency, max_per_host=self.max_per_host,
+                               timeout=self.request_timeout, max_page_size=self.max_page_size, log=self.log)
+        self.log(f"Асинхронное извлечение ссылок: {crawler.concurrency} запросов одновременно, "
+                 f"до {crawler.max_per_host} к одному хосту")
+        async with crawler.make_session() as session:
+            tasks = {asyncio.create_task(self.extract_async(crawler, session, num, url, deadline)): url
+                     for num, url in enumerate(self.urls)}
+            pending = set(tasks)
+            try:
+                while pending:
+                    remaining = self.time_left(deadline)
+                    if remaining is None:
+                        break
+                    done, pending = await asyncio.wait(pending, timeout=min(0.2, remaining),
+                                                       return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        self.url_done(tasks[task], task.result)
+            finally:
+                self.stopped.set()
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def write_delta(self):
+        # Сравнение с индексом по каждой странице; индекс обновляется только для успешных извлечений
+        index = LinkIndex(self.index_path)
+        delta = {}
+        removed = {}
+        try:
+            for url in self.urls:
+                path = self.results.get(url)
+                if not path:
+                    continue
+                changes = index.update(url, LinkIndex.read_links(path))
+                self.log(f"Ссылки с {url}: новых {len(changes['added'])}, с новым названием "
+                         f"{len(changes['changed'])}, исчезло {len(changes['removed'])}")
+                for link, title in changes["added"] + changes["changed"]:
+                    delta.setdefault(link, title)
+                for link, title in changes["removed"]:
+                    removed.setdefault(link, title)
+        finally:
+            index.close()
+        delta_path = LinkIndex.write_links(delta.items(), f"Sort_obj.delta.{self.extension}")
+        self.removed_path = LinkIndex.write_links(removed.items(), f"Sort_obj.removed.{self.extension}")
+        self.log(f"Новые и измененные ссылки ({len(delta)}) сохранены в {delta_path}, "
+                 f"исчезнувшие ({len(removed)}) - в {self.removed_path}")
+        return delta_path
+
+LINK_PATTERN = re.compile(r'(https?://[^\s]+|/[\w\-\/]+/)')
+
+# Полный URL из строки файла ссылок или None, если ссылки в строке нет
+def resolve_link(line, base_url):
+    match = LINK_PATTERN.search(line)
+    if not match:
+        return None
+    url = match.group(1)
+    if url.startswith('/'):
+        return urljoin(base_url, url)
+    return url
+
+# Потоковое чтение файла ссылок: строки разбираются по мере чтения, без загрузки файла в память
+class LinkReader:
+    def __init__(self, file_with_links, base_url, filter_keyword=None):
+        self.file_with_links = file_with_links
+        self.base_url = base_url
+        self.filter_pattern = re.compile(filter_keyword, re.I) if filter_keyword else None
+        self.total_bytes = os.path.getsize(file_with_links)
+        self.bytes_read = 0
+        self.lines = 0  # строк, прошедших фильтр
+        self.finished = False
+        self.skipped = []
+
+    def __iter__(self):
+        # Возвращает (номер строки после фильтра, полный URL); строки без ссылок попадают в skipped
+        with open(self.file_with_links, "rb") as infile:
+            for raw in infile:
+                self.bytes_read += len(raw)
+                line = raw.decode("utf-8", errors="replace")
+                if self.filter_pattern and not self.filter_pattern.search(line):
+                    continue
+                self.lines += 1
+                full_url = resolve_link(line, self.base_url)
+                if full_url:
+                    yield self.lines - 1, full_url
+                else:
+                    self.skipped.append(line)
+        self.finished = True
+
+    def estimated_total(self):
+        # Пока файл дочитан не до конца, общее число строк оценивается по доле прочитанных байт
+        if self.finished or not self.bytes_read:
+            return self.lines
+        return max(self.lines, int(self.lines * self.total_bytes / self.bytes_read))
+
+    def percent(self, processed):
+        # processed - число обработанных ссылок; пропущенные строки считаются обработанными сразу
+        total = self.estimated_total()
+        if not total:
+            return 100 if self.finished else 0
+        return min(100, int((processed + len(self.skipped)) / total * 100))
+
+# Файл строк с произвольным доступом без загрузки в память: смещения строк индексируются
+# одним проходом, сами строки читаются с диска блоками по мере надобности (редактор ссылок)
+class LineIndex:
+    BLOCK_LINES = 256
+
+    def __init__(self, path, cache_blocks=None):
+        self.path = path
+        self.cache_blocks = ConfigManager.setting("line_cache_blocks", cache_blocks)
+        self._blocks = OrderedDict()
+        self._file = open(path, "rb")
+        self.offsets = array("Q")
+        position = 0
+        for raw in self._file:
+            self.offsets.append(position)
+            position += len(raw)
+        self.size = position
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @staticmethod
+    def decode(raw):
+        return raw.decode("utf-8", errors="replace").rstrip("\r\n")
+
+    def block(self, number):
+        lines = self._blocks.get(number)
+        if lines is not None:
+            self._blocks.move_to_end(number)
+            return lines
+        first = number * self.BLOCK_LINES
+        last = min(first + self.BLOCK_LINES, len(self.offsets))
+        end = self.offsets[last] if last < len(self.offsets) else self.size
+        self._file.seek(self.offsets[first])
+        # Деление только по \n, как и при индексации: одиночный \r не начинает новую строку
+        lines = [self.decode(raw) for raw in self._file.read(end - self.offsets[first]).split(b"\n")[:last - first]]
+        self._blocks[number] = lines
+        if len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+        return lines
+
+    def line(self, number):
+        return self.block(number // self.BLOCK_LINES)[number % self.BLOCK_LINES]
+
+    def __iter__(self):
+        # Потоковое чтение всех строк (поиск, сохранение) мимо кэша блоков
+        with open(self.path, "rb") as f:
+            for raw in f:
+                yield self.decode(raw)
+
+    def close(self):
+        self._file.close()
+
+# Путь к файлу сохраненной страницы
+def page_file_path(output_dir, url, extension):
+    sanitized_filename = re.sub(r'[<>:"/\\|?*]', '_', url)
+    filename = f"{sanitized_filename.replace('https://', '').replace('/', '_')}.{extension}"
+    return os.path.join(output_dir, filename)
+
+# Кодировка, указанная в заголовке Content-Type или в <meta charset> в начале документа
+CHARSET_PATTERN = re.compile(r'charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+
+def declared_encoding(content_type, head=b""):
+    candidates = []
+    match = CHARSET_PATTERN.search(content_type or "")
+    if match:
+        candidates.append(match.group(1))
+    match = META_CHARSET_PATTERN.search(head[:4096])
+    if match:
+        candidates.append(match.group(1).decode("ascii", errors="ignore"))
+    for name in candidates:
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            continue
+    return None
+
+# Кодировка неразмеченной страницы по образцу: сначала проверка UTF-8, статистическое
+# определение (charset_normalizer/chardet) - только если образец не в UTF-8
+def guess_encoding(sample):
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    detected = chardet.detect(sample).get("encoding") if chardet is not None else None
+    return detected or "utf-8"
+
+# Страница больше допустимого размера
+class PageTooLarge(Exception):
+    pass
+
+# Проверка лимита размера до чтения тела (по Content-Length) и по мере чтения
+def check_declared_size(headers, max_size):
+    length = headers.get("Content-Length") or ""
+    if max_size and length.isdigit() and int(length) > max_size:
+        raise PageTooLarge(f"размер {int(length) // 1024} КБ больше лимита {max_size // 1024} КБ")
+
+def check_received_size(received, max_size):
+    if max_size and received > max_size:
+        raise PageTooLarge(f"страница больше лимита {max_size // 1024} КБ")
+
+# Тело ответа по частям с проверкой лимита размера; ответ должен быть получен с stream=True.
+# В stats (если передан) накапливаются байты и время ожидания данных из сети, а объект hashlib
+# в stats["hash"] получает все части; stop - проверка перед каждой частью, что ссылку
+# пропустили и дочитывать не нужно
+def iter_body(response, max_size=None, chunk_size=64 * 1024, stats=None, stop=None):
+    check_declared_size(response.headers, max_size)
+    stats = {} if stats is None else stats
+    stats.setdefault("bytes", 0)
+    stats.setdefault("transfer", 0.0)
+    digest = stats.get("hash")
+    chunks = response.iter_content(chunk_size)
+    while True:
+        started = time.perf_counter()
+        chunk = next(chunks, None)
+        stats["transfer"] += time.perf_counter() - started
+        if chunk is None:
+            return
+        stats["bytes"] += len(chunk)
+        check_received_size(stats["bytes"], max_size)
+        if stop is not None and stop():
+            raise UrlSkipped(response.url)
+        if digest is not None:
+            digest.update(chunk)
+        yield chunk
+
+def read_body(response, max_size=None, stats=None, stop=None):
+    return b"".join(iter_body(response, max_size, stats=stats, stop=stop))
+
+# Перекодирование частей текста в UTF-8 без сборки всей страницы в памяти
+def write_utf8(outfile, chunks, encoding):
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for chunk in chunks:
+        outfile.write(decoder.decode(chunk).encode("utf-8"))
+    outfile.write(decoder.decode(b"", final=True).encode("utf-8"))
+
+# Запись страницы в файл в UTF-8 по мере получения частей. Страницы в UTF-8 и без указанной
+# кодировки пишутся как есть с проверкой по ходу; если неразмеченная страница оказалась не в UTF-8,
+# кодировка определяется по первой части и файл перекодируется. Части передает вызывающий код,
+# поэтому запись одна и для потоков (requests), и для асинхронного движка (aiohttp)
+class PageFileWriter:
+    def __init__(self, filepath, content_type=None):
+        self.filepath = filepath
+        self.content_type = content_type
+        # В асинхронном движке все задачи в одном потоке: имя временного файла - по объекту записи
+        self.tmp_path = f"{filepath}.{os.getpid()}.{id(self)}.part"
+        self.file = open(self.tmp_path, "wb")
+        self.first = None
+        self.encoding = None
+        self.valid = True
+        self.validator = None
+        self.decoder = None
+
+    def write(self, chunk):
+        if self.first is None:
+            self.first = chunk
+            self.encoding = declared_encoding(self.content_type, chunk)
+            if self.encoding in (None, "utf-8"):
+                self.validator = codecs.getincrementaldecoder("utf-8")()
+            else:
+                self.decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        if self.decoder is not None:
+            self.file.write(self.decoder.decode(chunk).encode("utf-8"))
+            return
+        if self.valid:
+            try:
+                self.validator.decode(chunk)
+            except UnicodeDecodeError:
+                self.valid = False
+        self.file.write(chunk)
+
+    def finish(self, chunk_size=64 * 1024):
+        # Возвращает кодировку страницы
+        if self.first is None:
+            self.encoding = declared_encoding(self.content_type, b"")
+        if self.decoder is not None:
+            self.file.write(self.decoder.decode(b"", final=True).encode("utf-8"))
+        self.file.close()
+        if self.encoding is None and not self.valid:
+            self.encoding = guess_encoding(self.first)
+            with open(self.tmp_path, "rb") as src, open(self.filepath, "wb") as dst:
+                write_utf8(dst, iter(lambda: src.read(chunk_size), b""), self.encoding)
+            os.remove(self.tmp_path)
+        else:
+            os.replace(self.tmp_path, self.filepath)
+        return self.encoding or "utf-8"
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+# Потоковая запись ответа requests в файл (см. PageFileWriter)
+def stream_to_file(response, filepath, max_size=None, chunk_size=64 * 1024, stats=None, stop=None):
+    writer = PageFileWriter(filepath, response.headers.get("Content-Type"))
+    try:
+        for chunk in iter_body(response, max_size, chunk_size, stats, stop):
+            writer.write(chunk)
+        return writer.finish(chunk_size)
+    except BaseException:
+        writer.abort()
+        raise
+
+# Архив страниц вместо отдельного файла на каждую страницу: тела сжимаются (zstandard, без него - zlib)
+# и дописываются в сегменты по ~256 МБ. Одинаковое содержимое хранится один раз, индексы
+# "хеш -> смещение в сегменте" и "URL -> хеш" лежат в SQLite
+class PageArchive:
+    ARCHIVE_DIR = "pages_archive"
+
+    def __init__(self, archive_dir=None, segment_size=256 * 1024 * 1024, level=3):
+        self.archive_dir = archive_dir or PageArchive.ARCHIVE_DIR
+        self.segment_size = segment_size
+        self.level = level
+        self.zstd = optional_module("zstandard")
+        self.codec = "zstd" if self.zstd else "zlib"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(self.archive_dir, "index.sqlite"), timeout=30,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "digest TEXT PRIMARY KEY, segment INTEGER, offset INTEGER, length INTEGER, size INTEGER, codec TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, digest TEXT, status INTEGER, encoding TEXT, content_type TEXT, stored_at REAL)"
+        )
+        self._db.commit()
+        row = self._db.execute("SELECT MAX(segment) FROM blobs").fetchone()
+        self.segment = row[0] or 0
+        self._segment_file = None
+
+    def segment_path(self, segment, codec=None):
+        return os.path.join(self.archive_dir, f"segment_{segment:05d}.{codec or self.codec}")
+
+    def compress(self, content):
+        # Объекты zstandard нельзя использовать из нескольких потоков, поэтому у каждого потока свой
+        if self.codec == "zlib":
+            return zlib.compress(content, 6)
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = self.zstd.ZstdCompressor(level=self.level)
+        return compressor.compress(content)
+
+    def decompress(self, data, codec):
+        if codec == "zlib":
+            return zlib.decompress(data)
+        if self.zstd is None:
+            raise RuntimeError("Для чтения архива нужна библиотека zstandard")
+        decompressor = getattr(self._local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = self.zstd.ZstdDecompressor()
+        return decompressor.decompress(data)
+
+    def append(self, data):
+        # Вызывается под блокировкой; возвращает (сегмент, смещение)
+        if self._segment_file is None:
+            self._segment_file = open(self.segment_path(self.segment), "ab")
+        offset = self._segment_file.tell()
+        if offset and offset + len(data) > self.segment_size:
+            self._segment_file.close()
+            self.segment += 1
+            self._segment_file = open(self.segment_path(self.segment), "ab")
+            offset = self._segment_file.tell()
+        self._segment_file.write(data)
+        self._segment_file.flush()
+        return self.segment, offset
+
+    def store(self, url, content, status=200, encoding=None, content_type=None):
+        # Возвращает место страницы в архиве для журнала и лога
+        digest = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            known = self._db.execute("SELECT segment, offset, codec FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        data = None if known else self.compress(content)
+        with self._lock:
+            if data is not None:
+                # Пока страница сжималась, то же содержимое мог сохранить другой поток
+                known = self._db.execute("SELECT segment, offset, codec FROM blobs WHERE digest = ?",
+                                         (digest,)).fetchone()
+            if known:
+                segment, offset, codec = known
+            else:
+                segment, offset = self.append(data)
+                codec = self.codec
+                self._db.execute("INSERT INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                                 (digest, segment, offset, len(data), len(content), self.codec))
+            self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                             (url, digest, status, encoding, content_type, time.time()))
+            # Индекс фиксируется до того, как журнал задания отметит страницу готовой: после сбоя
+            # отмеченная страница всегда есть в архиве (в режиме WAL это короткая запись в конец лога)
+            self._db.commit()
+        return f"{self.segment_path(segment, codec)}@{offset}"
+
+    def location(self, url):
+        entry = self.lookup(url)
+        if entry is None:
+            return None
+        return f"{self.segment_path(entry['segment'], entry['codec'])}@{entry['offset']}"
+
+    def lookup(self, url):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT b.segment, b.offset, b.length, b.codec, p.encoding, p.content_type, p.status "
+                "FROM pages p JOIN blobs b ON b.digest = p.digest WHERE p.url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("segment", "offset", "length", "codec", "encoding", "content_type", "status")
+        return dict(zip(keys, row))
+
+    def load(self, url):
+        # Содержимое страницы в байтах или None, если ее нет в архиве
+        entry = self.lookup(url)
+        if entry is None:
+            return None
+        with open(self.segment_path(entry["segment"], entry["codec"]), "rb") as f:
+            f.seek(entry["offset"])
+            data = f.read(entry["length"])
+        return self.decompress(data, entry["codec"])
+
+    def load_text(self, url):
+        content = self.load(url)
+        if content is None:
+            return None
+        entry = self.lookup(url)
+        return content.decode(entry["encoding"] or "utf-8", errors="replace")
+
+    def merge(self, other):
+        # Перенос страниц другого архива (архива шарда). Сжатое содержимое копируется без пересжатия,
+        # если кодек тот же; содержимое, которое уже есть в архиве, не дописывается.
+        # Возвращает число перенесенных страниц
+        moved = 0
+        segments = {}
+        with other._lock, self._lock:
+            try:
+                rows = other._db.execute(
+                    "SELECT p.url, p.digest, p.status, p.encoding, p.content_type, p.stored_at, "
+                    "b.segment, b.offset, b.length, b.size, b.codec "
+                    "FROM pages p JOIN blobs b ON b.digest = p.digest ORDER BY b.segment, b.offset"
+                )
+                for url, digest, status, encoding, content_type, stored_at, *blob in rows:
+                    segment, offset, length, size, codec = blob
+                    if not self._db.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone():
+                        path = other.segment_path(segment, codec)
+                        if path not in segments:
+                            segments[path] = open(path, "rb")
+                        segments[path].seek(offset)
+                        data = segments[path].read(length)
+                        if codec != self.codec:
+                            data = self.compress(other.decompress(data, codec))
+                        new_segment, new_offset = self.append(data)
+                        self._db.execute("INSERT INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                                         (digest, new_segment, new_offset, len(data), size, self.codec))
+                    self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                                     (url, digest, status, encoding, content_type, stored_at))
+                    moved += 1
+                self._db.commit()
+            finally:
+                for f in segments.values():
+                    f.close()
+        return moved
+
+    def stats(self):
+        with self._lock:
+            pages = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            blobs, size, stored = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0) FROM blobs"
+            ).fetchone()
+        return {"pages": pages, "unique": blobs, "size": size, "stored": stored}
+
+    def stats_message(self):
+        stats = self.stats()
+        ratio = stats["size"] / stats["stored"] if stats["stored"] else 0
+        return (f"Архив {self.archive_dir}: страниц {stats['pages']}, уникальных {stats['unique']}, "
+                f"{stats['size'] // 1024} КБ сжато до {stats['stored'] // 1024} КБ ({ratio:.1f}x, {self.codec})")
+
+    def close(self):
+        with self._lock:
+            if self._segment_file is not None:
+                self._segment_file.close()
+                self._segment_file = None
+            self._db.commit()
+            self._db.close()
+
+# Задача просит вернуть элемент в очередь: хост попросил подождать (429/5xx)
+class RetryLater(Exception):
+    pass
+
+# Ссылка пропущена по команде пользователя
+class UrlSkipped(Exception):
+    pass
+
+# Управление заданием из другого потока (окна программы, обработчика Ctrl+C): отмена, пауза,
+# пропуск ссылок и хостов, перенос медленного хоста в конец очереди. Задачи проверяют
+# состояние между запросами, поэтому уже начатые запросы завершаются штатно
+class JobControl:
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._lock = threading.Lock()
+        self.skipped_urls = set()
+        self.skipped_hosts = set()
+        self.deferred_hosts = set()
+        self.in_flight = {}
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def cancel(self):
+        self.cancelled.set()
+        self._running.set()
+
+    def pause(self):
+        if not self.cancelled.is_set():
+            self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def wait_resumed(self, timeout=None):
+        # False, если задание отменено
+        self._running.wait(timeout)
+        return not self.cancelled.is_set()
+
+    def skip(self, target):
+        # target - ссылка целиком или имя хоста
+        target = target.strip()
+        if "://" in target:
+            self.skipped_urls.add(target)
+        elif target:
+            self.skipped_hosts.add(target.lower())
+
+    def deprioritize(self, host):
+        self.deferred_hosts.add(host.strip().lower())
+
+    def is_skipped(self, url):
+        return url in self.skipped_urls or DownloadPool.host_of(url) in self.skipped_hosts
+
+    def is_deferred(self, host):
+        return host in self.deferred_hosts
+
+    def started(self, url):
+        with self._lock:
+            self.in_flight[url] = time.monotonic()
+
+    def finished(self, url):
+        with self._lock:
+            self.in_flight.pop(url, None)
+
+    def slowest(self, count=10):
+        # Выполняющиеся запросы, самые долгие первыми: [(ссылка, секунд)]
+        now = time.monotonic()
+        with self._lock:
+            running = sorted(self.in_flight.items(), key=lambda entry: entry[1])
+        return [(url, now - started) for url, started in running[:count]]
+
+    def snapshot(self):
+        # Состояние для передачи в процессы шардов
+        return {"cancelled": self.cancelled.is_set(), "paused": self.paused,
+                "skipped": sorted(self.skipped_urls | self.skipped_hosts), "deferred": sorted(self.deferred_hosts)}
+
+    def apply(self, state):
+        if state.get("cancelled"):
+            self.cancel()
+        elif state.get("paused"):
+            self.pause()
+        else:
+            self.resume()
+        for target in state.get("skipped", ()):
+            self.skip(target)
+        for host in state.get("deferred", ()):
+            self.deprioritize(host)
+
+# Пул параллельных загрузок с ограничением числа запросов на хост и в целом
+class DownloadPool:
+    def __init__(self, workers=None, max_in_flight=None, max_per_host=None, max_deferred=10000, scheduler=None,
+                 control=None):
+        self.workers = max(1, int(ConfigManager.setting("workers", workers)))
+        self.max_in_flight = max(1, int(max_in_flight or self.workers * 2))
+        self.max_per_host = max(1, int(ConfigManager.setting("max_per_host", max_per_host) or self.workers))
+        self.max_deferred = max_deferred
+        self.scheduler = scheduler
+        self.control = control
+
+    @staticmethod
+    def host_of(url):
+        return urlparse(url).netloc.lower()
+
+    def map(self, func, items, url_of=None):
+        # Возвращает (элемент, результат, ошибка) в порядке завершения запросов;
+        # url_of извлекает URL из элемента, если элементы - не сами ссылки.
+        # Пропущенные пользователем элементы возвращаются с ошибкой UrlSkipped без запроса,
+        # после отмены новые запросы не начинаются, а начатые дожидаются завершения
+        items = iter(items)
+        url_of = url_of or (lambda item: item)
+        control = self.control
+        deferred = {}
+        host_load = {}
+        pending = {}
+        skipped = deque()
+        deferred_count = 0
+        exhausted = False
+
+        def ready(host, now):
+            if host_load.get(host, 0) >= self.max_per_host:
+                return False
+            # Хост, перенесенный в конец очереди, ждет, пока не закончатся остальные ссылки
+            if (control is not None and control.is_deferred(host)
+                    and not exhausted and deferred_count < self.max_deferred):
+                return False
+            return self.scheduler is None or self.scheduler.ready_at(host) <= now
+
+        def defer(host, item):
+            nonlocal deferred_count
+            deferred.setdefault(host, deque()).append(item)
+            deferred_count += 1
+
+        def take():
+            nonlocal deferred_count, exhausted
+            now = time.monotonic()
+            # Сначала отложенные ссылки хостов, у которых освободился слот
+            for host, host_queue in deferred.items():
+                while host_queue and control is not None and control.is_skipped(url_of(host_queue[0])):
+                    skipped.append(host_queue.popleft())
+                    deferred_count -= 1
+                if host_queue and ready(host, now):
+                    item = host_queue.popleft()
+                    deferred_count -= 1
+                    if not host_queue:
+                        del deferred[host]
+                    return item
+            for host in [host for host, host_queue in deferred.items() if not host_queue]:
+                del deferred[host]
+            while not exhausted and deferred_count < self.max_deferred:
+                item = next(items, None)
+                if item is None:
+                    exhausted = True
+                    break
+                url = url_of(item)
+                if control is not None and control.is_skipped(url):
+                    skipped.append(item)
+                    continue
+                host = self.host_of(url)
+                if ready(host, now):
+                    return item
+                defer(host, item)
+            return None
+
+        def next_ready():
+            # Через сколько секунд освободится хост с отложенными ссылками
+            if self.scheduler is None:
+                return None
+            times = [self.scheduler.ready_at(host) for host in deferred
+                     if host_load.get(host, 0) < self.max_per_host]
+            if not times:
+                return None
+            return max(0.01, min(times) - time.monotonic())
+
+        def stopped():
+            return control is not None and (control.cancelled.is_set() or control.paused)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                while len(pending) < self.max_in_flight and not stopped():
+                    item = take()
+                    if item is None:
+                        break
+                    url = url_of(item)
+                    host = self.host_of(url)
+                    host_load[host] = host_load.get(host, 0) + 1
+                    if self.scheduler is not None:
+                        self.scheduler.reserve(url)
+                    if control is not None:
+                        control.started(url)
+                    pending[executor.submit(func, item)] = (item, host)
+
+                while skipped:
+                    item = skipped.popleft()
+                    yield item, None, UrlSkipped(url_of(item))
+
+                if not pending:
+                    if control is not None and control.cancelled.is_set():
+                        break
+                    if control is not None and control.paused:
+                        control.wait_resumed(0.5)
+                        continue
+                    if not deferred and exhausted:
+                        break
+                    # Все оставшиеся хосты ждут своей очереди
+                    time.sleep(next_ready() or 0.01)
+                    continue
+
+                timeout = next_ready()
+                if control is not None:
+                    # Команды пользователя проверяются и во время долгих запросов
+                    timeout = min(timeout or 0.5, 0.5)
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item, host = pending.pop(future)
+                    host_load[host] -= 1
+                    if control is not None:
+                        control.finished(url_of(item))
+                    error = future.exception()
+                    if isinstance(error, RetryLater):
+                        defer(host, item)
+                        continue
+                    yield item, (None if error else future.result()), error
+
+# Результаты проверки ссылок: статус, цепочка перенаправлений, итоговый адрес, тип и размер
+# содержимого. Задачи загрузки и скриншотов читают таблицу, чтобы не тратить время на
+# недоступные ссылки, не-HTML и ссылки, ведущие на уже обработанную страницу.
+# Результат старше ttl часов устарел: по нему ссылки не пропускаются
+class LinkStatusTable:
+    STATUS_FILE = "link_status.sqlite"
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or LinkStatusTable.STATUS_FILE
+        self.ttl = float(ConfigManager.setting("probe_ttl", ttl)) * 3600
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS links ("
+            "url TEXT PRIMARY KEY, status INTEGER, final_url TEXT, redirects TEXT, content_type TEXT, "
+            "content_length INTEGER, method TEXT, error TEXT, duplicate_of TEXT, checked_at REAL)"
+        )
+        self._db.commit()
+
+    def save(self, record):
+        # Запись фиксируется вызовом commit(), чтобы тысячи ссылок не давали тысячи транзакций
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, ?)",
+                (record["url"], record["status"], record["final_url"],
+                 json.dumps(record["redirects"], ensure_ascii=False), record["content_type"],
+                 record["content_length"], record["method"], record["error"], time.time())
+            )
+
+    def mark_duplicate(self, url, original):
+        with self._lock:
+            self._db.execute("UPDATE links SET duplicate_of = ? WHERE url = ?", (original, url))
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def clear(self, older_than=None):
+        # Удаляет все результаты или только проверенные больше older_than секунд назад;
+        # возвращает число удаленных записей
+        with self._lock:
+            if older_than is None:
+                cursor = self._db.execute("DELETE FROM links")
+            else:
+                cursor = self._db.execute("DELETE FROM links WHERE checked_at < ?", (time.time() - older_than,))
+            self._db.commit()
+            return cursor.rowcount
+
+    def lookup(self, url):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, final_url, redirects, content_type, content_length, method, error, duplicate_of, "
+                "checked_at FROM links WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        keys = ("status", "final_url", "redirects", "content_type", "content_length", "method", "error",
+                "duplicate_of", "checked_at")
+        record = dict(zip(keys, row))
+        record["redirects"] = json.loads(record["redirects"] or "[]")
+        return record
+
+    @staticmethod
+    def skip_reason(record):
+        # Причина не обрабатывать ссылку или None. Таймауты, 408, 429 и 5xx могут быть
+        # временными, поэтому такие ссылки не пропускаются
+        if record is None:
+            return None
+        if record["error"]:
+            if record["error"] == "Timeout" or record["error"].endswith("Timeout"):
+                return None
+            return f"недоступна ({record['error']})"
+        status = record["status"]
+        if status is not None and 400 <= status < 500 and status not in (408, 429):
+            return f"статус {status}"
+        content_type = (record["content_type"] or "").split(";")[0].strip().lower()
+        if content_type and "html" not in content_type:
+            return f"тип содержимого {content_type}"
+        if record["duplicate_of"]:
+            return f"ведет на ту же страницу, что и {record['duplicate_of']}"
+        return None
+
+    def fresh(self, record):
+        return record is not None and (not self.ttl or time.time() - (record["checked_at"] or 0) <= self.ttl)
+
+    def reason(self, url):
+        record = self.lookup(url)
+        return self.skip_reason(record) if self.fresh(record) else None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Параллельная проверка ссылок перед загрузкой: HEAD, а если сервер не поддерживает HEAD -
+# GET первого байта (Range). Ссылки, ведущие после перенаправлений на один адрес, сводятся
+# к первой из них по порядку в файле. Результат - таблица LinkStatusTable и отчет link_status.tsv
+class LinkChecker:
+    # Статусы, с которыми серверы часто отвечают на HEAD, хотя GET работает
+    HEAD_UNSUPPORTED = (400, 403, 405, 406, 501)
+    REPORT_COLUMNS = ("url", "status", "final_url", "redirects", "content_type", "content_length", "method", "error")
+
+    def __init__(self, file_with_links, base_url, filter_keyword=None, workers=None, max_per_host=None,
+                 timeout=None, table=None, ttl=None, scheduler=None, log=None, progress=None, control=None,
+                 output_file="link_status.tsv"):
+        self.log = log or logger.info
+        self.progress = progress or (lambda value: None)
+        self.file_with_links = file_with_links
+        self.base_url = base_url
+        self.filter_keyword = filter_keyword
+        self.timeout = ConfigManager.setting("probe_timeout", timeout)
+        self.table = table
+        self.ttl = ttl  # срок действия результатов, ч, если таблицу создает сама проверка
+        self.scheduler = scheduler
+        self.control = control
+        self.output_file = output_file
+        self.skipped = []
+        self.pool = DownloadPool(ConfigManager.setting("probe_workers", workers), None,
+                                 ConfigManager.setting("max_per_host", max_per_host),
+                                 scheduler=scheduler, control=control)
+        HttpClient.configure(pool_maxsize=max(HttpClient.pool_maxsize, self.pool.max_per_host))
+
+    @staticmethod
+    def content_length(response):
+        # У ответа 206 полный размер указан в Content-Range: "bytes 0-0/12345"
+        content_range = response.headers.get("Content-Range", "")
+        if response.status_code == 206 and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1].strip()
+            return int(total) if total.isdigit() else None
+        length = response.headers.get("Content-Length", "")
+        return int(length) if length.isdigit() else None
+
+    def request(self, url, method):
+        if method == "HEAD":
+            return HttpClient.session().head(url, allow_redirects=True, timeout=self.timeout)
+        # Сервер может не поддерживать Range и отдать страницу целиком: тело не читается
+        return HttpClient.get(url, headers={"Range": "bytes=0-0"}, allow_redirects=True, stream=True,
+                              timeout=self.timeout)
+
+    def probe(self, url):
+        record = {"url": url, "status": None, "final_url": None, "redirects": [], "content_type": None,
+                  "content_length": None, "method": "HEAD", "error": None, "duplicate_of": None}
+        if self.scheduler is not None and not self.scheduler.allowed(url):
+            record["error"] = "robots.txt"
+            return record
+        response = None
+        try:
+            response = self.request(url, "HEAD")
+            if response.status_code in self.HEAD_UNSUPPORTED or (
+                    response.status_code < 300 and "Content-Type" not in response.headers):
+                response.close()
+                record["method"] = "GET"
+                response = self.request(url, "GET")
+            if self.scheduler is not None and self.scheduler.record(url, response) is not None:
+                raise RetryLater(url)
+            record["status"] = response.status_code
+            record["final_url"] = response.url
+            record["redirects"] = [[step.status_code, step.url] for step in response.history]
+            record["content_type"] = response.headers.get("Content-Type")
+            record["content_length"] = self.content_length(response)
+        except requests.exceptions.RequestException as e:
+            record["error"] = type(e).__name__
+            self.log(f"Ссылка {url} недоступна: {e}")
+        finally:
+            if response is not None:
+                response.close()
+        return record
+
+    @classmethod
+    def report_row(cls, record):
+        # В отчете вместо цепочки перенаправлений - их число; цепочка хранится в таблице
+        values = dict(record, redirects=len(record["redirects"]))
+        return "\t".join("" if values[key] is None else str(values[key]) for key in cls.REPORT_COLUMNS) + "\n"
+
+    def run(self):
+        if not os.path.exists(self.file_with_links):
+            self.log(f"Файл {self.file_with_links} не найден.")
+            return None
+        table = self.table or LinkStatusTable(ttl=self.ttl)
+        if table.ttl:
+            # Устаревшие результаты все равно не используются, а таблица не должна расти бесконечно
+            removed = table.clear(older_than=table.ttl)
+            if removed:
+                self.log(f"Удалено устаревших результатов проверки: {removed}")
+        reader = LinkReader(self.file_with_links, self.base_url, self.filter_keyword)
+        # Первая по порядку в файле ссылка на каждый итоговый адрес: (номер строки, ссылка)
+        originals = {}
+        # Доступные ссылки и их итоговые адреса
+        finals = {}
+        lines = {}
+        counts = {"alive": 0, "dead": 0, "other": 0, "duplicates": 0}
+        processed = 0
+
+        def pending_urls():
+            for idx, full_url in reader:
+                if full_url in lines:
+                    continue
+                lines[full_url] = idx
+                yield full_url
+
+        self.log(f"Проверка ссылок в {self.pool.workers} потоков")
+        try:
+            with open(self.output_file, "w", encoding="utf-8") as report:
+                report.write("\t".join(self.REPORT_COLUMNS) + "\n")
+                for url, record, error in self.pool.map(self.probe, pending_urls()):
+                    processed += 1
+                    self.progress(reader.percent(processed))
+                    if record is None:
+                        if error and not isinstance(error, UrlSkipped):
+                            self.log(f"Ошибка при проверке {url}: {error}")
+                        continue
+                    table.save(record)
+                    report.write(self.report_row(record))
+                    reason = LinkStatusTable.skip_reason(record)
+                    if reason is None:
+                        counts["alive"] += 1
+                    elif record["error"] or (record["status"] or 0) >= 400:
+                        counts["dead"] += 1
+                    else:
+                        counts["other"] += 1
+                    if reason is None and record["final_url"]:
+                        final_url = normalize_url(record["final_url"])
+                        finals[url] = final_url
+                        original = originals.get(final_url)
+                        if original is None or lines[url] < original[0]:
+                            originals[final_url] = (lines[url], url)
+                        if original is not None:
+                            counts["duplicates"] += 1
+                    if processed % 500 == 0:
+                        table.commit()
+            # Дубликаты отмечаются после проверки всех ссылок, когда известна первая по порядку
+            for url, final_url in finals.items():
+                original = originals[final_url][1]
+                if original != url:
+                    table.mark_duplicate(url, original)
+            table.commit()
+        finally:
+            if self.table is None:
+                table.close()
+        if self.control is not None and self.control.cancelled.is_set():
+            self.log(f"Проверка ссылок остановлена: проверено {processed} ссылок")
+            return None
+        self.progress(reader.percent(processed))
+        self.skipped = reader.skipped
+        self.log(f"Проверка ссылок завершена: доступны {counts['alive'] - counts['duplicates']}, "
+                 f"недоступны {counts['dead']}, не HTML {counts['other']}, "
+                 f"ведут на уже проверенную страницу {counts['duplicates']}. Отчет: {self.output_file}")
+        self.log(HttpClient.stats_message())
+        return counts
+
+# Загрузка страниц из файла ссылок
+class PageDownloader:
+    def __init__(self, file_with_links, base_url, extension, filter_keyword=None,
+                 workers=None, max_per_host=None, max_in_flight=None, cache=None, journal=None, resume=True,
+                 scheduler=None, log=None, progress=None, output_file=None, report_skipped=True, archive=None,
+                 max_page_size=None, metrics=None, control=None, on_result=None, link_index=None,
+                 link_status=None):
+        self.log = log or logger.info
+        self.control = control
+        # Индекс ссылок (LinkIndex), в который записываются хеши скачанных страниц
+        self.link_index = link_index
+        # Результаты проверки ссылок (LinkStatusTable): недоступные и не-HTML ссылки не скачиваются
+        self.link_status = link_status
+        # on_result(номер строки, ссылка, сведения о загрузке или None для уже скачанной ранее)
+        self.on_result = on_result
+        self.progress = progress or (lambda value: None)
+        self.scheduler = scheduler
+        self.cache = cache
+        self.archive = archive
+        self.max_page_size = max_page_size or ConfigManager.get("max_page_mb") * 1024 * 1024
+        self.request_timeout = ConfigManager.get("request_timeout")
+        self.metrics = metrics
+        self.retries = {}
+        self._retries_lock = threading.Lock()
+        self.journal = journal
+        self.resume = resume
+        self.file_with_links = file_with_links
+        self.output_dir = "downloaded_pages"
+        self.output_file = output_file or f"full_links.{extension}"
+        self.report_skipped = report_skipped
+        self.skipped = []
+        self.base_url = base_url
+        self.extension = extension
+        self.filter_keyword = filter_keyword
+        self.pool = DownloadPool(workers, max_in_flight, max_per_host, scheduler=scheduler, control=control)
+        # Пул соединений на хост не должен быть меньше числа одновременных запросов к нему
+        HttpClient.configure(pool_maxsize=max(HttpClient.pool_maxsize, self.pool.max_per_host))
+
+    def sanitize_filename(self, url):
+        return re.sub(r'[<>:"/\\|?*]', '_', url)
+
+    def run(self, reader=None):
+        # reader - общий LinkReader, если файл ссылок читает и другая задача (FetchPipeline)
+        if not os.path.exists(self.file_with_links):
+            self.log(f"Файл {self.file_with_links} не найден.")
+            return
+
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        try:
+            reader = reader or LinkReader(self.file_with_links, self.base_url, self.filter_keyword)
+
+            done = set()
+            if self.journal is not None:
+                job = CrawlJournal.job_id("pages", self.file_with_links, base_url=self.base_url,
+                                          extension=self.extension, filter_keyword=self.filter_keyword)
+                if self.resume:
+                    done = self.journal.completed(job)
+                else:
+                    self.journal.reset(job)
+
+            # Ссылки передаются в пул сразу по мере чтения файла
+            processed = 0
+            resumed = 0
+            content_changed = 0
+            rejected = 0
+            indexes = {}
+            with open(self.output_file, "w", encoding="utf-8") as outfile:
+                def pending_urls():
+                    nonlocal processed, resumed, rejected
+                    for idx, full_url in reader:
+                        outfile.write(f"Полный URL: {full_url}\n")
+                        if full_url in done:
+                            processed += 1
+                            resumed += 1
+                            if self.on_result is not None:
+                                self.on_result(idx, full_url, None)
+                            continue
+                        reason = self.link_status.reason(full_url) if self.link_status is not None else None
+                        if reason:
+                            processed += 1
+                            rejected += 1
+                            self.log(f"Страница {full_url} пропущена по результатам проверки: {reason}")
+                            if self.on_result is not None:
+                                self.on_result(idx, full_url, {
+                                    "status": None, "output": None, "content_type": None, "digest": None,
+                                    "unchanged": False, "skip": reason,
+                                })
+                            continue
+                        if self.on_result is not None:
+                            indexes.setdefault(full_url, deque()).append(idx)
+                        yield full_url
+
+                self.log(f"Загрузка страниц в {self.pool.workers} потоков")
+                for url, result, error in self.pool.map(self.download_page, pending_urls()):
+                    if isinstance(error, UrlSkipped):
+                        self.log(f"Страница {url} пропущена")
+                    elif error:
+                        self.log(f"Ошибка при скачивании {url}: {error}")
+                    status, filepath, record = result or (None, None, {})
+                    if self.journal is not None:
+                        self.journal.mark(job, url, "done" if filepath else "failed", status, filepath)
+                    digest = record.get("body", {}).get("hash")
+                    digest = digest.hexdigest() if digest is not None and filepath else None
+                    if self.link_index is not None and digest and self.link_index.record_digest(url, digest):
+                        content_changed += 1
+                        self.log(f"Содержимое страницы {url} изменилось с прошлой загрузки")
+                    if self.on_result is not None:
+                        idx = indexes[url].popleft()
+                        if not indexes[url]:
+                            del indexes[url]
+                        self.on_result(idx, url, {
+                            "status": status, "output": filepath, "content_type": record.get("content_type"),
+                            "digest": digest, "unchanged": record.get("unchanged", False),
+                        })
+                    processed += 1
+                    self.progress(reader.percent(processed))
+            if self.control is not None and self.control.cancelled.is_set():
+                self.log(f"Загрузка страниц остановлена: обработано {processed} ссылок. "
+                         f"Остальные будут скачаны при продолжении задания")
+                return
+            self.progress(reader.percent(processed))
+            if self.journal is not None:
+                # Задание выполнено до конца: продолжать нечего, следующий запуск загрузит
+                # (и проверит по кэшу) все ссылки заново
+                self.journal.reset(job)
+
+            if resumed:
+                self.log(f"Продолжение задания: пропущено {resumed} уже скачанных страниц")
+            if content_changed:
+                self.log(f"Изменилось содержимое {content_changed} страниц")
+            if rejected:
+                self.log(f"По результатам проверки ссылок пропущено {rejected} страниц")
+            self.log(f"Обработка завершена, результаты сохранены в {self.output_file}")
+            self.log(HttpClient.stats_message())
+            if self.archive is not None:
+                self.log(self.archive.stats_message())
+            if self.metrics is not None:
+                self.log(f"Метрики страниц: {self.metrics.summary_message()}")
+
+            self.skipped = reader.skipped
+            if reader.skipped and self.report_skipped:
+                self.log("Пропущенные строки:")
+                for skipped in reader.skipped:
+                    self.log(skipped.strip())
+
+        except FileNotFoundError as e:
+            self.log(f"Файл не найден: {e}")
+        finally:
+            if self.cache is not None:
+                self.cache.close()
+            if self.archive is not None:
+                self.archive.close()
+            if self.metrics is not None:
+                self.metrics.flush()
+            if self.journal is not None:
+                self.journal.close()
+            if self.link_index is not None:
+                self.link_index.close()
+            if self.link_status is not None:
+                self.link_status.close()
+
+    def download_page(self, url):
+        # Возвращает (статус, файл или место в архиве, сведения о загрузке)
+        record = {"phases": {}, "body": {}}
+        if self.on_result is not None or self.link_index is not None:
+            # Хеш тела нужен, чтобы узнать, изменилась ли страница с прошлого запуска
+            record["body"]["hash"] = hashlib.sha1()
+        if self.metrics is None:
+            return self.save_page(url, record) + (record,)
+        # Каждая попытка (в том числе повтор после 429/5xx) - отдельная запись метрик
+        result = None
+        error = None
+        started = time.perf_counter()
+        HttpClient.take_timings()
+        try:
+            result = self.save_page(url, record)
+            return result + (record,)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            status, filepath = result or (record.get("status"), None)
+            retry = isinstance(error, RetryLater)
+            with self._retries_lock:
+                retries = self.retries.get(url, 0)
+                if retry:
+                    self.retries[url] = retries + 1
+                else:
+                    self.retries.pop(url, None)
+            self.metrics.record("page", url, status, ok=filepath is not None, total=time.perf_counter() - started,
+                                phases=record["phases"], size=record["body"].get("bytes", 0), retries=retries,
+                                error="retry" if retry else error)
+
+    def save_page(self, url, record):
+        if self.scheduler is not None and not self.scheduler.allowed(url):
+            self.log(f"Страница {url} пропущена: запрещено правилами robots.txt")
+            return None, None
+        response = None
+        phases = record["phases"]
+        # Медленную страницу, которую пропустили во время загрузки, можно не дочитывать
+        stop = (lambda: self.control.is_skipped(url)) if self.control is not None else None
+        drain = True
+        try:
+            if self.cache is not None:
+                # Кэш читает тело по частям с тем же лимитом размера и не сохраняет большие страницы
+                response = self.cache.get(url, max_size=self.max_page_size, stop=stop, timeout=self.request_timeout)
+            else:
+                # Тело читается по частям при записи, а не целиком в память
+                response = HttpClient.get(url, timeout=self.request_timeout, stream=True)
+            record["status"] = response.status_code
+            record["content_type"] = response.headers.get("Content-Type")
+            phases.update(HttpClient.take_timings())
+            if getattr(response, "elapsed", None) is not None:
+                # elapsed у requests - от отправки запроса до получения заголовков, включая подключение
+                waited = response.elapsed.total_seconds() - phases.get("connect", 0.0) - phases.get("tls", 0.0)
+                phases["ttfb"] = max(0.0, waited)
+            if self.scheduler is not None:
+                pause = self.scheduler.record(url, response)
+                if pause is not None:
+                    self.log(f"Статус {response.status_code} для {url}, повтор через {pause:.1f} с")
+                    raise RetryLater(url)
+            if response.status_code == 200 and self.archive is not None:
+                location = self.archive.location(url) if getattr(response, "from_cache", False) else None
+                if location:
+                    self.log(f"Страница {url} не изменилась, копия в архиве {location} актуальна")
+                    record["unchanged"] = True
+                    # Тело не читалось, и хеш пустой: сохраненный хеш страницы остается прежним
+                    record["body"].pop("hash", None)
+                    return response.status_code, location
+                # Архив сжимает и хеширует страницу целиком, поэтому здесь тело собирается в памяти
+                content = read_body(response, self.max_page_size, record["body"], stop)
+                phases["transfer"] = record["body"]["transfer"] + getattr(response, "transfer", 0.0)
+                encoding = (declared_encoding(response.headers.get("Content-Type"), content[:4096])
+                            or guess_encoding(content[:64 * 1024]))
+                write_started = time.perf_counter()
+                location = self.archive.store(url, content, response.status_code, encoding,
+                                              response.headers.get("Content-Type"))
+                phases["write"] = time.perf_counter() - write_started
+                self.log(f"Страница {url} успешно сохранена в архив {location}")
+                return response.status_code, location
+            if response.status_code == 200:
+                filepath = page_file_path(self.output_dir, url, self.extension)
+                if getattr(response, "from_cache", False) and os.path.exists(filepath):
+                    self.log(f"Страница {url} не изменилась, файл {filepath} актуален")
+                    record["unchanged"] = True
+                    record["body"].pop("hash", None)
+                    return response.status_code, filepath
+
+                body_started = time.perf_counter()
+                stream_to_file(response, filepath, self.max_page_size, stats=record["body"], stop=stop)
+                # Запись на диск - все время сохранения, кроме ожидания данных из сети. Ответ,
+                # только что сохраненный в кэш, уже прочитан из сети (response.transfer)
+                phases["write"] = max(0.0, time.perf_counter() - body_started - record["body"]["transfer"])
+                phases["transfer"] = record["body"]["transfer"] + getattr(response, "transfer", 0.0)
+                self.log(f"Страница {url} успешно сохранена в файл {filepath}")
+                return response.status_code, filepath
+            else:
+                self.log(f"Не удалось скачать страницу {url}. Статус: {response.status_code}")
+                return response.status_code, None
+        except PageTooLarge as e:
+            # Исключение из кэша приходит до того, как ответ возвращен
+            self.log(f"Страница {url} пропущена: {e}")
+            return (response.status_code if response is not None else None), None
+        except UrlSkipped:
+            self.log(f"Загрузка страницы {url} прервана")
+            drain = False
+            return (response.status_code if response is not None else None), None
+        except requests.exceptions.RequestException as e:
+            self.log(f"Ошибка при скачивании {url}: {e}")
+            return None, None
+        finally:
+            if response is not None:
+                self.release(response, drain)
+
+    @staticmethod
+    def release(response, drain=True):
+        # Недочитанное короткое тело (ошибка, повтор) дочитывается, чтобы соединение
+        # вернулось в пул keep-alive, а не закрылось. Прерванное тело и тело из файла кэша не дочитываются
+        if drain and not isinstance(response, CachedResponse):
+            try:
+                for _ in iter_body(response, 256 * 1024):
+                    pass
+            except (PageTooLarge, requests.exceptions.RequestException):
+                pass
+        response.close()
+
+# Адаптивное ожидание готовности страницы вместо фиксированных пауз
+class PageReadiness:
+    # Скрипт ставит MutationObserver при первом вызове и возвращает состояние страницы
+    PROBE_SCRIPT = """
+        if (!window.__parserObserver) {
+            window.__parserLastMutation = performance.now();
+            window.__parserObserver = new MutationObserver(function () {
+                window.__parserLastMutation = performance.now();
+            });
+            window.__parserObserver.observe(document, {
+                subtree: true, childList: true, attributes: true, characterData: true
+            });
+        }
+        return {
+            ready: document.readyState,
+            quiet: (performance.now() - window.__parserLastMutation) / 1000,
+            resources: performance.getEntriesByType('resource').length,
+            selector: arguments[0] ? document.querySelector(arguments[0]) !== null : true
+        };
+    """
+
+    def __init__(self, timeout=15, settle_time=0.5, poll_interval=0.1, selector=None):
+        self.timeout = timeout
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.selector = selector or None
+
+    def wait(self, driver, timeout=None, stop=None):
+        # Ждет readyState == complete, появления селектора, затишья DOM и сети.
+        # Возвращает (затраченное время, True если страница готова, False при таймауте или stop())
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        resources = None
+        resources_changed = started
+        while True:
+            now = time.monotonic()
+            state = driver.execute_script(self.PROBE_SCRIPT, self.selector)
+            if state["resources"] != resources:
+                resources = state["resources"]
+                resources_changed = now
+            network_idle = now - resources_changed >= self.settle_time
+            if (state["ready"] == "complete" and state["selector"]
+                    and state["quiet"] >= self.settle_time and network_idle):
+                return now - started, True
+            if now - started >= timeout or (stop is not None and stop()):
+                return now - started, False
+            time.sleep(self.poll_interval)
+
+# Пул долгоживущих экземпляров Firefox, переиспользуемых для разных ссылок
+class WebDriverPool:
+    def __init__(self, geckodriver_path, browser_path, size=2, max_pages=50, log=None):
+        self.geckodriver_path = geckodriver_path
+        self.browser_path = browser_path
+        self.size = max(1, int(size))
+        self.max_pages = max(1, int(max_pages))
+        self.log = log or logger.info
+        self._idle = queue.Queue()
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def create_driver(self):
+        from selenium import webdriver
+        from selenium.webdriver.firefox.service import Service
+        from selenium.webdriver.firefox.options import Options
+
+        options = Options()
+        options.binary_location = self.browser_path
+        options.add_argument("-headless")
+        service = Service(executable_path=self.geckodriver_path)
+        return webdriver.Firefox(service=service, options=options)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if not can_create:
+            return self._idle.get()
+        try:
+            driver = self.create_driver()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        self._pages[id(driver)] = 0
+        return driver
+
+    def release(self, driver, broken=False):
+        pages = self._pages.get(id(driver), 0) + 1
+        self._pages[id(driver)] = pages
+        if broken or self._closed or pages >= self.max_pages:
+            # Браузер пересоздается после сбоя или заданного числа страниц
+            reason = "сбоя" if broken else f"{pages} страниц"
+            self.log(f"Перезапуск экземпляра браузера после {reason}")
+            self.discard(driver)
+        else:
+            self._idle.put(driver)
+
+    def discard(self, driver):
+        self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии браузера: {e}")
+        with self._lock:
+            self._created -= 1
+
+    @staticmethod
+    def is_alive(driver):
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(driver)
+
+# Обработка снимков отдельно от браузера: поток браузера передает PNG в пул и сразу берет
+# следующую ссылку, а пул перекодирует снимок (WebP/JPEG), обрезает или режет длинные
+# страницы на части и делает миниатюры. Без Pillow снимки сохраняются в PNG как есть
+class ScreenshotEncoder:
+    FORMATS = {"png": "PNG", "webp": "WEBP", "jpeg": "JPEG"}
+    EXTENSIONS = {"png": "png", "webp": "webp", "jpeg": "jpg"}
+    WEBP_MAX_SIDE = 16383  # WebP не поддерживает изображения больше этого размера
+
+    def __init__(self, image_format="png", quality=80, max_height=None, tile_height=None,
+                 thumbnail_width=None, workers=2, log=None):
+        self.log = log or logger.info
+        self.image_format = image_format if image_format in self.FORMATS else "png"
+        self.quality = quality
+        self.max_height = max_height or None
+        self.tile_height = tile_height or None
+        self.thumbnail_width = thumbnail_width or None
+        self.image = optional_module("PIL.Image")
+        if self.image is None and self.needs_pillow():
+            self.log("Pillow не установлен: скриншоты сохраняются в PNG без обработки")
+        elif self.image is not None:
+            # Снимки длинных страниц легко превышают защитный лимит Pillow на число пикселей
+            self.image.MAX_IMAGE_PIXELS = None
+        self.workers = max(1, int(workers))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        # Снимок может занимать десятки МБ, поэтому очередь на обработку ограничена
+        self._slots = threading.Semaphore(self.workers * 2)
+
+    def needs_pillow(self):
+        return self.image_format != "png" or bool(self.max_height or self.tile_height or self.thumbnail_width)
+
+    def submit(self, png, base_path):
+        # base_path - путь без расширения; результат future - список сохраненных файлов
+        self._slots.acquire()
+        try:
+            future = self.executor.submit(self.process, png, base_path)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def process(self, png, base_path):
+        if self.image is None or not self.needs_pillow():
+            path = f"{base_path}.png"
+            with open(path, "wb") as f:
+                f.write(png)
+            return [path]
+
+        image = self.image.open(io.BytesIO(png))
+        image.load()
+        if self.max_height and image.height > self.max_height:
+            image = image.crop((0, 0, image.width, self.max_height))
+
+        tile_height = self.tile_height
+        if self.image_format == "webp" and image.height > self.WEBP_MAX_SIDE:
+            tile_height = min(tile_height or self.WEBP_MAX_SIDE, self.WEBP_MAX_SIDE)
+        if tile_height and image.height > tile_height:
+            parts = [image.crop((0, top, image.width, min(image.height, top + tile_height)))
+                     for top in range(0, image.height, tile_height)]
+        else:
+            parts = [image]
+
+        extension = self.EXTENSIONS[self.image_format]
+        saved = []
+        for num, part in enumerate(parts, start=1):
+            path = f"{base_path}.{extension}" if num == 1 else f"{base_path}_part{num}.{extension}"
+            self.save(part, path, self.image_format)
+            saved.append(path)
+
+        if self.thumbnail_width:
+            # Миниатюра верхней части страницы с соотношением сторон 4:3
+            top = image.crop((0, 0, image.width, min(image.height, image.width * 3 // 4)))
+            top.thumbnail((self.thumbnail_width, self.thumbnail_width))
+            path = f"{base_path}_thumb.jpg"
+            self.save(top, path, "jpeg")
+            saved.append(path)
+        return saved
+
+    def save(self, image, path, image_format):
+        if image_format == "jpeg":
+            image = image.convert("RGB")
+            options = {"quality": self.quality, "optimize": True}
+        elif image_format == "webp":
+            options = {"quality": self.quality, "method": 4}
+        else:
+            options = {"optimize": True}
+        image.save(path, self.FORMATS[image_format], **options)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+# Создание скриншотов по файлу ссылок
+class ScreenshotTaker:
+    def __init__(self, file_with_links, base_url, filter_keyword=None, browsers=None, max_pages_per_browser=None,
+                 wait_selector=None, wait_timeout=None, journal=None, resume=True, log=None, progress=None,
+                 file_prefix="screenshot", report_skipped=True, image_format="png", quality=80,
+                 max_height=None, tile_height=None, thumbnail_width=None, encoders=None, metrics=None, control=None,
+                 on_result=None, link_status=None, archive=None):
+        self.log = log or logger.info
+        self.metrics = metrics
+        self.control = control
+        # Архив (PageArchive), из которого открываются страницы с планом {"archived": True}
+        self.archive = archive
+        # Результаты проверки ссылок (LinkStatusTable) для задания без FetchPipeline
+        self.link_status = link_status
+        # on_result(ссылка, список сохраненных файлов) после обработки снимка
+        self.on_result = on_result
+        self.encoder_options = dict(image_format=image_format, quality=quality, max_height=max_height,
+                                    tile_height=tile_height, thumbnail_width=thumbnail_width,
+                                    workers=ConfigManager.setting("encoders", encoders))
+        self.encoder = None
+        self.progress = progress or (lambda value: None)
+        self.file_prefix = file_prefix
+        self.report_skipped = report_skipped
+        self.skipped = []
+        self.journal = journal
+        self.resume = resume
+        self.file_with_links = file_with_links
+        self.base_url = base_url
+        self.filter_keyword = filter_keyword
+        self.readiness = PageReadiness(timeout=ConfigManager.setting("wait_timeout", wait_timeout),
+                                       selector=wait_selector)
+        self.browsers = max(1, int(ConfigManager.setting("browsers", browsers)))
+        self.max_pages_per_browser = max(1, int(ConfigManager.setting("browser_max_pages", max_pages_per_browser)))
+        self.driver_pool = None
+
+    def sanitize_filename(self, url):
+        return re.sub(r'[<>:"/\\|?*]', '_', url)
+
+    def run(self, tasks=None, reader=None):
+        # tasks - (номер строки, ссылка, план) от FetchPipeline вместо чтения файла ссылок;
+        # план - None (открыть ссылку), {"skip": причина}, {"html": скачанный файл}
+        # или {"archived": True} (страница скачана в архив self.archive)
+        if not os.path.exists(self.file_with_links):
+            self.log(f"Файл {self.file_with_links} не найден.")
+            return
+
+        screenshot_dir = 'screenshots'
+        if not os.path.exists(screenshot_dir):
+            os.makedirs(screenshot_dir)
+
+        try:
+            geckodriver_path = ConfigManager.get_geckodriver_path()
+            if not geckodriver_path or not os.path.exists(geckodriver_path):
+                self.log(f"Некорректный путь к geckodriver: {geckodriver_path}")
+                return
+
+            firefox_binary_path = ConfigManager.get_browser_path()
+            if not firefox_binary_path or not os.path.exists(firefox_binary_path):
+                self.log(f"Некорректный путь к браузеру: {firefox_binary_path}")
+                return
+
+            reader = reader or LinkReader(self.file_with_links, self.base_url, self.filter_keyword)
+            if tasks is None:
+                tasks = ((idx, full_url, self.checked_plan(full_url)) for idx, full_url in reader)
+
+            done = set()
+            if self.journal is not None:
+                job = CrawlJournal.job_id("screenshots", self.file_with_links, base_url=self.base_url,
+                                          filter_keyword=self.filter_keyword)
+                if self.resume:
+                    done = self.journal.completed(job)
+                else:
+                    self.journal.reset(job)
+
+            processed = 0
+            resumed = 0
+            # Ссылка считается обработанной, когда снимок сохранен пулом обработки
+            progress_lock = threading.Lock()
+
+            def pending_tasks():
+                nonlocal processed, resumed
+                for idx, full_url, plan in tasks:
+                    if full_url in done:
+                        with progress_lock:
+                            processed += 1
+                            resumed += 1
+                        continue
+                    if plan is not None and plan.get("skip"):
+                        self.log(f"Скриншот {full_url} не нужен: {plan['skip']}")
+                        if self.journal is not None:
+                            self.journal.mark(job, full_url, "skipped")
+                        with progress_lock:
+                            processed += 1
+                            value = reader.percent(processed)
+                        self.progress(value)
+                        continue
+                    yield full_url, os.path.join(screenshot_dir, f"{self.file_prefix}_{idx + 1}"), plan
+
+            def finish(url, future):
+                nonlocal processed
+                error = future.exception() if future is not None else None
+                files = future.result() if future is not None and error is None else []
+                if error:
+                    self.log(f"Ошибка при сохранении скриншота для {url}: {error}")
+                elif files:
+                    self.log(f"Скриншот сохранен как {', '.join(files)}")
+                # Неудачный снимок записан в метрики еще в screenshot()
+                if self.metrics is not None and future is not None:
+                    phases = future.phases
+                    phases["encode"] = time.perf_counter() - future.submitted
+                    size = sum(os.path.getsize(path) for path in files if os.path.exists(path))
+                    self.metrics.record("screenshot", url, ok=bool(files), total=sum(phases.values()),
+                                        phases=phases, size=size, error=error)
+                if self.journal is not None:
+                    self.journal.mark(job, url, "done" if files else "failed", output=files[0] if files else None)
+                if self.on_result is not None:
+                    self.on_result(url, files)
+                with progress_lock:
+                    processed += 1
+                    value = reader.percent(processed)
+                self.progress(value)
+
+            # Каждый экземпляр браузера обрабатывает по одной ссылке одновременно
+            self.driver_pool = WebDriverPool(geckodriver_path, firefox_binary_path, self.browsers,
+                                             self.max_pages_per_browser, log=self.log)
+            self.encoder = ScreenshotEncoder(log=self.log, **self.encoder_options)
+            pool = DownloadPool(self.browsers, self.browsers, self.browsers, control=self.control)
+            try:
+                for (url, _, _), future, error in pool.map(lambda task: self.screenshot(*task), pending_tasks(),
+                                                           url_of=lambda task: task[0]):
+                    if isinstance(error, UrlSkipped):
+                        self.log(f"Скриншот {url} пропущен")
+                    elif error:
+                        self.log(f"Ошибка при создании скриншота для {url}: {error}")
+                    if future is None:
+                        finish(url, None)
+                    else:
+                        future.add_done_callback(lambda done_future, url=url: finish(url, done_future))
+            finally:
+                self.driver_pool.close()
+                self.encoder.close()
+                if self.metrics is not None:
+                    self.metrics.flush()
+            if self.control is not None and self.control.cancelled.is_set():
+                self.log(f"Создание скриншотов остановлено: обработано {processed} ссылок. "
+                         f"Остальные будут сняты при продолжении задания")
+                return
+            self.progress(reader.percent(processed))
+            if self.journal is not None:
+                # Задание выполнено до конца: следующий запуск снимет все страницы заново
+                self.journal.reset(job)
+
+            if resumed:
+                self.log(f"Продолжение задания: пропущено {resumed} готовых скриншотов")
+            self.log(f"Обработка завершена. Скриншоты сохранены в {screenshot_dir}")
+
+            self.skipped = reader.skipped
+            if reader.skipped and self.report_skipped:
+                self.log("Пропущенные строки:")
+                for skipped in reader.skipped:
+                    self.log(skipped.strip())
+
+        except FileNotFoundError as e:
+            self.log(f"Файл не найден: {e}")
+        finally:
+            if self.journal is not None:
+                self.journal.close()
+            if self.link_status is not None:
+                self.link_status.close()
+
+    def checked_plan(self, url):
+        reason = self.link_status.reason(url) if self.link_status is not None else None
+        return {"skip": reason} if reason else None
+
+    @staticmethod
+    def render_copy(filepath, url, text=None):
+        # Копия скачанной страницы для открытия в браузере: расширение .html, чтобы файл
+        # не показывался как текст, кодировка UTF-8 (страница уже перекодирована при загрузке,
+        # а ее собственный <meta charset> мог остаться прежним) и <base>, чтобы относительные
+        # ссылки на стили и картинки вели на сайт. Первые <meta charset> и <base> имеют приоритет.
+        # text - страница из архива вместо файла
+        fd, path = tempfile.mkstemp(suffix=".html", prefix="render_")
+        with os.fdopen(fd, "wb") as dst:
+            dst.write(f'<meta charset="utf-8"><base href="{escape(url)}">'.encode("utf-8"))
+            if text is not None:
+                dst.write(text.encode("utf-8"))
+            else:
+                with open(filepath, "rb") as src:
+                    shutil.copyfileobj(src, dst)
+        return path
+
+    def screenshot(self, url, base_path, plan=None):
+        # Возвращает future сохранения снимка или None, если снять страницу не удалось
+        started = time.perf_counter()
+        driver = self.driver_pool.acquire()
+        phases = {"browser_wait": time.perf_counter() - started}
+        broken = False
+        png = None
+        stop = (lambda: self.control.is_skipped(url)) if self.control is not None else None
+        local_copy = None
+
+        try:
+            checkpoint = time.perf_counter()
+            html = plan.get("html") if plan is not None else None
+            text = self.archive.load_text(url) if plan is not None and plan.get("archived") else None
+            if html or text is not None:
+                # Страница уже скачана: браузер открывает ее с диска, загружая только ресурсы
+                local_copy = self.render_copy(html, url, text)
+                self.log(f"Открытие скачанной страницы {url} для создания скриншота.")
+                driver.get(pathlib.Path(local_copy).as_uri())
+            else:
+                self.log(f"Открытие страницы {url} для создания скриншота.")
+                driver.get(url)
+
+            # Дождаться полной загрузки страницы; пропущенную медленную страницу не ждать
+            load_wait, loaded = self.readiness.wait(driver, stop=stop)
+            phases["load"] = time.perf_counter() - checkpoint
+            if stop is not None and stop():
+                raise UrlSkipped(url)
+
+            # Получить размер страницы и дождаться перерисовки после изменения окна; если высота
+            # снимка ограничена, окно не растягивается больше нужного
+            total_height = driver.execute_script("return document.body.scrollHeight")
+            max_height = self.encoder_options["max_height"]
+            checkpoint = time.perf_counter()
+            driver.set_window_size(1920, min(total_height, max_height) if max_height else total_height)
+            resize_wait, _ = self.readiness.wait(driver, timeout=min(self.readiness.timeout, 5))
+            phases["resize"] = time.perf_counter() - checkpoint
+
+            status = "готова" if loaded else "таймаут ожидания"
+            self.log(f"Страница {url}: {status}, ожидание загрузки {load_wait:.2f} с, "
+                          f"после изменения размера {resize_wait:.2f} с")
+
+            checkpoint = time.perf_counter()
+            png = driver.get_screenshot_as_png()
+            phases["capture"] = time.perf_counter() - checkpoint
+        except UrlSkipped:
+            self.log(f"Создание скриншота {url} прервано")
+        except Exception as e:
+            self.log(f"Ошибка при создании скриншота для {url}: {e}")
+            broken = not WebDriverPool.is_alive(driver)
+        finally:
+            self.driver_pool.release(driver, broken)
+            if local_copy is not None:
+                os.remove(local_copy)
+        if not png:
+            if self.metrics is not None:
+                self.metrics.record("screenshot", url, ok=False, total=time.perf_counter() - started, phases=phases)
+            return None
+        submitted = time.perf_counter()
+        future = self.encoder.submit(png, base_path)
+        # Фазы браузера передаются обработчику завершения вместе с future
+        future.phases = phases
+        future.submitted = submitted
+        return future
+
+# Страницы и скриншоты за один проход по файлу ссылок: каждая ссылка скачивается один раз,
+# а результат загрузки решает, нужен ли скриншот. Не снимаются страницы с ошибкой загрузки
+# или статусом 4xx/5xx, не-HTML и страницы, не изменившиеся с прошлого запуска, если их
+# скриншот уже есть. С render_saved браузер открывает скачанный HTML с диска вместо
+# повторной загрузки страницы (скрипты, зависящие от адреса страницы, могут работать иначе);
+# страницы, сохраненные в архив, для этого читаются из него
+class FetchPipeline:
+    def __init__(self, file_with_links, base_url, extension, filter_keyword=None, render_saved=False,
+                 state_journal=None, page_options=None, screenshot_options=None, log=None, progress=None,
+                 control=None):
+        self.log = log or logger.info
+        self.progress = progress or (lambda value: None)
+        self.file_with_links = file_with_links
+        self.base_url = base_url
+        self.filter_keyword = filter_keyword
+        self.render_saved = render_saved
+        self.state_journal = state_journal
+        self.skipped = []
+        self.values = {"pages": 0, "screenshots": 0}
+        self._progress_lock = threading.Lock()
+        self.tasks = queue.Queue()
+        self.digests = {}
+        archive = (page_options or {}).get("archive")
+        # Загрузка закрывает свой архив, когда скачает все ссылки, а скриншоты еще снимаются,
+        # поэтому страницы для браузера читаются через отдельное подключение к тому же архиву
+        self.archive = PageArchive(archive.archive_dir) if render_saved and archive is not None else None
+        self.downloader = PageDownloader(file_with_links, base_url, extension, filter_keyword, log=self.log,
+                                         progress=self.part("pages"), control=control, on_result=self.page_done,
+                                         **(page_options or {}))
+        self.screenshots = ScreenshotTaker(file_with_links, base_url, filter_keyword, log=self.log,
+                                           progress=self.part("screenshots"), control=control,
+                                           report_skipped=False, on_result=self.screenshot_done,
+                                           archive=self.archive, **(screenshot_options or {}))
+
+    def part(self, name):
+        # Общий прогресс - среднее двух этапов
+        def update(value):
+            with self._progress_lock:
+                self.values[name] = value
+                total = sum(self.values.values()) // len(self.values)
+            self.progress(total)
+        return update
+
+    def plan(self, url, info):
+        if info is None:
+            # Страница скачана при прошлом запуске задания: снимок по ссылке
+            return None
+        if info.get("skip"):
+            # Ссылка отсеяна проверкой (LinkChecker) и не скачивалась
+            return {"skip": info["skip"]}
+        status = info["status"]
+        if status is None:
+            return {"skip": "страница не загрузилась"}
+        if status >= 400:
+            return {"skip": f"статус {status}"}
+        content_type = (info["content_type"] or "").split(";")[0].strip().lower()
+        if content_type and "html" not in content_type:
+            return {"skip": f"тип содержимого {content_type}"}
+        if self.state_journal is not None:
+            digest, screenshot = self.state_journal.page_state(url)
+            unchanged = info["unchanged"] or (info["digest"] is not None and info["digest"] == digest)
+            if unchanged and screenshot and os.path.exists(screenshot):
+                return {"skip": f"страница не изменилась, скриншот {screenshot} актуален"}
+        output = info["output"]
+        if self.render_saved and output and self.archive is not None:
+            # output - место в архиве (сегмент@смещение), а не файл
+            return {"archived": True}
+        if self.render_saved and output and os.path.isfile(output):
+            return {"html": output}
+        return None
+
+    def page_done(self, idx, url, info):
+        plan = self.plan(url, info)
+        # Хеш есть только у прочитанного тела; для неизмененной страницы в журнале остается прежний
+        if info is not None and info["digest"] and (plan is None or "skip" not in plan):
+            self.digests[url] = info["digest"]
+        self.tasks.put((idx, url, plan))
+
+    def screenshot_done(self, url, files):
+        digest = self.digests.pop(url, None)
+        if self.state_journal is None or not files:
+            return
+        # Хеш сохраняется вместе со скриншотом: неудачный снимок не считается актуальным
+        self.state_journal.save_page_state(url, digest or self.state_journal.page_state(url)[0], files[0])
+
+    def pending_tasks(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            yield task
+
+    def run(self):
+        if not os.path.exists(self.file_with_links):
+            self.log(f"Файл {self.file_with_links} не найден.")
+            return
+        reader = LinkReader(self.file_with_links, self.base_url, self.filter_keyword)
+        # Скриншоты идут параллельно загрузке: ссылка попадает к браузеру сразу после скачивания
+        screenshots = threading.Thread(target=self.screenshots.run, args=(self.pending_tasks(), reader))
+        screenshots.start()
+        try:
+            self.downloader.run(reader)
+        finally:
+            self.tasks.put(None)
+            screenshots.join()
+            if self.state_journal is not None:
+                self.state_journal.close()
+            if self.archive is not None:
+                self.archive.close()
+        self.skipped = self.downloader.skipped
+
+# Асинхронный движок: извлечение ссылок, обход сайта и загрузка страниц корутинами в одном
+# цикле событий. concurrency - число одновременных запросов (соединений и задач загрузки),
+# отдельное от числа потоков workers: поток на запрос не нужен, и в полете могут быть тысячи
+# запросов; max_per_host - соединений к одному хосту. Тело страницы читается частями с лимитом
+# размера max_page_size; загруженная страница сразу пишется на диск, а HTML для извлечения
+# ссылок декодируется и разбирается в потоке, чтобы не останавливать цикл событий
+class AsyncCrawler:
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, base_url, extension, output_dir="downloaded_pages", concurrency=None,
+                 max_per_host=None, timeout=None, max_page_size=None, log=None, progress=None):
+        self.base_url = base_url
+        self.extension = extension
+        self.output_dir = output_dir
+        self.concurrency = max(1, int(ConfigManager.setting("async_concurrency", concurrency)))
+        self.max_per_host = max(1, int(ConfigManager.setting("max_per_host", max_per_host) or self.concurrency))
+        self.timeout = ConfigManager.setting("request_timeout", timeout)
+        self.max_page_size = max_page_size or ConfigManager.get("max_page_mb") * 1024 * 1024
+        self.log = log or logger.info
+        self.progress = progress or (lambda value: None)
+        self.aiohttp = optional_module("aiohttp")
+
+    def make_session(self):
+        connector = self.aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.max_per_host)
+        # Таймаут - на соединение и на чтение, как у requests: общий таймаут aiohttp включает
+        # ожидание свободного соединения, и запросы в очереди к хосту истекали бы, не начавшись
+        timeout = self.aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+        return self.aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HttpClient.headers)
+
+    async def iter_body(self, response):
+        # Части тела с проверкой лимита размера, как iter_body для ответа requests
+        check_declared_size(response.headers, self.max_page_size)
+        received = 0
+        async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+            received += len(chunk)
+            check_received_size(received, self.max_page_size)
+            yield chunk
+
+    async def stream_to_file(self, response, filepath):
+        # В памяти задачи не больше одной части страницы. Запись части в файл - быстрая запись
+        # в кэш ОС, она идет в цикле событий; перекодирование готового файла (если страница
+        # без кодировки оказалась не в UTF-8) перечитывает его целиком и выполняется в потоке
+        writer = PageFileWriter(filepath, response.headers.get("Content-Type"))
+        try:
+            async for chunk in self.iter_body(response):
+                writer.write(chunk)
+            return await asyncio.to_thread(writer.finish, self.CHUNK_SIZE)
+        except BaseException:
+            writer.abort()
+            raise
+
+    async def feed_links(self, urls, queue, control=None):
+        for url in urls:
+            if control is not None:
+                # Пауза задерживает выдачу новых ссылок; после отмены файл дальше не читается
+                while control.paused:
+                    await asyncio.sleep(0.2)
+                if control.cancelled.is_set():
+                    return
+                if control.is_skipped(url):
+                    self.log(f"Страница {url} пропущена")
+                    continue
+            await queue.put(url)
+
+    async def download(self, session, url):
+        filepath = page_file_path(self.output_dir, url, self.extension)
+        try:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    self.log(f"Не удалось скачать страницу {url}. Статус: {response.status}")
+                    return False
+                await self.stream_to_file(response, filepath)
+        except PageTooLarge as e:
+            self.log(f"Страница {url} пропущена: {e}")
+            return False
+        except (self.aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log(f"Ошибка при скачивании {url}: {e}")
+            return False
+        self.log(f"Страница {url} успешно сохранена в файл {filepath}")
+        return True
+
+    async def fetch_page(self, session, url):
+        # (тело, Content-Type) HTML-страницы или None; ответы не в HTML не читаются
+        try:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    self.log(f"Не удалось получить страницу {url}. Статус: {response.status}")
+                    return None
+                content_type = response.headers.get("Content-Type")
+                media_type = (content_type or "").split(";")[0].strip().lower()
+                if media_type and "html" not in media_type:
+                    self.log(f"Страница {url} пропущена: тип содержимого {media_type}")
+                    return None
+                return b"".join([chunk async for chunk in self.iter_body(response)]), content_type
+        except PageTooLarge as e:
+            self.log(f"Страница {url} пропущена: {e}")
+        except (self.aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log(f"Ошибка при выполнении запроса к {url}: {e}")
+        return None
+
+    @staticmethod
+    def parse_links(content, content_type, extractor, filter_keyword=None):
+        # Кодировка - как в Info.status_site: из заголовка или <meta charset>, иначе по содержимому
+        encoding = declared_encoding(content_type, content[:4096]) or guess_encoding(content[:64 * 1024])
+        return extractor.extract(content.decode(encoding, errors="replace"), filter_keyword)
+
+    async def page_links(self, session, url, extractor, filter_keyword=None):
+        # Атрибуты тегов <a> страницы (как Info.get_info) или пустой список
+        page = await self.fetch_page(session, url)
+        if page is None:
+            return []
+        try:
+            return await asyncio.to_thread(self.parse_links, *page, extractor, filter_keyword)
+        except Exception as e:
+            self.log(f"Ошибка при обработке контента {url}: {e}")
+            return []
+
+    async def crawl(self, session, site):
+        # Обход сайта по правилам SiteCrawler site (глубина, область, дедупликация, предел страниц):
+        # страницы уровня загружаются одновременно, ссылки выдаются в порядке завершения загрузки
+        extractor = LinkExtractor(site.parser_backend)
+        level = [site.start_url]
+        site.seen.add(site.start_url)
+        depth = 0
+
+        async def fetch(page_url):
+            return page_url, await self.page_links(session, page_url, extractor)
+
+        while level and not site.should_stop():
+            next_level = []
+            tasks = [asyncio.create_task(fetch(page_url)) for page_url in site.level_pages(level, depth)]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    page_url, links = await next_done
+                    for found in site.page_links(page_url, links, depth, next_level):
+                        yield found
+            finally:
+                for task in tasks:
+                    task.cancel()
+            level = site.next_level(next_level, depth)
+            depth += 1
+
+    async def download_all(self, urls, percent=None, control=None):
+        # urls - итератор полных ссылок (например, LinkReader); percent переводит число
+        # обработанных ссылок в процент выполнения; control - отмена, пауза и пропуск ссылок
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        processed = 0
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async with self.make_session() as session:
+            async def worker():
+                nonlocal processed
+                while True:
+                    url = await queue.get()
+                    try:
+                        # Ссылки, уже стоящие в очереди, после отмены не загружаются
+                        if control is None or not control.cancelled.is_set():
+                            await self.download(session, url)
+                    finally:
+                        processed += 1
+                        if percent is not None:
+                            self.progress(percent(processed))
+                        queue.task_done()
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            try:
+                await self.feed_links(urls, queue, control)
+                await queue.join()
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        return processed
+
+# Загрузка страниц из файла ссылок асинхронным движком
+class AsyncPageDownloader:
+    def __init__(self, file_with_links, base_url, extension, filter_keyword=None,
+                 concurrency=None, max_per_host=None, max_page_size=None, log=None, progress=None, control=None):
+        self.log = log or logger.info
+        self.progress = progress or (lambda value: None)
+        self.control = control
+        self.file_with_links = file_with_links
+        self.output_file = f"full_links.{extension}"
+        self.filter_keyword = filter_keyword
+        self.crawler = AsyncCrawler(base_url, extension, concurrency=concurrency, max_per_host=max_per_host,
+                                    max_page_size=max_page_size, log=self.log, progress=self.progress)
+
+    def run(self):
+        if self.crawler.aiohttp is None:
+            self.log("Асинхронный режим недоступен: библиотека aiohttp не установлена.")
+            return
+        if not os.path.exists(self.file_with_links):
+            self.log(f"Файл {self.file_with_links} не найден.")
+            return
+
+        reader = LinkReader(self.file_with_links, self.crawler.base_url, self.filter_keyword)
+        self.log(f"Асинхронная загрузка страниц: {self.crawler.concurrency} одновременно, "
+                 f"до {self.crawler.max_per_host} к одному хосту")
+        with open(self.output_file, "w", encoding="utf-8") as outfile:
+            def urls():
+                for _, full_url in reader:
+                    outfile.write(f"Полный URL: {full_url}\n")
+                    yield full_url
+
+            processed = asyncio.run(self.crawler.download_all(urls(), reader.percent, self.control))
+        if self.control is not None and self.control.cancelled.is_set():
+            self.log("Загрузка страниц остановлена")
+            return
+        self.progress(reader.percent(processed))
+        self.log(f"Обработка завершена, результаты сохранены в {self.output_file}")
+
+        if reader.skipped:
+            self.log("Пропущенные строки:")
+            for skipped in reader.skipped:
+                self.log(skipped.strip())
+
+# Обработка одного шарда в отдельном процессе; события лога и прогресса уходят в очередь,
+# команды пользователя (JobControl.snapshot) приходят через общий словарь commands.
+# Возвращает None, если шард не обработан до конца из-за отмены
+def run_shard(shard, settings, events, commands=None):
+    index = shard["index"]
+    base = shard["path"]
+
+    def log(message):
+        events.put(("log", index, message))
+
+    def make_progress(kind):
+        def progress(value):
+            events.put(("progress", index, kind, value))
+        return progress
+
+    mode = settings["mode"]
+    metrics = RequestMetrics(f"{base}.metrics.jsonl") if settings.get("metrics") else None
+    control = JobControl()
+
+    def status_table():
+        return (LinkStatusTable(settings["link_status"], settings.get("check_ttl"))
+                if settings.get("link_status") else None)
+
+    def page_options():
+        scheduler = PolitenessScheduler(min_delay=settings["delay"]) if settings.get("polite") else None
+        return dict(
+            workers=settings.get("workers"), max_per_host=settings.get("max_per_host"),
+            journal=CrawlJournal(f"{base}.journal.sqlite"),
+            resume=settings.get("resume", True), scheduler=scheduler,
+            output_file=f"{base}.full_links.{settings['extension']}", report_skipped=False,
+            archive=PageArchive(f"{base}.archive") if settings.get("archive") else None,
+            cache=(HttpCache(os.path.join(settings["cache_dir"], f"{index:04d}"), ttl=settings.get("cache_ttl"),
+                             max_size=settings["cache_size"], offline=settings.get("offline"))
+                   if settings.get("cache_dir") else None),
+            max_page_size=settings.get("max_page_size"), metrics=metrics,
+            link_status=status_table()
+        )
+
+    def screenshot_options():
+        return dict(
+            browsers=settings.get("browsers"), max_pages_per_browser=settings.get("browser_max_pages"),
+            wait_selector=settings.get("wait_selector"),
+            wait_timeout=settings.get("wait_timeout"), journal=CrawlJournal(f"{base}.journal.sqlite"),
+            resume=settings.get("resume", True), file_prefix=f"screenshot_s{index:04d}", metrics=metrics,
+            # В режиме both ссылки отсеивает загрузка страниц
+            link_status=status_table() if mode == "screenshots" else None,
+            **settings.get("screenshot_options", {})
+        )
+
+    if mode == "both":
+        # Как и в обычном режиме, каждая ссылка шарда скачивается один раз
+        worker = FetchPipeline(
+            base, settings["base_url"], settings["extension"], render_saved=settings.get("render_saved", False),
+            state_journal=CrawlJournal(f"{base}.journal.sqlite"), page_options=page_options(),
+            screenshot_options=screenshot_options(), log=log, progress=make_progress(mode), control=control
+        )
+    elif mode == "pages":
+        worker = PageDownloader(base, settings["base_url"], settings["extension"], log=log,
+                                progress=make_progress(mode), control=control, **page_options())
+    else:
+        worker = ScreenshotTaker(base, settings["base_url"], log=log, progress=make_progress(mode),
+                                 report_skipped=False, control=control, **screenshot_options())
+
+    synced = threading.Event()
+
+    def sync_commands():
+        while not synced.wait(0.5):
+            control.apply(commands.copy())
+
+    if commands is not None:
+        control.apply(commands.copy())
+        threading.Thread(target=sync_commands, daemon=True).start()
+
+    worker.run()
+    synced.set()
+    if metrics is not None:
+        log(f"Метрики: {metrics.summary_message()}")
+        metrics.close()
+
+    with open(f"{base}.skipped", "w", encoding="utf-8") as f:
+        f.writelines(line if line.endswith("\n") else line + "\n" for line in worker.skipped)
+    if control.cancelled.is_set():
+        return None
+    ShardedJob.mark_done(base, mode)
+    return index
+
+# Разбиение файла ссылок на шарды и их обработка пулом процессов. Шарды лежат в общей
+# папке, поэтому к заданию можно подключить несколько машин с общей файловой системой
+class ShardedJob:
+    def __init__(self, file_with_links, base_url, extension, filter_keyword=None, mode="pages", processes=None,
+                 shards=None, shard_root="shards", stale_after=6 * 3600, log=None, progress=None, control=None,
+                 **settings):
+        self.log = log or logger.info
+        self.progress = progress or (lambda value: None)
+        self.control = control or JobControl()
+        self.file_with_links = file_with_links
+        self.base_url = base_url
+        self.extension = extension
+        self.filter_keyword = filter_keyword
+        self.mode = mode
+        self.processes = max(1, int(processes or os.cpu_count() or 1))
+        self.shards = max(1, int(shards or self.processes * 4))
+        self.stale_after = stale_after  # через сколько секунд блокировка упавшего процесса снимается
+        # В вежливом режиме паузы между запросами к хосту соблюдаются внутри процесса, поэтому
+        # ссылки одного хоста должны попасть в один шард; иначе ссылки распределяются по хешу URL,
+        # и файл ссылок одного сайта тоже обрабатывается параллельно
+        self.by_host = bool(settings.get("polite"))
+        job = CrawlJournal.job_id("shards", file_with_links, base_url=base_url,
+                                  filter_keyword=filter_keyword, shards=self.shards, by_host=self.by_host)
+        self.shard_dir = os.path.join(shard_root, job[:16])
+        self.output_file = f"full_links.{extension}"
+        self.settings = dict(settings, base_url=base_url, extension=extension, mode=mode)
+        if settings.get("cache") or settings.get("offline"):
+            # У каждого шарда свой HTTP-кэш: индекс кэша не рассчитан на запись из нескольких процессов.
+            # Ссылка попадает в шард с тем же номером, пока не меняется число шардов, поэтому кэш
+            # лежит вне папки задания и используется и для измененного файла ссылок
+            layout = f"{self.shards}-hosts" if self.by_host else str(self.shards)
+            self.settings["cache_dir"] = os.path.join("http_cache", "shards", layout)
+            self.settings["cache_size"] = ConfigManager.get("http_cache_mb") * 1024 * 1024 // self.shards
+
+    @staticmethod
+    def marker(base, mode, kind):
+        return f"{base}.{mode}.{kind}"
+
+    @staticmethod
+    def mark_done(base, mode):
+        with open(ShardedJob.marker(base, mode, "done"), "w", encoding="utf-8") as f:
+            f.write(f"{socket.gethostname()} {os.getpid()} {time.time()}\n")
+
+    def manifest_path(self):
+        return os.path.join(self.shard_dir, "manifest.json")
+
+    def merged_path(self):
+        # Отметка задания: все шарды обработаны и результаты объединены
+        return os.path.join(self.shard_dir, f"{self.mode}.merged")
+
+    @staticmethod
+    def archive_dirs(shard_root="shards"):
+        # Архивы шардов, еще не перенесенные в общий архив
+        return sorted(glob.glob(os.path.join(shard_root, "*", "shard_*.archive")))
+
+    def merge_archives(self, shards):
+        # Архивы шардов переносятся в общий архив pages_archive: одинаковые страницы разных шардов
+        # хранятся один раз, а --archive-get находит любую страницу задания. Перенесенный архив шарда удаляется
+        archive = PageArchive()
+        try:
+            for shard in shards:
+                path = f"{shard['path']}.archive"
+                if not os.path.isdir(path):
+                    continue
+                part = PageArchive(path)
+                try:
+                    archive.merge(part)
+                finally:
+                    part.close()
+                shutil.rmtree(path)
+            self.log(archive.stats_message())
+        finally:
+            archive.close()
+
+    def prepare(self):
+        # Разбиение выполняется один раз; остальные машины используют готовый манифест
+        manifest_path = self.manifest_path()
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        os.makedirs(self.shard_dir, exist_ok=True)
+        paths = [os.path.join(self.shard_dir, f"shard_{index:04d}.txt") for index in range(self.shards)]
+        counts = [0] * self.shards
+        pattern = re.compile(self.filter_keyword, re.I) if self.filter_keyword else None
+        files = [open(f"{path}.tmp", "w", encoding="utf-8") for path in paths]
+        try:
+            with open(self.file_with_links, "rb") as infile:
+                for raw in infile:
+                    line = raw.decode("utf-8", errors="replace")
+                    if pattern and not pattern.search(line):
+                        continue
+                    full_url = resolve_link(line, self.base_url) or ""
+                    key = urlparse(full_url).netloc.lower() if self.by_host else full_url
+                    index = zlib.crc32(key.encode("utf-8")) % self.shards
+                    files[index].write(line if line.endswith("\n") else line + "\n")
+                    counts[index] += 1
+        finally:
+            for f in files:
+                f.close()
+        for path in paths:
+            os.replace(f"{path}.tmp", path)
+
+        manifest = {
+            "source": os.path.abspath(self.file_with_links),
+            "shards": [{"index": index, "path": path, "lines": counts[index]}
+                       for index, path in enumerate(paths) if counts[index]],
+        }
+        tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, manifest_path)
+        self.log(f"Файл ссылок разбит на {len(manifest['shards'])} шардов в {self.shard_dir}")
+        return manifest
+
+    def claim(self, shard):
+        # Атомарное создание файла блокировки: шард обрабатывает только одна машина/процесс
+        if os.path.exists(self.marker(shard["path"], self.mode, "done")) and self.settings.get("resume", True):
+            return False
+        lock_path = self.marker(shard["path"], self.mode, "lock")
+        try:
+            if time.time() - os.path.getmtime(lock_path) > self.stale_after:
+                self.log(f"Снята устаревшая блокировка шарда {shard['index']}")
+                os.remove(lock_path)
+        except OSError:
+            pass
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(f"{socket.gethostname()} {os.getpid()} {time.time()}\n")
+        return True
+
+    def release(self, shard):
+        try:
+            os.remove(self.marker(shard["path"], self.mode, "lock"))
+        except OSError:
+            pass
+
+    def run(self):
+        if not os.path.exists(self.file_with_links) and not os.path.exists(self.manifest_path()):
+            self.log(f"Файл {self.file_with_links} не найден.")
+            return
+
+        if os.path.exists(self.merged_path()):
+            if self.settings.get("resume", True):
+                # Машина, подключившаяся к завершенному заданию, не обрабатывает шарды повторно
+                self.log("Задание уже выполнено и объединено. Чтобы обработать ссылки заново, "
+                         "запустите его без продолжения")
+                self.progress(100)
+                return
+            os.remove(self.merged_path())
+
+        manifest = self.prepare()
+        shards = manifest["shards"]
+        claimed = [shard for shard in shards if self.claim(shard)]
+        if claimed:
+            self.process(claimed, shards)
+        if self.control.cancelled.is_set():
+            self.log("Обработка шардов остановлена. Незавершенные шарды будут обработаны при продолжении задания")
+            return
+        self.merge(shards)
+
+    def process(self, claimed, shards):
+        total_lines = sum(shard["lines"] for shard in shards) or 1
+        kinds = [self.mode]
+        done_lines = sum(shard["lines"] for shard in shards
+                         if shard not in claimed and os.path.exists(self.marker(shard["path"], self.mode, "done")))
+        percents = {}
+        by_index = {shard["index"]: shard for shard in claimed}
+
+        def overall():
+            # Прогресс шарда взвешивается числом его строк
+            value = done_lines
+            for index, kind_values in percents.items():
+                share = sum(kind_values.get(kind, 0) for kind in kinds) / (100 * len(kinds))
+                value += by_index[index]["lines"] * share
+            return min(100, int(value / total_lines * 100))
+
+        def drain(events):
+            while True:
+                try:
+                    event = events.get_nowait()
+                except queue.Empty:
+                    return
+                if event[0] == "log":
+                    self.log(f"[шард {event[1]}] {event[2]}")
+                else:
+                    _, index, kind, value = event
+                    percents.setdefault(index, {})[kind] = value
+                    self.progress(overall())
+
+        self.log(f"Обработка {len(claimed)} шардов в {self.processes} процессах")
+        with multiprocessing.Manager() as manager:
+            events = manager.Queue()
+            commands = manager.dict(self.control.snapshot())
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                futures = {executor.submit(run_shard, shard, self.settings, events, commands): shard
+                           for shard in claimed}
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                    drain(events)
+                    # Команды передаются процессам шардов; еще не начатые шарды после отмены не запускаются
+                    commands.update(self.control.snapshot())
+                    if self.control.cancelled.is_set():
+                        for future in pending:
+                            future.cancel()
+                    for future in done:
+                        shard = futures[future]
+                        if future.cancelled():
+                            self.release(shard)
+                            continue
+                        error = future.exception()
+                        if error:
+                            self.log(f"Ошибка при обработке шарда {shard['index']}: {error}")
+                        elif future.result() is not None:
+                            percents[shard["index"]] = {kind: 100 for kind in kinds}
+                        self.release(shard)
+                        self.progress(overall())
+            drain(events)
+
+    def merge(self, shards):
+        # Объединение результатов выполняет тот, кто увидел все шарды завершенными
+        remaining = [shard for shard in shards if not os.path.exists(self.marker(shard["path"], self.mode, "done"))]
+        if remaining:
+            self.log(f"Ожидают обработки на других машинах: {len(remaining)} шардов")
+            return
+
+        if self.mode in ("pages", "both"):
+            tmp_path = f"{self.output_file}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as outfile:
+                for shard in shards:
+                    part = f"{shard['path']}.full_links.{self.extension}"
+                    if os.path.exists(part):
+                        with open(part, "r", encoding="utf-8") as infile:
+                            for line in infile:
+                                outfile.write(line)
+            os.replace(tmp_path, self.output_file)
+            if self.settings.get("archive"):
+                self.merge_archives(shards)
+            self.log(f"Обработка завершена, результаты сохранены в {self.output_file}")
+        else:
+            self.log("Обработка завершена. Скриншоты сохранены в screenshots")
+
+        skipped = []
+        for shard in shards:
+            path = f"{shard['path']}.skipped"
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    skipped.extend(line.strip() for line in f if line.strip())
+        if skipped:
+            self.log("Пропущенные строки:")
+            for line in skipped:
+                self.log(line)
+        with open(self.merged_path(), "w", encoding="utf-8") as f:
+            f.write(f"{socket.gethostname()} {os.getpid()} {time.time()}\n")
+        self.progress(100)
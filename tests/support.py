@@ -0,0 +1,167 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser_engine import ConfigManager
+
+LAST_MODIFIED = "Mon, 05 Oct 2026 10:00:00 GMT"
+BIG_SIZE = 2 * 1024 * 1024
+CAP = 1024 * 1024
+
+# Тестовый сайт. Страницы из server.pages (путь -> статус, заголовки, тело) задает сам тест;
+# кроме них: /page/N - страница с Last-Modified и ответом 304 на If-Modified-Since,
+# /slow/N - страница с задержкой, /big - большое тело частями без Content-Length,
+# /big-length - большое тело с Content-Length
+class SiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.handle_request(self.respond)
+
+    def do_HEAD(self):
+        self.handle_request(self.respond_head)
+
+    def handle_request(self, respond):
+        server = self.server
+        host = self.headers.get("Host")
+        with server.lock:
+            server.requests.append((self.path, self.headers.get("If-Modified-Since")))
+            server.active[host] = server.active.get(host, 0) + 1
+            server.peak[host] = max(server.peak.get(host, 0), server.active[host])
+        try:
+            respond()
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент прервал чтение большого тела
+            pass
+        finally:
+            with server.lock:
+                server.active[host] -= 1
+
+    def respond(self):
+        if self.path in self.server.pages:
+            status, headers, body = self.server.pages[self.path]
+            self.send_body(body, headers, status)
+        elif self.path.startswith("/slow/"):
+            time.sleep(0.2)
+            self.send_body(b"<html><body>slow</body></html>")
+        elif self.path.startswith("/page/"):
+            if self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_body(f"<html><body><p>{self.path}</p></body></html>".encode("utf-8"),
+                           {"Last-Modified": LAST_MODIFIED})
+        elif self.path == "/big":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            chunk = b"x" * (64 * 1024)
+            for _ in range(BIG_SIZE // len(chunk)):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        elif self.path == "/big-length":
+            self.send_body(b"x" * BIG_SIZE)
+        else:
+            self.send_body(b"", status=404)
+
+    def respond_head(self):
+        # Ответ на HEAD можно задать отдельно: server.pages[("HEAD", путь)]
+        page = self.server.pages.get(("HEAD", self.path)) or self.server.pages.get(self.path)
+        if page is not None:
+            status, headers, body = page
+        elif self.path.startswith("/page/"):
+            status, headers, body = 200, {}, b""
+        else:
+            status, headers, body = 404, {}, b""
+        headers = dict(headers or {})
+        self.send_response(status)
+        self.send_header("Content-Type", headers.pop("Content-Type", "text/html; charset=utf-8"))
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def send_body(self, body, headers=None, status=200):
+        headers = dict(headers or {})
+        self.send_response(status)
+        self.send_header("Content-Type", headers.pop("Content-Type", "text/html; charset=utf-8"))
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Сервер не печатает ошибки соединений, которые клиент закрыл, не дочитав ответ
+class SiteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+def write_links(path, urls):
+    with open(path, "w", encoding="utf-8") as f:
+        for num, url in enumerate(urls, start=1):
+            f.write(f"№{num}, {url} - ссылка {num}\n")
+    return path
+
+def html_page(*hrefs):
+    links = "".join(f'<a href="{href}" title="{href}">{href}</a>' for href in hrefs)
+    return 200, {}, f"<html><body>{links}</body></html>".encode("utf-8")
+
+# Каждый тест работает в своей временной папке со своим config.json
+class TempDirTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp(prefix="parser_test_")
+        os.chdir(self.tmp)
+        self.config_file = ConfigManager.CONFIG_FILE
+        ConfigManager.CONFIG_FILE = os.path.join(self.tmp, "config.json")
+
+    def tearDown(self):
+        ConfigManager.CONFIG_FILE = self.config_file
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    @staticmethod
+    def quiet(message):
+        pass
+
+# Тест с локальным HTTP-сервером
+class ServerTestCase(TempDirTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = SiteServer(("127.0.0.1", 0), SiteHandler)
+        cls.server.lock = threading.Lock()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        port = cls.server.server_address[1]
+        cls.base = f"http://127.0.0.1:{port}"
+        # Тот же сервер под другим именем хоста
+        cls.alias = f"http://localhost:{port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        super().setUp()
+        self.server.requests = []
+        self.server.active = {}
+        self.server.peak = {}
+        self.server.pages = {}
+
+    def requested(self, prefix):
+        return [path for path, _ in self.server.requests if path.startswith(prefix)]
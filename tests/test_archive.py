@@ -0,0 +1,67 @@
+import contextlib
+import io
+import os
+import unittest
+
+from support import ServerTestCase, write_links
+from parser_engine import PageArchive, ShardedJob
+import parser_cli
+
+# Архив страниц: хранение одинакового содержимого один раз и объединение архивов шардов
+class ArchiveTest(ServerTestCase):
+    def test_store_and_load_deduplicates_content(self):
+        archive = PageArchive("archive")
+        try:
+            first = archive.store("http://example.com/a", "<p>Привет</p>".encode("cp1251"), encoding="cp1251")
+            second = archive.store("http://example.com/b", "<p>Привет</p>".encode("cp1251"), encoding="cp1251")
+            archive.store("http://example.com/c", b"<p>other</p>")
+            self.assertEqual(first, second)
+            self.assertEqual(archive.load_text("http://example.com/b"), "<p>Привет</p>")
+            self.assertEqual(archive.location("http://example.com/a"), first)
+            self.assertIsNone(archive.load("http://example.com/missing"))
+            self.assertEqual((archive.stats()["pages"], archive.stats()["unique"]), (3, 2))
+        finally:
+            archive.close()
+
+    def test_merge_copies_pages_once(self):
+        target = PageArchive()
+        part = PageArchive("part")
+        try:
+            target.store("http://example.com/a", b"same")
+            part.store("http://example.com/b", b"same", encoding="utf-8")
+            part.store("http://example.com/c", b"new")
+            self.assertEqual(target.merge(part), 2)
+            self.assertEqual(target.load("http://example.com/b"), b"same")
+            self.assertEqual(target.load("http://example.com/c"), b"new")
+            self.assertEqual(target.stats()["unique"], 2)
+        finally:
+            part.close()
+            target.close()
+
+    def archive_get(self, url):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            code = parser_cli.main(["--archive-get", url])
+        return code, output.getvalue()
+
+    def test_sharded_job_merges_shard_archives(self):
+        urls = [f"{self.base}/page/{i}" for i in range(8)]
+        links = write_links("links.txt", urls)
+        ShardedJob(links, "", "txt", shards=3, processes=1, archive=True, log=self.quiet).run()
+        self.assertEqual(ShardedJob.archive_dirs(), [])
+        archive = PageArchive()
+        try:
+            self.assertEqual(archive.stats()["pages"], 8)
+        finally:
+            archive.close()
+        self.assertEqual(self.archive_get(urls[5]), (0, "<html><body><p>/page/5</p></body></html>"))
+
+    def test_archive_get_finds_page_in_shard_archive(self):
+        part = PageArchive(os.path.join("shards", "job", "shard_0001.txt.archive"))
+        part.store("http://example.com/a", b"<p>a</p>")
+        part.close()
+        self.assertEqual(self.archive_get("http://example.com/a"), (0, "<p>a</p>"))
+        self.assertEqual(self.archive_get("http://example.com/b")[0], 1)
+
+if __name__ == "__main__":
+    unittest.main()
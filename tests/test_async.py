@@ -0,0 +1,54 @@
+import os
+import unittest
+
+from support import ServerTestCase, html_page
+from parser_engine import ConfigManager, LinkExtractionJob
+
+# Асинхронное извлечение ссылок: тот же результат, что у потоков, и отдельное число одновременных запросов
+class AsyncExtractionTest(ServerTestCase):
+    def run_job(self, urls, **options):
+        job = LinkExtractionJob(urls, "txt", log=self.quiet, **options)
+        job.run()
+        with open(job.file_path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_async_extraction_matches_threads(self):
+        self.server.pages = {"/links": html_page("/a.html", "b.html", "http://example.com/c")}
+        urls = [f"{self.base}/links", f"{self.alias}/links"]
+        self.assertEqual(self.run_job(urls, use_async=True), self.run_job(urls))
+
+    def test_async_crawl_keeps_scope(self):
+        self.server.pages = {
+            "/docs": html_page("/docs/a.html", "/other/b.html", "/docs/sub/c.html"),
+            "/docs/a.html": html_page("/docs/a.html", "/docs/d.html"),
+            "/docs/sub/c.html": html_page(),
+            "/other/b.html": html_page(),
+        }
+        found = self.run_job([f"{self.base}/docs/"], depth=2, scope="prefix", use_async=True)
+        self.assertIn(f"{self.base}/other/b.html", found)
+        self.assertEqual(found.count(f"{self.base}/docs/a.html"), 1)
+        # Ссылки последнего уровня записываются, но их страницы не загружаются
+        self.assertIn(f"{self.base}/docs/d.html", found)
+        self.assertEqual(sorted(path for path, _ in self.server.requests),
+                         ["/docs", "/docs/a.html", "/docs/sub/c.html"])
+
+    def test_concurrency_is_separate_from_workers(self):
+        ConfigManager.update(workers=1)
+        self.server.pages = {"/slow": html_page(*(f"/slow/{i}" for i in range(20)))}
+        self.run_job([f"{self.base}/slow"], depth=2, use_async=True, concurrency=8)
+        self.assertEqual(len(self.requested("/slow/")), 20)
+        self.assertEqual(max(self.server.peak.values()), 8)
+
+    def test_cancel_stops_pending_requests(self):
+        self.server.pages = {"/links": html_page("/a.html")}
+        job = LinkExtractionJob([f"{self.base}/links", f"{self.base}/slow/1"], "txt", use_async=True,
+                                log=self.quiet)
+        job.progress = lambda value: job.cancel() if value else None
+        job.run()
+        self.assertIsNone(job.file_path)
+        self.assertEqual(job.results, {f"{self.base}/links": "Sort_obj_1.txt"})
+        self.assertFalse(os.path.exists("Sort_obj_2.txt"))
+        self.assertFalse(os.path.exists("Sort_obj.txt"))
+
+if __name__ == "__main__":
+    unittest.main()
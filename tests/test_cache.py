@@ -0,0 +1,33 @@
+import os
+import unittest
+
+from support import LAST_MODIFIED, ServerTestCase
+from parser_engine import HttpCache
+
+# Кэш HTTP: повторная проверка через 304 и срок годности записей
+class CacheTest(ServerTestCase):
+    def test_cache_revalidates_with_304(self):
+        url = f"{self.base}/page/1"
+        cache = HttpCache(os.path.join(self.tmp, "cache"))
+        try:
+            first = cache.get(url, timeout=10)
+            self.assertFalse(first.from_cache)
+            second = cache.get(url, timeout=10)
+            self.assertTrue(second.not_modified)
+            self.assertEqual(second.content, first.content)
+        finally:
+            cache.close()
+        self.assertEqual(self.server.requests, [("/page/1", None), ("/page/1", LAST_MODIFIED)])
+
+    def test_cache_ttl_skips_revalidation(self):
+        url = f"{self.base}/page/1"
+        cache = HttpCache(os.path.join(self.tmp, "cache"), ttl=3600)
+        try:
+            cache.get(url, timeout=10)
+            self.assertTrue(cache.get(url, timeout=10).from_cache)
+        finally:
+            cache.close()
+        self.assertEqual(len(self.server.requests), 1)
+
+if __name__ == "__main__":
+    unittest.main()
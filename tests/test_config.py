@@ -0,0 +1,47 @@
+import json
+import unittest
+
+from support import TempDirTestCase
+from parser_engine import ConfigManager
+
+# Конфигурация: значения по умолчанию, запись и перечитывание измененного файла
+class ConfigTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reload_interval = ConfigManager.RELOAD_INTERVAL
+        ConfigManager.RELOAD_INTERVAL = 0
+
+    def tearDown(self):
+        ConfigManager.RELOAD_INTERVAL = self.reload_interval
+        super().tearDown()
+
+    def write_config(self, text):
+        with open(ConfigManager.CONFIG_FILE, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_defaults_without_file(self):
+        self.assertEqual(ConfigManager.get("workers"), ConfigManager.DEFAULTS["workers"])
+        self.assertEqual(ConfigManager.setting("workers", 3), 3)
+        self.assertEqual(ConfigManager.load_config(), ConfigManager.DEFAULTS)
+        with open(ConfigManager.CONFIG_FILE, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), ConfigManager.DEFAULTS)
+
+    def test_update_keeps_other_keys(self):
+        self.write_config(json.dumps({"workers": 4, "browser_path": "/usr/bin/firefox"}))
+        ConfigManager.update(delay=2.5)
+        with open(ConfigManager.CONFIG_FILE, encoding="utf-8") as f:
+            saved = json.load(f)
+        self.assertEqual((saved["workers"], saved["browser_path"], saved["delay"]), (4, "/usr/bin/firefox", 2.5))
+        self.assertEqual(ConfigManager.setting("delay"), 2.5)
+
+    def test_changed_file_is_reloaded_and_broken_file_ignored(self):
+        self.write_config(json.dumps({"workers": 4}))
+        self.assertEqual(ConfigManager.get("workers"), 4)
+        self.write_config(json.dumps({"workers": 12, "encoders": 5}))
+        self.assertEqual((ConfigManager.get("workers"), ConfigManager.get("encoders")), (12, 5))
+        # Поврежденный файл не сбрасывает прочитанные значения
+        self.write_config("{\"workers\": ")
+        self.assertEqual(ConfigManager.get("workers"), 12)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from support import ServerTestCase, html_page
+from parser_engine import BloomFilter, SiteCrawler, normalize_url
+
+# Обход сайта: область обхода, нормализация URL и фильтр уже встреченных ссылок
+class CrawlerTest(ServerTestCase):
+    def test_normalize_url(self):
+        self.assertEqual(normalize_url("HTTP://Example.COM:80/docs/?b=2&a=1#top"), "http://example.com/docs?a=1&b=2")
+        self.assertEqual(normalize_url("https://example.com:443"), "https://example.com/")
+        self.assertEqual(normalize_url("http://example.com:8080/a/"), "http://example.com:8080/a")
+
+    def test_bloom_filter_reports_first_occurrence(self):
+        seen = BloomFilter(capacity=1000)
+        urls = [f"http://example.com/page/{i}" for i in range(500)]
+        self.assertTrue(all(seen.add(url) for url in urls))
+        self.assertFalse(any(seen.add(url) for url in urls))
+        self.assertEqual(seen.count, 500)
+        self.assertTrue(all(url in seen for url in urls))
+
+    def test_scope_prefix_from_start_url(self):
+        self.assertEqual(SiteCrawler.scope_prefix("http://example.com/docs/"), "/docs/")
+        self.assertEqual(SiteCrawler.scope_prefix("http://example.com/docs"), "/docs/")
+        self.assertEqual(SiteCrawler.scope_prefix("http://example.com/docs/index.html"), "/docs/")
+        self.assertEqual(SiteCrawler.scope_prefix("http://example.com"), "/")
+
+    def test_prefix_scope_skips_pages_outside_prefix(self):
+        self.server.pages = {
+            "/docs": html_page("/docs/a.html", "/other/b.html", "/docs/sub/c.html", f"{self.alias}/docs/d.html"),
+            "/docs/a.html": html_page("/docs/a.html"),
+            "/docs/sub/c.html": html_page(),
+            "/other/b.html": html_page(),
+        }
+        crawler = SiteCrawler(f"{self.base}/docs/", max_depth=2, scope="prefix", workers=2)
+        found = [url for url, _, _ in crawler.crawl()]
+        # Ссылки вне префикса записываются, но их страницы не загружаются
+        self.assertIn(f"{self.base}/other/b.html", found)
+        self.assertEqual(found.count(f"{self.base}/docs/a.html"), 1)
+        self.assertEqual(sorted(path for path, _ in self.server.requests),
+                         ["/docs", "/docs/a.html", "/docs/sub/c.html"])
+
+    def test_domain_scope_follows_whole_host(self):
+        self.server.pages = {
+            "/docs": html_page("/docs/a.html", "/other/b.html"),
+            "/docs/a.html": html_page(),
+            "/other/b.html": html_page(),
+        }
+        list(SiteCrawler(f"{self.base}/docs/", max_depth=2, scope="domain", workers=2).crawl())
+        self.assertEqual(sorted(path for path, _ in self.server.requests), ["/docs", "/docs/a.html", "/other/b.html"])
+
+if __name__ == "__main__":
+    unittest.main()
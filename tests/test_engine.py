@@ -0,0 +1,23 @@
+import unittest
+
+from support import ServerTestCase
+from parser_engine import HttpClient, DownloadPool
+
+# Пул загрузки: ограничение одновременных запросов к одному хосту
+class DownloadPoolTest(ServerTestCase):
+    def test_pool_limits_requests_per_host(self):
+        urls = [f"{host}/slow/{i}" for i in range(10) for host in (self.base, self.alias)]
+        pool = DownloadPool(workers=8, max_per_host=2)
+        results = list(pool.map(lambda url: HttpClient.get(url, timeout=10).status_code, urls))
+        self.assertEqual(sorted(url for url, _, _ in results), sorted(urls))
+        self.assertTrue(all(status == 200 and error is None for _, status, error in results))
+        self.assertEqual(len(self.server.peak), 2)
+        self.assertLessEqual(max(self.server.peak.values()), 2)
+        self.assertGreaterEqual(max(self.server.peak.values()), 2)
+
+    def test_pool_per_host_cap_defaults_to_workers(self):
+        self.assertEqual(DownloadPool(workers=6).max_per_host, 6)
+        self.assertEqual(DownloadPool(workers=6, max_per_host=3).max_per_host, 3)
+
+if __name__ == "__main__":
+    unittest.main()
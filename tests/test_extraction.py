@@ -0,0 +1,33 @@
+import os
+import unittest
+
+from support import ServerTestCase, html_page
+from parser_engine import LinkExtractionJob
+
+# Извлечение ссылок с нескольких страниц: объединение результатов и отмена
+class ExtractionTest(ServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.pages = {"/links": html_page("/a.html", "/b.html")}
+
+    def test_results_are_merged_and_indexed(self):
+        job = LinkExtractionJob([f"{self.base}/links", f"{self.alias}/links"], "txt", diff=True, log=self.quiet)
+        job.run()
+        self.assertEqual(job.full_path, "Sort_obj.txt")
+        with open(job.full_path, encoding="utf-8") as f:
+            self.assertEqual([line.split(" ")[0] for line in f], ["№1,", "№2,", "№3,", "№4,"])
+        self.assertEqual(job.file_path, "Sort_obj.delta.txt")
+
+    def test_cancelled_job_keeps_previous_results(self):
+        job = LinkExtractionJob([f"{self.base}/links", f"{self.base}/slow/1"], "txt", diff=True, log=self.quiet)
+        # Отмена сразу после первой извлеченной страницы, пока вторая еще загружается
+        job.progress = lambda value: job.cancel() if value else None
+        job.run()
+        self.assertIsNone(job.file_path)
+        self.assertTrue(os.path.exists("Sort_obj_1.txt"))
+        self.assertFalse(os.path.exists("Sort_obj.txt"))
+        self.assertFalse(os.path.exists("Sort_obj.delta.txt"))
+        self.assertFalse(os.path.exists("link_index.sqlite"))
+
+if __name__ == "__main__":
+    unittest.main()
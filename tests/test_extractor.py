@@ -0,0 +1,42 @@
+import unittest
+
+from parser_engine import LinkExtractor
+
+HTML = """<html><head><title>t</title></head><body>
+<a href="/docs/a.html" title="Первая">A</a>
+<p><a href='https://example.com/b.pdf'>B</a></p>
+<a name="anchor">без ссылки</a>
+<A HREF="/docs/c.html">C</A>
+</body></html>"""
+
+# Извлечение ссылок: все доступные парсеры дают одинаковый результат
+class ExtractorTest(unittest.TestCase):
+    def hrefs(self, backend, html=HTML, filter_keyword=None):
+        extractor = LinkExtractor(backend)
+        self.assertEqual(extractor.backend, backend)
+        return [(anchor.get("href"), anchor.get("title")) for anchor in extractor.extract(html, filter_keyword)]
+
+    def test_backends_agree(self):
+        expected = self.hrefs("stream")
+        self.assertEqual([href for href, _ in expected], ["/docs/a.html", "https://example.com/b.pdf", None,
+                                                          "/docs/c.html"])
+        self.assertEqual(expected[0][1], "Первая")
+        for backend in LinkExtractor.available_backends():
+            with self.subTest(backend=backend):
+                self.assertEqual(self.hrefs(backend), expected)
+
+    def test_filter_by_href(self):
+        for backend in LinkExtractor.available_backends():
+            with self.subTest(backend=backend):
+                self.assertEqual(self.hrefs(backend, filter_keyword=r"\.PDF$"), [("https://example.com/b.pdf", None)])
+
+    def test_empty_page(self):
+        for backend in LinkExtractor.available_backends():
+            with self.subTest(backend=backend):
+                self.assertEqual(self.hrefs(backend, html=""), [])
+
+    def test_unknown_backend_falls_back_to_auto(self):
+        self.assertEqual(LinkExtractor("missing").backend, LinkExtractor.available_backends()[0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from support import ServerTestCase, write_links
+from parser_engine import CrawlJournal, JobControl, PageDownloader
+
+# Журнал загрузки: продолжение прерванного задания
+class JournalTest(ServerTestCase):
+    def test_journal_resumes_only_interrupted_job(self):
+        links = write_links("links.txt", [f"{self.base}/page/{i}" for i in range(10)])
+        control = JobControl()
+        finished = []
+
+        def stop_after_three(idx, url, info):
+            finished.append(url)
+            if len(finished) == 3:
+                control.cancel()
+
+        def run(control=None, on_result=None):
+            self.server.requests = []
+            PageDownloader(links, "", "txt", workers=1, journal=CrawlJournal(), control=control,
+                           on_result=on_result, log=lambda message: None).run()
+            return len(self.requested("/page/"))
+
+        interrupted = run(control, stop_after_three)
+        self.assertLess(interrupted, 10)
+        # Продолжение загружает только то, что не успел прерванный запуск
+        self.assertEqual(run(), 10 - interrupted)
+        # Задание завершено: повторный запуск загружает все ссылки заново
+        self.assertEqual(run(), 10)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import time
+import unittest
+
+from support import ServerTestCase, html_page, write_links
+from parser_engine import LinkChecker, LinkStatusTable
+
+# Проверка ссылок перед загрузкой: статусы, перенаправления, тип содержимого и срок годности результатов
+class LinkCheckerTest(ServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.pages = {
+            "/c/a": html_page(),
+            "/c/b": (301, {"Location": "/c/a"}, b""),
+            "/c/img": (200, {"Content-Type": "image/png"}, b"png"),
+            "/c/nohead": html_page(),
+            ("HEAD", "/c/nohead"): (405, {}, b""),
+        }
+        self.urls = {name: f"{self.base}/c/{name}" for name in ("a", "b", "img", "missing", "nohead")}
+        self.links = write_links("links.txt", list(self.urls.values()))
+
+    def test_check_classifies_links(self):
+        table = LinkStatusTable()
+        try:
+            counts = LinkChecker(self.links, "", workers=4, table=table, log=self.quiet).run()
+            self.assertEqual(counts, {"alive": 3, "dead": 1, "other": 1, "duplicates": 1})
+            self.assertIsNone(table.reason(self.urls["a"]))
+            self.assertIn(self.urls["a"], table.reason(self.urls["b"]))
+            self.assertEqual(table.reason(self.urls["img"]), "тип содержимого image/png")
+            self.assertEqual(table.reason(self.urls["missing"]), "статус 404")
+            nohead = table.lookup(self.urls["nohead"])
+            self.assertEqual((nohead["method"], nohead["status"]), ("GET", 200))
+            self.assertEqual(table.lookup(self.urls["b"])["redirects"], [[301, self.urls["b"]]])
+        finally:
+            table.close()
+        with open("link_status.tsv", encoding="utf-8") as report:
+            self.assertEqual(len(report.readlines()), 6)
+
+    def test_expired_results_are_ignored_and_cleared(self):
+        table = LinkStatusTable(ttl=1)
+        try:
+            LinkChecker(self.links, "", workers=4, table=table, log=self.quiet).run()
+            self.assertEqual(table.reason(self.urls["missing"]), "статус 404")
+            with table._lock:
+                table._db.execute("UPDATE links SET checked_at = ?", (time.time() - 7200,))
+            self.assertIsNone(table.reason(self.urls["missing"]))
+            self.assertEqual(table.clear(older_than=table.ttl), 5)
+            self.assertIsNone(table.lookup(self.urls["a"]))
+        finally:
+            table.close()
+
+if __name__ == "__main__":
+    unittest.main()
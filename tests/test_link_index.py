@@ -0,0 +1,70 @@
+import hashlib
+import os
+import unittest
+
+from support import LAST_MODIFIED, ServerTestCase, write_links
+from parser_engine import HttpCache, LinkIndex, PageDownloader
+
+# Индекс ссылок: разница между извлечениями и хеши содержимого страниц
+class LinkIndexTest(ServerTestCase):
+    def test_update_returns_difference_with_previous_extraction(self):
+        index = LinkIndex()
+        try:
+            first = index.update("http://example.com/", [("http://example.com/a", "A"), ("http://example.com/b", "B")])
+            self.assertEqual(len(first["added"]), 2)
+            delta = index.update("http://example.com", [("http://example.com/b", "B2"), ("http://example.com/c", "C")])
+            self.assertEqual(delta, {
+                "added": [("http://example.com/c", "C")],
+                "changed": [("http://example.com/b", "B2")],
+                "removed": [("http://example.com/a", "A")],
+            })
+            # Исчезнувшая ссылка, появившись снова, считается новой
+            again = index.update("http://example.com", [("http://example.com/a", "A")])
+            self.assertEqual(again["added"], [("http://example.com/a", "A")])
+        finally:
+            index.close()
+
+    def test_record_digest_reports_changed_content(self):
+        index = LinkIndex()
+        try:
+            index.update("http://example.com", [("http://example.com/a", "A")])
+            self.assertFalse(index.record_digest("http://example.com/a", "1"))
+            self.assertFalse(index.record_digest("http://example.com/a", "1"))
+            self.assertTrue(index.record_digest("http://example.com/a", "2"))
+            # Страницы, которой нет в индексе, хеш не сохраняется
+            self.assertFalse(index.record_digest("http://example.com/z", "1"))
+        finally:
+            index.close()
+
+    def test_cached_page_keeps_stored_digest(self):
+        url = f"{self.base}/page/1"
+        links = write_links("links.txt", [url])
+        body = "<html><body><p>/page/1</p></body></html>".encode("utf-8")
+        index = LinkIndex()
+        index.update(self.base, [(url, "страница")])
+        index.close()
+        messages = []
+        results = []
+
+        def run():
+            PageDownloader(links, "", "txt", workers=1, cache=HttpCache(os.path.join(self.tmp, "cache")),
+                           link_index=LinkIndex(), log=messages.append,
+                           on_result=lambda idx, url, info: results.append(info)).run()
+
+        run()
+        run()
+        # Второй запуск получает 304 и не читает тело: хеш в индексе остается хешем страницы
+        self.assertEqual(self.server.requests[-1], ("/page/1", LAST_MODIFIED))
+        self.assertTrue(results[1]["unchanged"])
+        self.assertIsNone(results[1]["digest"])
+        self.assertEqual(results[0]["digest"], hashlib.sha1(body).hexdigest())
+        index = LinkIndex()
+        try:
+            stored = index._db.execute("SELECT digest FROM links WHERE url = ?", (url,)).fetchone()[0]
+        finally:
+            index.close()
+        self.assertEqual(stored, hashlib.sha1(body).hexdigest())
+        self.assertFalse([message for message in messages if "изменилось" in message])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import hashlib
+import os
+import unittest
+
+from support import ServerTestCase, write_links
+from parser_engine import CrawlJournal, FetchPipeline, HttpCache
+
+# Загрузка со скриншотами: журнал хранит хеш страницы вместе со снимком
+class PipelineTest(ServerTestCase):
+    def run_pipeline(self, links):
+        # Загрузка без браузера: снимок "снимается" для каждой ссылки, которую план не пропустил
+        state = CrawlJournal()
+        pipeline = FetchPipeline(links, "", "txt", state_journal=state, log=self.quiet,
+                                 page_options={"cache": HttpCache(os.path.join(self.tmp, "cache"))})
+        pipeline.downloader.run()
+        plans = []
+        while not pipeline.tasks.empty():
+            _, url, plan = pipeline.tasks.get()
+            plans.append(plan)
+            if plan is None or "skip" not in plan:
+                with open("shot.png", "wb") as f:
+                    f.write(b"png")
+                pipeline.screenshot_done(url, ["shot.png"])
+        return state, plans
+
+    def test_unchanged_page_keeps_digest_in_state_journal(self):
+        url = f"{self.base}/page/1"
+        links = write_links("links.txt", [url])
+        digest = hashlib.sha1(b"<html><body><p>/page/1</p></body></html>").hexdigest()
+        state, _ = self.run_pipeline(links)
+        self.assertEqual(state.page_state(url), (digest, "shot.png"))
+        state.close()
+        # Снимок потерян, страница не изменилась (304): снимок делается заново, хеш остается хешем страницы
+        os.remove("shot.png")
+        state, plans = self.run_pipeline(links)
+        self.assertEqual(plans, [None])
+        self.assertEqual(state.page_state(url), (digest, "shot.png"))
+        state.close()
+        state, plans = self.run_pipeline(links)
+        self.assertIn("не изменилась", plans[0]["skip"])
+        state.close()
+
+if __name__ == "__main__":
+    unittest.main()
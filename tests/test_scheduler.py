@@ -0,0 +1,57 @@
+import time
+import unittest
+
+from support import ServerTestCase
+from parser_engine import PolitenessScheduler
+
+# Вежливый режим: robots.txt, интервал между запросами к хосту и отступ при 429/5xx
+class SchedulerTest(ServerTestCase):
+    def robots(self, status, body=b""):
+        self.server.pages = {"/robots.txt": (status, {"Content-Type": "text/plain"}, body)}
+        return PolitenessScheduler(min_delay=0)
+
+    def test_robots_rules(self):
+        scheduler = self.robots(200, b"User-agent: *\nDisallow: /private/\nCrawl-delay: 2\n")
+        self.assertTrue(scheduler.allowed(f"{self.base}/page/1"))
+        self.assertFalse(scheduler.allowed(f"{self.base}/private/1"))
+        self.assertEqual(scheduler.delay(scheduler.host_of(self.base)), 2.0)
+        # robots.txt загружается один раз на хост
+        self.assertEqual(self.requested("/robots.txt"), ["/robots.txt"])
+
+    def test_robots_unauthorized_disallows_all(self):
+        for status in (401, 403):
+            with self.subTest(status=status):
+                self.assertFalse(self.robots(status).allowed(f"{self.base}/page/1"))
+
+    def test_robots_missing_allows_all(self):
+        for status in (404, 410, 500):
+            with self.subTest(status=status):
+                self.assertTrue(self.robots(status).allowed(f"{self.base}/page/1"))
+
+    def test_reserve_spaces_requests_to_host(self):
+        scheduler = PolitenessScheduler(min_delay=0.5, respect_robots=False)
+        first = scheduler.reserve(f"{self.base}/page/1")
+        second = scheduler.reserve(f"{self.base}/page/2")
+        other = scheduler.reserve(f"{self.alias}/page/1")
+        self.assertAlmostEqual(second - first, 0.5, places=2)
+        self.assertLess(other, second)
+
+    def test_retry_after_and_backoff(self):
+        scheduler = PolitenessScheduler(min_delay=0, respect_robots=False, max_retries=2, base_backoff=0.1)
+        url = f"{self.base}/page/1"
+
+        class Response:
+            def __init__(self, status_code, headers=None):
+                self.status_code = status_code
+                self.headers = headers or {}
+
+        pause = scheduler.record(url, Response(429, {"Retry-After": "3"}))
+        self.assertGreaterEqual(pause, 3.0)
+        self.assertGreaterEqual(scheduler.ready_at(scheduler.host_of(url)), time.monotonic() + 2.5)
+        self.assertIsNotNone(scheduler.record(url, Response(503)))
+        # Попытки исчерпаны: повтора нет
+        self.assertIsNone(scheduler.record(url, Response(503)))
+        self.assertIsNone(scheduler.record(url, Response(200)))
+
+if __name__ == "__main__":
+    unittest.main()
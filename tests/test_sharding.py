@@ -0,0 +1,41 @@
+import unittest
+
+from support import LAST_MODIFIED, ServerTestCase, write_links
+from parser_engine import ShardedJob
+
+# Разбиение файла ссылок на шарды
+class ShardingTest(ServerTestCase):
+    def test_shards_spread_single_host_by_url(self):
+        links = write_links("links.txt", [f"{self.base}/page/{i}" for i in range(40)])
+        manifest = ShardedJob(links, "", "txt", shards=4, processes=1, shard_root="shards",
+                              log=lambda message: None).prepare()
+        self.assertEqual(len(manifest["shards"]), 4)
+        self.assertEqual(sum(shard["lines"] for shard in manifest["shards"]), 40)
+
+    def test_polite_shards_keep_host_together(self):
+        links = write_links("links.txt", [f"{self.base}/page/{i}" for i in range(40)])
+        manifest = ShardedJob(links, "", "txt", shards=4, processes=1, shard_root="shards", polite=True,
+                              log=lambda message: None).prepare()
+        self.assertEqual([shard["lines"] for shard in manifest["shards"]], [40])
+
+    def run_job(self, links, **settings):
+        self.server.requests = []
+        ShardedJob(links, "", "txt", shards=3, processes=1, log=self.quiet, **settings).run()
+        return self.server.requests
+
+    def test_merged_job_is_not_processed_again(self):
+        links = write_links("links.txt", [f"{self.base}/page/{i}" for i in range(6)])
+        self.assertEqual(len(self.run_job(links)), 6)
+        with open("full_links.txt", encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 6)
+        # Другая машина (или повторный запуск) видит объединенное задание и ничего не загружает
+        self.assertEqual(self.run_job(links), [])
+        self.assertEqual(len(self.run_job(links, resume=False)), 6)
+
+    def test_shards_use_http_cache(self):
+        links = write_links("links.txt", [f"{self.base}/page/{i}" for i in range(6)])
+        self.assertEqual({since for _, since in self.run_job(links, cache=True)}, {None})
+        self.assertEqual({since for _, since in self.run_job(links, cache=True, resume=False)}, {LAST_MODIFIED})
+
+if __name__ == "__main__":
+    unittest.main()
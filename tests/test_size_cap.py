@@ -0,0 +1,41 @@
+import os
+import unittest
+
+from support import CAP, ServerTestCase, write_links
+from parser_engine import AsyncPageDownloader, HttpCache, PageDownloader, PageTooLarge, page_file_path
+
+# Ограничение размера страницы при загрузке и в кэше
+class SizeCapTest(ServerTestCase):
+    def test_size_cap_without_content_length(self):
+        links = write_links("links.txt", [f"{self.base}/big", f"{self.base}/big-length", f"{self.base}/page/1"])
+        PageDownloader(links, "", "txt", workers=2, max_page_size=CAP, log=lambda message: None).run()
+        self.assertEqual(os.listdir("downloaded_pages"),
+                         [os.path.basename(page_file_path("downloaded_pages", f"{self.base}/page/1", "txt"))])
+
+    def test_async_download_streams_with_size_cap(self):
+        text = "<html><body><p>Страница в windows-1251</p></body></html>"
+        headers = {"Content-Type": "text/html; charset=windows-1251"}
+        self.server.pages = {"/cp1251": (200, headers, text.encode("cp1251"))}
+        urls = [f"{self.base}/big", f"{self.base}/big-length", f"{self.base}/page/1", f"{self.base}/cp1251"]
+        links = write_links("links.txt", urls)
+        AsyncPageDownloader(links, "", "txt", concurrency=2, max_page_size=CAP, log=self.quiet).run()
+        expected = sorted(os.path.basename(page_file_path("downloaded_pages", url, "txt")) for url in urls[2:])
+        self.assertEqual(sorted(os.listdir("downloaded_pages")), expected)
+        # Страница записана по частям и перекодирована в UTF-8 по кодировке из заголовка
+        with open(page_file_path("downloaded_pages", urls[3], "txt"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), text)
+
+    def test_cache_does_not_store_pages_over_cap(self):
+        cache = HttpCache(os.path.join(self.tmp, "cache"))
+        try:
+            for path in ("/big", "/big-length"):
+                with self.assertRaises(PageTooLarge):
+                    cache.get(f"{self.base}{path}", max_size=CAP, timeout=10)
+                self.assertIsNone(cache.lookup(f"{self.base}{path}"))
+        finally:
+            cache.close()
+        stored = [name for _, _, files in os.walk(cache.objects_dir) for name in files]
+        self.assertEqual(stored, [])
+
+if __name__ == "__main__":
+    unittest.main()